@@ -1,359 +1,397 @@
-import cv2
 import time
-from flask import Flask, Response, jsonify, render_template
-import numpy as np
-import random
+_import_started = time.perf_counter() # For the startup-time report
+
+import json
+import os
+import threading
+from flask import Flask, Response, jsonify, render_template, request
 
 # Import dlib for face detection and landmark prediction
 import dlib
-from scipy.spatial import distance as dist # For calculating Euclidean distance for EAR/MAR
+
+from detection import draw_detections, perform_ai_detection, simulate_system_violation
+from events import ALERT_TYPES, AlertTracker, EventLog
+from face_detectors import DETECTOR_BACKENDS, DNN_MODEL_PATH, HAAR_CASCADE_PATH, create_face_detector
+from face_tracking import FaceLocator, locate_faces
+from frame_sources import SourceManager, load_source_config
+from metrics import metrics
+from monitor import MonitorSession, SessionRegistry
+from pipeline import DEFAULT_JPEG_QUALITY, FramePipeline, negotiate_profile
+from worker_pool import DetectionPool
 
 app = Flask(__name__)
 
 # --- Configuration ---
-# Use 0 for default webcam, or a video file path
-VIDEO_SOURCE = 0
+# Use 0 for default webcam, or a video file path or stream URL (rtsp://...). "synthetic" (or
+# "synthetic:1280x720") streams generated frames, e.g. on a headless server: FOCUS_VIDEO_SOURCE=synthetic
+VIDEO_SOURCE = os.environ.get("FOCUS_VIDEO_SOURCE", 0)
+# Sources that can be monitored, keyed by session/camera ID (served at /video_feed/<id>
+# and /analytics/<id>). The default session is served at /video_feed and /analytics.
+DEFAULT_SESSION_ID = "default"
+MONITOR_SOURCES = {
+    DEFAULT_SESSION_ID: VIDEO_SOURCE,
+}
+# More sources (e.g. every camera of an exam hall) can be listed in a JSON file of
+# {"<session id>": <device index, file path or rtsp:// URL>}: FOCUS_SOURCES_FILE=sources.json
+# An entry {"source": ..., "detector": "dnn"} also picks that session's face detector backend.
+SOURCES_FILE = os.environ.get("FOCUS_SOURCES_FILE")
+SOURCE_DETECTORS = {}
+if SOURCES_FILE:
+    _file_sources, SOURCE_DETECTORS = load_source_config(SOURCES_FILE)
+    MONITOR_SOURCES.update(_file_sources)
+# With True every configured source is opened and analysed from startup, whether or not
+# anyone watches it; otherwise a source is opened when its session is first requested
+INGEST_ALL_SOURCES = os.environ.get("FOCUS_INGEST_ALL_SOURCES", "0") == "1"
+# A lost source is reopened after SOURCE_RECONNECT_INITIAL seconds, doubling the delay on
+# every failed attempt up to SOURCE_RECONNECT_MAX. A source delivering no new frame for
+# SOURCE_STALE_AFTER seconds is reported as stale (/sources, /metrics).
+SOURCE_RECONNECT_INITIAL = 0.5
+SOURCE_RECONNECT_MAX = 30.0
+SOURCE_STALE_AFTER = 5.0
+MAX_SESSIONS = 32 # Upper bound on concurrently monitored sessions per process
+SESSION_IDLE_TIMEOUT = 300 # Seconds without any client before a session's camera is released
 # Interval for updating analytics (in seconds)
 ANALYTICS_UPDATE_INTERVAL = 1 # Faster UI updates
+# Streamed analytics (/analytics_stream): alert changes are pushed as soon as a frame
+# produces them, other changed fields (e.g. focus score) at most this often (in seconds)
+ANALYTICS_PUSH_INTERVAL = 0.25
+# Every open /analytics_stream (and /video_feed) holds one server thread while connected
+# (see threads in gunicorn.conf.py). Beyond this many analytics streams per process, dashboards
+# are refused with 503 and poll /analytics instead, leaving threads for video feeds and requests.
+ANALYTICS_MAX_STREAMS = int(os.environ.get("FOCUS_ANALYTICS_MAX_STREAMS", 384))
+ANALYTICS_URGENT_FIELDS = ('alert_type', 'proctoring_alert', 'copy_attempt', 'unauthorized_activity')
+ANALYTICS_KEEPALIVE_INTERVAL = 15 # Seconds between keep-alive comments on an idle stream
+# /video_feed clients may ask for ?width=<max px>&quality=<1-100>&fps=<max fps>; these
+# apply when they do not. Clients asking for the same (snapped) width and quality share one encode.
+VIDEO_FEED_DEFAULT_QUALITY = DEFAULT_JPEG_QUALITY
+VIDEO_FEED_MAX_FPS = 30 # Upper bound on the frame rate a client can ask for
+
+# --- Alert Event Log ---
+# Alert intervals (start/end, focus scores) of every session, written in the background
+# to a SQLite database and served at /events. Relative paths are relative to the working
+# directory; point it at persistent storage with e.g. FOCUS_EVENT_LOG=/var/lib/focus/events.db
+EVENT_LOG_PATH = os.environ.get("FOCUS_EVENT_LOG", "events.db")
+ALERT_END_GRACE = 2.0 # Seconds an alert must stay off before its interval is closed
+EVENTS_PAGE_SIZE = 50 # Default number of events per /events page
+EVENTS_MAX_PAGE_SIZE = 500
+
+# --- Face Detector Backend ---
+# "hog" (dlib, the default), "haar" (the bundled Haar cascade, cheapest, lowest recall) or
+# "dnn" (OpenCV's YuNet face detector on the CPU, also finds turned heads and small faces; its
+# model is downloaded by `python fetch_models.py`). Compare them on your own recordings with
+# bench_detectors.py.
+FACE_DETECTOR_BACKEND = os.environ.get("FOCUS_FACE_DETECTOR", "hog")
+# Backends for individual sessions, keyed like MONITOR_SOURCES (e.g. {"hall-1": "dnn"}); set
+# with a "detector" in the FOCUS_SOURCES_FILE entry of the session
+MONITOR_DETECTORS = dict(SOURCE_DETECTORS)
+for _session_id, _backend in MONITOR_DETECTORS.items():
+    if _backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown face detector backend '{_backend}' for source '{_session_id}' in "
+                         f"{SOURCES_FILE}. Expected one of {DETECTOR_BACKENDS}.")
+FACE_DETECTOR_OPTIONS = {
+    'haar': {'cascade_path': HAAR_CASCADE_PATH, 'min_neighbors': 5},
+    'dnn': {'model_path': DNN_MODEL_PATH, 'confidence': 0.6},
+}
+
+# --- Face Detection Performance ---
+# "full" runs the detector on every frame. "tracker" (opt-in: FOCUS_DETECTION_MODE=tracker)
+# runs it only every HOG_REDETECT_INTERVAL frames and follows faces with a correlation
+# tracker in between: much cheaper, but a face that appears or leaves between two detections
+# (which drives the copy-attempt and absence alerts) is only seen at the next detection.
+# Check its face-count agreement on your own recordings with bench_face_tracking.py first.
+FACE_DETECTION_MODE = os.environ.get("FOCUS_DETECTION_MODE", "full")
+HOG_REDETECT_INTERVAL = 10 # Max frames between two full HOG detections
+TRACKER_MIN_CONFIDENCE = 7.0 # Re-detect early when a tracker's confidence drops below this
+# Faces are detected (and tracked) on a copy of the frame resized by this factor; landmarks
+# are still predicted on the full-resolution face region. 1.0 disables downscaling. HOG only
+# finds faces of at least 80 px in the detection frame, i.e. 80 / DETECTION_SCALE px in the
+# camera frame: lower it only when faces are always that large (0.5: 160 px wide faces, about a
+# close-up at 720p). Check the recall on your own recordings with bench_detection_scale.py.
+DETECTION_SCALE = 1.0
+DETECTION_MIN_WIDTH = 640 # Frames are never downscaled below this width for detection
+# Every face is analysed (landmarks, features, alert rules) up to this many per frame, largest
+# first; further faces are still counted and tracked. Bounds the frame latency in crowded scenes.
+MAX_ANALYSED_FACES = 16
+# Number of worker processes running face detection and landmark prediction for all
+# sessions. 0 runs detection in each session's own detection thread instead. More workers than
+# CPU cores only add contention; measure the scaling on the target machine with bench_worker_pool.py.
+DETECTION_WORKERS = 0
+# Upper bound on analysed frames per second per session (0 analyses every frame). The alert
+# rules are time-based, so e.g. 5-10 under load keeps their timing; frames in between are
+# streamed with the last analysed frame's overlays.
+DETECTION_MAX_RATE = 0
+PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+
+# --- Performance Metrics ---
+# Times every pipeline stage (camera read, detector, predictor, solvePnP, drawing, JPEG
+# encoding) into the histograms served at /metrics. With False only the frame rates,
+# queue depths and drop counts are exported, and the stage timers are no-ops.
+METRICS_ENABLED = True
+metrics.enable(METRICS_ENABLED)
+
+# --- Lazy Initialization ---
+# Importing this module loads no model and opens no camera. The ~100 MB landmark
+# model is parsed on first use, or up front by warm_up(): under gunicorn --preload
+# the master calls warm_up() before forking (see gunicorn.conf.py), so every worker
+# shares the parsed model copy-on-write and restarts without parsing it again.
+# Cameras are opened when a session is first requested.
+predictor = None
+_predictor_loaded = False
+_init_lock = threading.Lock()
+startup_times = {} # Phase -> seconds, reported at startup and on /metrics
+
+def _record_startup(phase, seconds):
+    startup_times[phase] = seconds
+    print(f"Startup: {phase} took {seconds * 1000:.0f} ms.")
+
+def get_predictor():
+    """
+    Returns dlib's facial landmark predictor, loading it on first call.
+    The predictor is shared by all sessions; each session gets its own face detector (see create_session).
+    You MUST download shape_predictor_68_face_landmarks.dat and place it in the 'backend' directory.
+    Download from: http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
+    """
+    global predictor, _predictor_loaded
+    if _predictor_loaded:
+        return predictor
+    with _init_lock:
+        if not _predictor_loaded:
+            start = time.perf_counter()
+            try:
+                predictor = dlib.shape_predictor(PREDICTOR_PATH)
+                print("dlib shape predictor initialized successfully.")
+            except Exception as e:
+                print(f"Error loading dlib shape predictor: {e}")
+                print("CRITICAL: Please download 'shape_predictor_68_face_landmarks.dat' from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2, extract it, and place it in the same directory as app.py.")
+                predictor = None # Set to None to handle errors gracefully
+            _predictor_loaded = True
+            _record_startup("predictor_load", time.perf_counter() - start)
+    return predictor
+
+# --- Face Observation (in-process or pooled) ---
+def observe_faces(session, frame):
+    """
+    Returns (rects, landmarks) for a frame of the session (see locate_faces).
+    Landmarks are predicted on the full-resolution face regions to keep EAR/MAR precise.
+    """
+    if detection_pool is not None:
+        with metrics.time_stage("pool_roundtrip"):
+            return detection_pool.locate_faces(session.session_id, frame)
+    return locate_faces(session.face_locator, get_predictor(), frame, DETECTION_SCALE, DETECTION_MIN_WIDTH,
+                        MAX_ANALYSED_FACES)
+
+# --- Sessions and Threaded Frame Pipelines ---
+def process_frame(session, frame):
+    """
+    Detection stage callback: runs the AI detection on a captured frame,
+    draws overlays on it in place and publishes the alert type for the frontend.
+    """
+    now = time.time()
+    if DETECTION_MAX_RATE > 0 and now - session.last_analysis_time < 1.0 / DETECTION_MAX_RATE:
+        with metrics.time_stage("drawing"):
+            draw_detections(frame, *session.last_detections)
+        return
+    session.last_analysis_time = now
+    try:
+        # Locate faces and predict their landmarks (in a worker process if pooled)
+        rects, landmarks = observe_faces(session, frame)
+    except Exception as e:
+        # A failed or timed-out pooled detection only costs this frame
+        print(f"Error: Detection failed for session '{session.session_id}': {e}")
+        return
+    alert_type = perform_ai_detection(session, (frame.shape[1], frame.shape[0]), rects, landmarks)
+    session.current_alert_type = simulate_system_violation(session, alert_type)
+    # Only queues the started/ended intervals; the event log writes them in the background
+    for event in session.alert_tracker.update(session.current_alert_type, time.time(), session.focus_score):
+        event_log.record(event)
+    session.last_detections = (rects, landmarks, session.person_ids)
+    with metrics.time_stage("drawing"):
+        draw_detections(frame, rects, landmarks, session.person_ids)
+    session.publish_analytics(ANALYTICS_URGENT_FIELDS, ANALYTICS_PUSH_INTERVAL)
+
+def create_session(session_id):
+    """
+    Builds the MonitorSession for session_id, with a pipeline that owns a reader
+    of the configured camera. Returns None for an unknown session.
+    """
+    if session_id not in source_manager:
+        return None
+    source = MONITOR_SOURCES[session_id]
+    # Connects in the pipeline's capture thread, retrying with backoff while the source is unavailable
+    camera = source_manager.open(session_id)
+
+    # A backend whose model is missing falls back to dlib's HOG detector rather than failing the session
+    backend = MONITOR_DETECTORS.get(session_id, FACE_DETECTOR_BACKEND)
+    detector = create_face_detector(backend, FACE_DETECTOR_OPTIONS, fallback="hog")
+    face_locator = FaceLocator(detector, FACE_DETECTION_MODE, HOG_REDETECT_INTERVAL, TRACKER_MIN_CONFIDENCE)
+    session = MonitorSession(session_id, source, face_locator)
+    session.pipeline = FramePipeline(camera, source, lambda frame: process_frame(session, frame))
+    session.alert_tracker = AlertTracker(session_id, ALERT_END_GRACE)
+    return session
+
+def stream_session(session, profile, fps=0):
+    """Yields the session's MJPEG chunks, keeping it alive while someone watches."""
+    for chunk in session.pipeline.frames(profile, fps):
+        session.touch()
+        yield chunk
+
+def stream_analytics(session):
+    """
+    Server-Sent Events generator for one dashboard. Sends the full analytics
+    once, then only the fields that changed whenever the session wakes its
+    streams: right away for alert fields, otherwise at most once per
+    ANALYTICS_PUSH_INTERVAL (see MonitorSession.publish_analytics).
+    """
+    version, sent = session.wait_for_analytics(None, 0)
+    yield f"data: {json.dumps(sent)}\n\n"
+    last_sent_time = time.time()
 
-# --- AI Detection Thresholds (Using real landmark data) ---
-EYE_AR_THRESH = 0.25 # Threshold for eye aspect ratio (drowsiness)
-EYE_AR_CONSEC_FRAMES = 10 # Number of consecutive frames eye must be below threshold
-MOUTH_AR_THRESH = 0.7 # Threshold for mouth aspect ratio (yawning)
-MOUTH_AR_CONSEC_FRAMES = 10 # Number of consecutive frames mouth must be above threshold
-# Head pose thresholds (in arbitrary units/degrees for simplified estimation)
-HEAD_POSE_YAW_THRESH = 15 # Horizontal head rotation deviation threshold
-HEAD_POSE_PITCH_THRESH = 15 # Vertical head rotation deviation threshold
-GAZE_AWAY_CONSEC_FRAMES = 30 # Number of consecutive frames gaze/head pose is away
-ABSENCE_TIME_THRESHOLD = 5 # Seconds of no face to trigger absent status
-
-# --- Global Variables for Analytics ---
-global_face_count = 0
-global_sleeping_status = "No person detected"
-global_focus_score = 0.0
-global_unauthorized_activity_status = "None Detected"
-global_copy_attempt_status = "None Detected"
-global_proctoring_alert_status = "No Violations"
-global_current_alert_type = None # New: Holds the type of alert for frontend
-
-# --- AI Detection State Variables ---
-# For Drowsiness/Yawn Detection
-COUNTER = 0 # Frame counter for eye aspect ratio below threshold
-YAWN_COUNTER = 0 # Frame counter for mouth aspect ratio above threshold
-# For Gaze/Head Pose Detection
-HEAD_POSE_AWAY_COUNTER = 0 # Frame counter for head pose deviation
-
-# Timestamp of the last person detected
-last_person_detected_time = time.time()
-
-# --- Initialize dlib's face detector (HOG-based) and facial landmark predictor ---
-detector = dlib.get_frontal_face_detector()
-# You MUST download shape_predictor_68_face_landmarks.dat and place it in the 'backend' directory.
-# Download from: http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
-try:
-    predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
-    print("dlib face detector and shape predictor initialized successfully.")
-except Exception as e:
-    print(f"Error loading dlib shape predictor: {e}")
-    print("CRITICAL: Please download 'shape_predictor_68_face_landmarks.dat' from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2, extract it, and place it in the same directory as app.py.")
-    predictor = None # Set to None to handle errors gracefully
-
-# --- Helper functions for Eye and Mouth Aspect Ratios ---
-def eye_aspect_ratio(eye):
-    # Compute the Euclidean distances between the two sets of vertical eye landmarks
-    A = dist.euclidean(eye[1], eye[5])
-    B = dist.euclidean(eye[2], eye[4])
-    # Compute the Euclidean distance between the horizontal eye landmark
-    C = dist.euclidean(eye[0], eye[3])
-    # Compute the eye aspect ratio
-    ear = (A + B) / (2.0 * C)
-    return ear
-
-def mouth_aspect_ratio(mouth):
-    # Compute the Euclidean distances between the two sets of vertical mouth landmarks (51, 59) and (53, 57)
-    A = dist.euclidean(mouth[2], mouth[10]) # Points 51 and 59
-    B = dist.euclidean(mouth[4], mouth[8])  # Points 53 and 57
-    # Compute the Euclidean distance between the horizontal mouth landmarks (48, 54)
-    C = dist.euclidean(mouth[0], mouth[6]) # Points 48 and 54
-    # Compute the mouth aspect ratio
-    mar = (A + B) / (2.0 * C)
-    return mar
-
-# --- Video Capture Initialization ---
-print(f"Attempting to open camera source: {VIDEO_SOURCE}")
-camera = cv2.VideoCapture(VIDEO_SOURCE)
-if not camera.isOpened():
-    print(f"Error: Could not open video source {VIDEO_SOURCE}. Is it in use by another app or not connected? Please check permissions.")
-    exit() # Exit if camera cannot be opened
-else:
-    print(f"Successfully opened video source {VIDEO_SOURCE}.")
-
-# --- AI Detection Logic (Intelligent AI with dlib) ---
-def perform_ai_detection(frame):
+    while True:
+        version, snapshot = session.wait_for_analytics(version, ANALYTICS_KEEPALIVE_INTERVAL)
+        session.touch()
+
+        now = time.time()
+        changes = {key: value for key, value in snapshot.items() if sent.get(key) != value}
+        if changes:
+            yield f"data: {json.dumps(changes)}\n\n"
+            sent, last_sent_time = snapshot, now
+        elif now - last_sent_time >= ANALYTICS_KEEPALIVE_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent_time = now
+
+# --- Detection Worker Pool ---
+# Started by start_detection_pool() in the serving process, before any pipeline
+# thread is running, as the workers are forked from it (gunicorn: post_fork hook)
+detection_pool = None
+
+def start_detection_pool():
+    """Starts the detection worker pool if DETECTION_WORKERS is set. Idempotent."""
+    global detection_pool
+    with _init_lock:
+        if DETECTION_WORKERS <= 0 or detection_pool is not None:
+            return detection_pool
+        start = time.perf_counter()
+        pool = DetectionPool(DETECTION_WORKERS, PREDICTOR_PATH, {
+            'mode': FACE_DETECTION_MODE,
+            'redetect_interval': HOG_REDETECT_INTERVAL,
+            'min_confidence': TRACKER_MIN_CONFIDENCE,
+            'scale': DETECTION_SCALE,
+            'min_width': DETECTION_MIN_WIDTH,
+            'max_faces': MAX_ANALYSED_FACES,
+            'detector': FACE_DETECTOR_BACKEND,
+            'detectors': MONITOR_DETECTORS,
+            'detector_options': FACE_DETECTOR_OPTIONS,
+        }, predictor=predictor) # Workers inherit an already loaded predictor
+        pool.start()
+        detection_pool = pool
+        _record_startup("detection_pool_start", time.perf_counter() - start)
+    return detection_pool
+
+def warm_up():
     """
-    Performs AI-based detection for sleeping, focus, unauthorized activity,
-    and copy attempts using dlib facial landmarks.
-    Returns a string indicating the type of alert, or None.
+    Loads the models ahead of the first request. Call it in the process that
+    forks the workers (gunicorn master with --preload) so they share the model.
     """
-    global global_face_count, global_sleeping_status, global_focus_score, \
-           global_unauthorized_activity_status, global_copy_attempt_status, \
-           global_proctoring_alert_status, last_person_detected_time, \
-           COUNTER, YAWN_COUNTER, HEAD_POSE_AWAY_COUNTER
-
-    current_time = time.time()
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    current_frame_alert_type = None # Local variable to hold alert for this frame
-
-    # Detect faces in the grayscale frame using dlib's HOG detector
-    rects = detector(gray_frame, 0) # 0 means no upsampling
-
-    global_face_count = len(rects)
-
-    # Variables to store data for the primary face for detailed analysis and drawing
-    primary_rect = None
-    primary_landmarks = None
-    
-    if global_face_count > 0:
-        last_person_detected_time = current_time
-        # Reset non-persistent statuses unless re-triggered in this frame
-        global_unauthorized_activity_status = "None Detected"
-        global_copy_attempt_status = "None Detected"
-        
-        # Reset proctoring alert if it was due to absence
-        if global_proctoring_alert_status == "Student Absent!":
-            global_proctoring_alert_status = "No Violations"
-
-        # Check for multiple people for copy attempt
-        if global_face_count > 1:
-            global_copy_attempt_status = f"Multiple Persons Detected ({global_face_count})!"
-            global_proctoring_alert_status = "Potential Cheating!"
-            current_frame_alert_type = "copy_attempt" # Set alert type
-
-        # --- Detailed AI Analysis for the Primary Face ---
-        # We focus on the first detected face for detailed EAR/MAR/HeadPose analysis.
-        # This part runs only if there's at least one face and predictor is loaded,
-        # and if a copy_attempt alert is not already prioritized (optional logic).
-        if predictor is not None and len(rects) > 0:
-            # We always process the first face for detailed analytics
-            primary_rect = rects[0]
-            shape = predictor(gray_frame, primary_rect)
-            primary_landmarks = np.array([(p.x, p.y) for p in shape.parts()])
-
-            # Extract eye and mouth landmarks (indices from dlib's 68-point model)
-            left_eye_indices = [42, 43, 44, 45, 46, 47]
-            right_eye_indices = [36, 37, 38, 39, 40, 41]
-            mouth_indices = [48, 49, 50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67]
-
-            left_eye = primary_landmarks[left_eye_indices]
-            right_eye = primary_landmarks[right_eye_indices]
-            mouth = primary_landmarks[mouth_indices]
-
-            # Calculate EAR for both eyes and average
-            leftEAR = eye_aspect_ratio(left_eye)
-            rightEAR = eye_aspect_ratio(right_eye)
-            ear = (leftEAR + rightEAR) / 2.0
-
-            # Calculate MAR for the mouth
-            mar = mouth_aspect_ratio(mouth)
-
-            # --- Drowsiness Detection (EAR) ---
-            if ear < EYE_AR_THRESH:
-                COUNTER += 1
-                if COUNTER >= EYE_AR_CONSEC_FRAMES:
-                    global_sleeping_status = "Likely Sleeping (Eyes Closed)"
-                    global_proctoring_alert_status = "Drowsiness Detected!"
-                    if current_frame_alert_type is None: # Only set if no other higher priority alert
-                        current_frame_alert_type = "drowsiness" # Set alert type
-            else:
-                COUNTER = 0 # Reset counter when eyes are open
-                # Only set to awake if not already sleeping due to prolonged closure or yawn
-                if not ("Likely Sleeping" in global_sleeping_status or "Yawning" in global_sleeping_status):
-                    global_sleeping_status = "Awake"
-
-            # --- Yawn Detection (MAR) ---
-            if mar > MOUTH_AR_THRESH:
-                YAWN_COUNTER += 1
-                if YAWN_COUNTER >= MOUTH_AR_CONSEC_FRAMES:
-                    global_sleeping_status = "Yawning (AI Detected)"
-                    global_proctoring_alert_status = "Yawn Detected - Low Alertness"
-                    if current_frame_alert_type is None: # Only set if no other higher priority alert
-                        current_frame_alert_type = "yawn" # Set alert type
-            else:
-                YAWN_COUNTER = 0 # Reset counter when mouth is closed
-                # Reset sleeping status if it was only due to yawning and eyes are open
-                if global_sleeping_status == "Yawning (AI Detected)" and ear >= EYE_AR_THRESH:
-                     global_sleeping_status = "Awake"
-            
-            # --- Head Pose Estimation (for Gaze/Looking Away) ---
-            image_points = np.array([
-                primary_landmarks[30], 
-                primary_landmarks[8],  
-                primary_landmarks[36],
-                primary_landmarks[45], 
-                primary_landmarks[48], 
-                primary_landmarks[54]  
-            ], dtype="double")
-
-            # Dummy 3D model points (arbitrary values for a generic face)
-            model_points = np.array([
-                (0.0, 0.0, 0.0),             
-                (0.0, -330.0, -65.0),     
-                (-225.0, 170.0, -135.0),     
-                (225.0, 170.0, -135.0),      
-                (-150.0, -150.0, -125.0),    
-                (150.0, -150.0, -125.0)     
-            ])
-
-            # Camera internals (Approximations for a generic webcam)
-            focal_length = frame.shape[1] 
-            center = (frame.shape[1]/2, frame.shape[0]/2)
-            camera_matrix = np.array([
-                                [focal_length, 0, center[0]],
-                                [0, focal_length, center[1]],
-                                [0, 0, 1]
-                            ], dtype = "double")
-
-            dist_coeffs = np.zeros((4,1)) # Assuming no lens distortion
-
-            # Solve for pose
-            (success, rotation_vector, translation_vector) = cv2.solvePnP(model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
-
-            # Get rotation matrix from rotation vector
-            rmat, _ = cv2.Rodrigues(rotation_vector)
-
-            # Get angles (Euler angles in degrees)
-            angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
-            
-            # Extract yaw and pitch (in degrees)
-            yaw = np.degrees(angles[1])
-            pitch = np.degrees(angles[0])
-
-            is_looking_away = False
-            if abs(yaw) > HEAD_POSE_YAW_THRESH or abs(pitch) > HEAD_POSE_PITCH_THRESH:
-                is_looking_away = True
-
-            if is_looking_away:
-                HEAD_POSE_AWAY_COUNTER += 1
-                if HEAD_POSE_AWAY_COUNTER >= GAZE_AWAY_CONSEC_FRAMES:
-                    global_unauthorized_activity_status = f"Looking Away (Yaw: {round(yaw,1)}deg, Pitch: {round(pitch,1)}deg)"
-                    global_proctoring_alert_status = "Attention Diverted!"
-                    if current_frame_alert_type is None: 
-                        current_frame_alert_type = "gaze_violation" 
-            else:
-                HEAD_POSE_AWAY_COUNTER = 0
-                # Only clear if no other unauthorized activity is set (like multi-person or system violation)
-                if not (global_copy_attempt_status != "None Detected" or "System Access" in global_unauthorized_activity_status):
-                    global_unauthorized_activity_status = "None Detected"
-
-            # --- Update Focus Score (based on combined real factors) ---
-            normalized_ear = min(1.0, ear / EYE_AR_THRESH) if EYE_AR_THRESH > 0 else 1.0
-            focus_from_eyes = normalized_ear * 50
-            
-            normalized_mar = min(1.0, mar / MOUTH_AR_THRESH) if MOUTH_AR_THRESH > 0 else 1.0
-            focus_from_mouth = (1.0 - normalized_mar) * 50 # Invert MAR as high MAR means less focus (yawn)
-            
-            # Penalty for looking away (scales up to 50 if beyond threshold)
-            gaze_penalty_factor = min(1.0, HEAD_POSE_AWAY_COUNTER / GAZE_AWAY_CONSEC_FRAMES)
-            gaze_penalty = gaze_penalty_factor * 50
-
-            global_focus_score = (focus_from_eyes + focus_from_mouth) - gaze_penalty
-            global_focus_score = min(100.0, max(0.0, global_focus_score)) # Cap between 0 and 100
-
-        # --- Draw Rectangles and Landmarks for ALL Detected Faces ---
-        for i, rect_draw in enumerate(rects):
-            x, y, w, h = rect_draw.left(), rect_draw.top(), rect_draw.width(), rect_draw.height()
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-            cv2.putText(frame, f"Person {i+1}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-
-           
-            if i == 0 and primary_landmarks is not None:
-                for (lx, ly) in primary_landmarks:
-                    cv2.circle(frame, (lx, ly), 1, (0, 255, 0), -1)
-
-    else: 
-        time_since_last_person = current_time - last_person_detected_time
-        if time_since_last_person > ABSENCE_TIME_THRESHOLD:
-            global_sleeping_status = "No person detected - (Absent)"
-            global_proctoring_alert_status = "Student Absent!"
-            global_unauthorized_activity_status = "No Person Detected"
-            if current_frame_alert_type is None:
-                current_frame_alert_type = "absent_violation" 
-        else:
-            global_sleeping_status = "No person detected" 
-            global_unauthorized_activity_status = "None Detected"
-
-        global_focus_score = 0.0
-        global_copy_attempt_status = "None Detected"
-    
-        if global_proctoring_alert_status != "Student Absent!":
-            global_proctoring_alert_status = "No Violations"
-
-        # Reset all AI state variables when no face is present
-        COUNTER = 0
-        YAWN_COUNTER = 0
-        HEAD_POSE_AWAY_COUNTER = 0
-
-
-    # --- Simulate Tab Switching / External Access (conceptual, still random) ---
-    if random.random() < 0.0001: # Very low chance per frame
-        global_proctoring_alert_status = random.choice([
-            "Tab Switched! (Concept)",
-            "External App Detected! (Concept)",
-            "System Violation! (Concept)"
-        ])
-        global_unauthorized_activity_status = "System Access Violation (Concept)"
-        if current_frame_alert_type is None: 
-            current_frame_alert_type = "system_violation" 
-            
-
-    return current_frame_alert_type # Return the alert type for the frontend
-
-
-# --- Generator for Video Streaming ---
-def generate_frames():
+    start = time.perf_counter()
+    get_predictor()
+    _record_startup("warm_up", time.perf_counter() - start)
+
+# --- Alert Event Log ---
+# The writer thread starts with the first recorded event or query
+event_log = EventLog(EVENT_LOG_PATH)
+
+def close_session(session):
     """
-    Generates MJPEG frames from the webcam, performs AI detection,
-    and updates global analytics variables.
+    Ends the released session's open alert intervals, forgets its source reader
+    and drops the face tracks a pooled worker keeps for it.
     """
-    global camera, global_current_alert_type 
+    for event in session.alert_tracker.close():
+        event_log.record(event)
+    source_manager.close(session.session_id)
+    if detection_pool is not None:
+        detection_pool.release_session(session.session_id)
 
-    first_frame_read = False
+# --- Sources ---
+# Every session reads its camera through a SourceReader of the source manager
+source_manager = SourceManager(MONITOR_SOURCES, reconnect_initial=SOURCE_RECONNECT_INITIAL,
+                               reconnect_max=SOURCE_RECONNECT_MAX, stale_after=SOURCE_STALE_AFTER)
 
-    while True:
-        success, frame = camera.read()
-        if not success:
-            print("Error: Failed to read frame from camera. Attempting to re-open.")
-            camera.release() 
-            camera = cv2.VideoCapture(VIDEO_SOURCE)
-            if not camera.isOpened():
-                print(f"Critical Error: Could not re-open video source {VIDEO_SOURCE}. Exiting frame generation.")
-                break
-            time.sleep(0.1)
-            continue
-
-        if not first_frame_read:
-            if frame is not None:
-                print(f"Successfully read first frame. Frame dimensions: {frame.shape[1]}x{frame.shape[0]} (width x height)")
-                first_frame_read = True
-            else:
-                print("Warning: First frame was None despite success=True. Retrying...")
-                continue
-
-        # Perform AI detection and update global variables, capturing the alert type
-        global_current_alert_type = perform_ai_detection(frame)
-
-        # Encode the frame as JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            print("Error: Failed to encode frame.")
-            continue
-
-        frame_bytes = buffer.tobytes()
-
-        # Yield the frame in bytes for streaming
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+sessions = SessionRegistry(create_session, MAX_SESSIONS, SESSION_IDLE_TIMEOUT,
+                           pinned=list(MONITOR_SOURCES) if INGEST_ALL_SOURCES else [DEFAULT_SESSION_ID],
+                           on_close=close_session)
+
+# Open /analytics_stream connections, capped at ANALYTICS_MAX_STREAMS
+analytics_stream_slots = threading.BoundedSemaphore(ANALYTICS_MAX_STREAMS)
+
+def start_ingest():
+    """
+    Opens every configured source and starts its pipeline if INGEST_ALL_SOURCES
+    is set. Idempotent. Call it after start_detection_pool(), as the pool forks.
+    """
+    if not INGEST_ALL_SOURCES:
+        return
+    if len(MONITOR_SOURCES) > MAX_SESSIONS:
+        print(f"Warning: {len(MONITOR_SOURCES)} sources configured but MAX_SESSIONS is {MAX_SESSIONS}.")
+    for session_id in MONITOR_SOURCES:
+        session = sessions.get(session_id)
+        if session is not None:
+            session.pipeline.start()
+
+def pipeline_metrics():
+    """Metrics collector: frame rates, queue depths and dropped frames of every session."""
+    fps, frames, depth, dropped, clients = [], [], [], [], []
+    for session in sessions:
+        pipeline = session.pipeline
+        sid = {'session': session.session_id}
+        for stage, meter in pipeline.frame_rates.items():
+            fps.append(({**sid, 'stage': stage}, round(meter.rate(), 2)))
+            frames.append(({**sid, 'stage': stage}, meter.count))
+        depth.append(({**sid, 'queue': 'detect'}, len(pipeline.capture_queue)))
+        depth.append(({**sid, 'queue': 'encode'}, len(pipeline.encode_queue)))
+        dropped.append(({**sid, 'reason': 'detect_busy'}, pipeline.capture_queue.dropped))
+        dropped.append(({**sid, 'reason': 'encode_busy'}, pipeline.encode_queue.dropped))
+        dropped.append(({**sid, 'reason': 'slow_client'}, pipeline.skipped_chunks))
+        for profile, count in pipeline.active_profiles().items():
+            clients.append(({**sid, 'width': profile.max_width, 'quality': profile.quality}, count))
+    collected = [
+        ('pipeline_fps', 'gauge', "Achieved frames per second of each pipeline stage.", fps),
+        ('pipeline_frames_total', 'counter', "Frames processed by each pipeline stage.", frames),
+        ('pipeline_queue_depth', 'gauge', "Frames waiting in a pipeline queue.", depth),
+        ('pipeline_dropped_frames_total', 'counter', "Frames dropped because the next stage or a client was too slow.", dropped),
+        ('video_feed_clients', 'gauge', "Connected /video_feed clients per stream profile.", clients),
+        ('sessions', 'gauge', "Monitoring sessions currently open.", [({}, len(sessions))]),
+    ]
+    if detection_pool is not None:
+        collected.append(('detection_pool_pending', 'gauge', "Frames waiting for a detection worker.",
+                          [({}, detection_pool.pending_count())]))
+    collected.append(('events_written_total', 'counter', "Alert events written to the event log.",
+                      [({}, event_log.written)]))
+    collected.append(('events_pending', 'gauge', "Alert events queued for the event log writer.",
+                      [({}, event_log.pending())]))
+    collected.append(('events_dropped_total', 'counter', "Alert events dropped because the writer fell behind or was closed.",
+                      [({}, event_log.dropped)]))
+    up, stale, frame_age, reconnects = [], [], [], []
+    for source_id, reader in source_manager.readers().items():
+        sid = {'source': source_id}
+        up.append((sid, int(reader.state == "connected")))
+        stale.append((sid, int(reader.is_stale())))
+        if reader.last_frame_time is not None:
+            frame_age.append((sid, round(time.monotonic() - reader.last_frame_time, 3)))
+        reconnects.append((sid, reader.reconnects))
+    collected.append(('source_up', 'gauge', "Whether a video source is connected.", up))
+    collected.append(('source_stale', 'gauge', "Whether a video source has stopped delivering new frames.", stale))
+    collected.append(('source_last_frame_age_seconds', 'gauge', "Seconds since a video source delivered a frame.",
+                      frame_age))
+    collected.append(('source_reconnects_total', 'counter', "Attempts to reopen a lost video source.", reconnects))
+    collected.append(('startup_seconds', 'gauge', "Time taken by each startup phase.",
+                      [({'phase': phase}, round(seconds, 4)) for phase, seconds in startup_times.items()]))
+    return collected
+
+metrics.add_collector(pipeline_metrics)
+
+# --- Video Capture Initialization ---
+# The default session's camera is opened on its first request, like any other
+# session's; while it cannot be opened its reader retries in the background.
 
 
 @app.route('/')
@@ -361,34 +399,115 @@ def index():
     """Render the main HTML page."""
     return render_template('index.html')
 
-@app.route('/video_feed')
-def video_feed():
+@app.route('/video_feed', defaults={'session_id': DEFAULT_SESSION_ID})
+@app.route('/video_feed/<session_id>')
+def video_feed(session_id):
+    """
+    Endpoint to stream video frames of a session.
+    Uses multipart/x-mixed-replace for MJPEG streaming. All clients of a session
+    share the frames produced by its background pipeline. Optional query
+    parameters: width (max frame width), quality (JPEG quality) and fps (max frame rate).
+    """
+    width = request.args.get('width', 0, type=int)
+    quality = request.args.get('quality', VIDEO_FEED_DEFAULT_QUALITY, type=int)
+    fps = request.args.get('fps', 0, type=float)
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f"Unknown or unavailable session '{session_id}'"}), 404
+    profile = negotiate_profile(width, quality)
+    fps = min(fps, VIDEO_FEED_MAX_FPS) if fps > 0 else 0
+    return Response(stream_session(session, profile, fps), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/analytics', defaults={'session_id': DEFAULT_SESSION_ID})
+@app.route('/analytics/<session_id>')
+def analytics(session_id):
+    """
+    Endpoint to provide real-time analytics data of a session.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f"Unknown or unavailable session '{session_id}'"}), 404
+    return jsonify(session.analytics())
+
+@app.route('/analytics_stream', defaults={'session_id': DEFAULT_SESSION_ID})
+@app.route('/analytics_stream/<session_id>')
+def analytics_stream(session_id):
+    """
+    Endpoint pushing a session's analytics changes as Server-Sent Events.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f"Unknown or unavailable session '{session_id}'"}), 404
+    if not analytics_stream_slots.acquire(blocking=False):
+        # The dashboard falls back to polling /analytics when its stream is refused
+        return jsonify({'error': f"Too many analytics streams (max {ANALYTICS_MAX_STREAMS}). Poll /analytics."}), 503
+    session.pipeline.start() # Analytics are only produced while the pipeline runs
+    response = Response(stream_analytics(session), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(analytics_stream_slots.release) # Runs when the client disconnects
+    return response
+
+@app.route('/events', defaults={'session_id': None})
+@app.route('/events/<session_id>')
+def events(session_id):
+    """
+    Endpoint listing recorded alert intervals, newest first, for all sessions
+    or one session. Optional query parameters: type (alert type), since/until
+    (epoch seconds, bounding the start time), limit and offset.
+    """
+    alert_type = request.args.get('type')
+    if alert_type is not None and alert_type not in ALERT_TYPES:
+        return jsonify({'error': f"Unknown alert type '{alert_type}'. Expected one of {list(ALERT_TYPES)}."}), 400
+    limit = min(max(1, request.args.get('limit', EVENTS_PAGE_SIZE, type=int)), EVENTS_MAX_PAGE_SIZE)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    found, total = event_log.query(session_id, alert_type, request.args.get('since', type=float),
+                                   request.args.get('until', type=float), limit, offset)
+    next_offset = offset + len(found) if offset + len(found) < total else None
+    return jsonify({'events': found, 'total': total, 'limit': limit, 'offset': offset, 'next_offset': next_offset})
+
+@app.route('/sources')
+def sources_status():
+    """
+    Endpoint listing every configured video source with its connection state,
+    frame rate, age of the last frame, reconnect count and whether it is stale.
+    """
+    return jsonify({'sources': source_manager.status(), 'stale': source_manager.stale()})
+
+@app.route('/metrics')
+def metrics_endpoint():
     """
-    Endpoint to stream video frames.
-    Uses multipart/x-mixed-replace for MJPEG streaming.
+    Endpoint exposing stage timings, frame rates, queue depths and dropped
+    frames in the Prometheus text format.
     """
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/analytics')
-def analytics():
+@app.route('/workers')
+def workers():
     """
-    Endpoint to provide real-time analytics data.
+    Endpoint to provide per-worker throughput metrics of the detection pool.
     """
-    return jsonify({
-        'face_count': global_face_count,
-        'sleeping_status': global_sleeping_status,
-        'focus_score': round(global_focus_score, 2),
-        'unauthorized_activity': global_unauthorized_activity_status,
-        'copy_attempt': global_copy_attempt_status,
-        'proctoring_alert': global_proctoring_alert_status,
-        'alert_type': global_current_alert_type 
-    })
+    if detection_pool is None:
+        return jsonify({'workers': [], 'mode': 'in-process'})
+    return jsonify({'workers': detection_pool.stats(), 'mode': 'pool'})
 
 
+_record_startup("import", time.perf_counter() - _import_started)
+
 if __name__ == '__main__':
 
+    # With debug=True the reloader re-runs this file in a child process that serves
+    # the requests; only that one needs the models and the pool
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()
+        start_detection_pool()
+        start_ingest()
+
     import atexit
-    atexit.register(lambda: camera.release())
+    # atexit runs these in reverse order: sessions are closed (ending their alert intervals)
+    # before the pool stops and the event log flushes
+    atexit.register(event_log.close)
+    atexit.register(lambda: detection_pool is not None and detection_pool.stop())
+    atexit.register(lambda: [sessions.remove(session.session_id) for session in sessions])
 
     print(f"Flask app starting. Access at http://127.0.0.1:5000/")
     print("Make sure 'haarcascade_frontalface_default.xml' and 'shape_predictor_68_face_landmarks.dat' are in the same directory.")
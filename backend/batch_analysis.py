@@ -0,0 +1,216 @@
+"""
+Offline batch analysis of recorded exam videos.
+
+Runs the same face location and alert rules as the live feed over every video
+in a directory, headlessly (no overlays, no JPEG encoding), and writes one
+per-frame timeline per video with EAR, MAR, head yaw and pitch (in degrees),
+focus score and alert type, named after the video's file name (e.g.
+'exam.mp4.csv'). Videos are analysed in parallel worker processes, and --frame-step N only
+decodes and analyses every Nth frame (skipped frames are grabbed, not decoded).
+The alert rules are time-based, so skipping frames does not change their timing.
+
+Usage: python batch_analysis.py VIDEO_DIR [--output-dir timelines] [--format csv|parquet]
+                                [--frame-step 1] [--jobs N]
+"""
+import argparse
+import csv
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import dlib
+
+from detection import perform_ai_detection
+from face_detectors import DETECTOR_BACKENDS, create_face_detector
+from face_tracking import DETECTION_MODES, FaceLocator, locate_faces
+from monitor import MonitorSession
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.webm', '.m4v')
+TIMELINE_COLUMNS = ['video', 'frame', 'timestamp', 'face_count', 'ear', 'mar', 'yaw', 'pitch',
+                    'focus_score', 'alert_type']
+
+predictor = None # Loaded once per worker process by _init_worker
+
+
+def _init_worker(predictor_path):
+    global predictor
+    try:
+        predictor = dlib.shape_predictor(predictor_path)
+    except Exception as e:
+        print(f"Error loading dlib shape predictor: {e}. EAR/MAR/head pose will be empty.")
+        predictor = None
+
+
+def write_timeline(rows, path, output_format):
+    if output_format == "parquet":
+        import pandas as pd
+        pd.DataFrame(rows, columns=TIMELINE_COLUMNS).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=TIMELINE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def analyse_video(path, options):
+    """
+    Analyses one video and writes its timeline. Returns a summary dict.
+    Timestamps come from the video's frame rate, so absence timing matches the recording.
+    """
+    start = time.perf_counter()
+    name = os.path.basename(path)
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        return {'video': name, 'error': "could not open video"}
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if not fps or fps != fps: # Missing or NaN frame rate
+        fps = 30.0
+
+    face_locator = FaceLocator(create_face_detector(options['detector']), options['mode'],
+                               options['redetect_interval'], options['min_confidence'])
+    session = MonitorSession(name, path, face_locator)
+    session.last_person_detected_time = 0.0 # Video time, not wall clock
+
+    rows = []
+    alert_counts = {}
+    frame_index = 0
+    while True:
+        if frame_index % options['frame_step'] != 0:
+            if not capture.grab():
+                break
+            frame_index += 1
+            continue
+        success, frame = capture.read()
+        if not success:
+            break
+
+        timestamp = frame_index / fps
+        rects, landmarks = locate_faces(face_locator, predictor, frame, options['scale'], options['min_width'])
+        alert_type = perform_ai_detection(session, (frame.shape[1], frame.shape[0]), rects, landmarks,
+                                          current_time=timestamp)
+        if alert_type is not None:
+            alert_counts[alert_type] = alert_counts.get(alert_type, 0) + 1
+        rows.append({
+            'video': name,
+            'frame': frame_index,
+            'timestamp': round(timestamp, 3),
+            'face_count': session.face_count,
+            'ear': session.ear,
+            'mar': session.mar,
+            'yaw': session.yaw_degrees,
+            'pitch': session.pitch_degrees,
+            'focus_score': round(session.focus_score, 2),
+            'alert_type': alert_type,
+        })
+        frame_index += 1
+    capture.release()
+
+    # Named after the full file name, so 'a.mp4' and 'a.avi' get separate timelines
+    output_path = os.path.join(options['output_dir'], f"{name}.{options['format']}")
+    write_timeline(rows, output_path, options['format'])
+    elapsed = time.perf_counter() - start
+    return {
+        'video': name,
+        'output': output_path,
+        'frames': frame_index,
+        'analysed': len(rows),
+        'video_seconds': frame_index / fps,
+        'elapsed': elapsed,
+        'alerts': alert_counts,
+    }
+
+
+def _analyse_video_task(task):
+    # A video that fails (e.g. a corrupt file) is reported in the summary instead of ending the whole run
+    path, options = task
+    try:
+        return analyse_video(path, options)
+    except Exception as e:
+        return {'video': os.path.basename(path), 'error': f"{type(e).__name__}: {e}"}
+
+
+def find_videos(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_dir", help="Directory of recorded videos")
+    parser.add_argument("--output-dir", default="timelines", help="Where timelines are written")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Timeline file format")
+    parser.add_argument("--frame-step", type=int, default=1, help="Analyse every Nth frame")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Videos analysed in parallel")
+    parser.add_argument("--detector", choices=DETECTOR_BACKENDS, default="hog", help="Face detector backend")
+    parser.add_argument("--mode", choices=DETECTION_MODES, default="full", help="Face detection mode")
+    parser.add_argument("--redetect-interval", type=int, default=10, help="Frames between detections in tracker mode")
+    parser.add_argument("--min-confidence", type=float, default=7.0, help="Tracker confidence threshold")
+    parser.add_argument("--scale", type=float, default=1.0, help="Detection scale (as DETECTION_SCALE in app.py)")
+    parser.add_argument("--min-width", type=int, default=640, help="Minimum detection frame width")
+    parser.add_argument("--predictor", default="shape_predictor_68_face_landmarks.dat", help="dlib 68-point model")
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pandas # noqa: F401
+            import pyarrow # noqa: F401
+        except ImportError:
+            parser.error("Parquet output needs pandas and pyarrow (pip install pandas pyarrow).")
+
+    videos = find_videos(args.video_dir)
+    if not videos:
+        print(f"No videos found in {args.video_dir}.")
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    options = {
+        'output_dir': args.output_dir,
+        'format': args.format,
+        'frame_step': max(1, args.frame_step),
+        'detector': args.detector,
+        'mode': args.mode,
+        'redetect_interval': args.redetect_interval,
+        'min_confidence': args.min_confidence,
+        'scale': args.scale,
+        'min_width': args.min_width,
+    }
+    tasks = [(path, options) for path in videos]
+    jobs = max(1, min(args.jobs, len(videos)))
+    print(f"Analysing {len(videos)} videos with {jobs} worker processes...")
+
+    start = time.perf_counter()
+    if jobs == 1:
+        _init_worker(args.predictor)
+        results = map(_analyse_video_task, tasks)
+        pool = None
+    else:
+        pool = Pool(jobs, initializer=_init_worker, initargs=(args.predictor,))
+        results = pool.imap_unordered(_analyse_video_task, tasks)
+
+    total_video_seconds = 0.0
+    failed = []
+    for summary in results:
+        if 'error' in summary:
+            print(f"  {summary['video']}: Error: {summary['error']}")
+            failed.append(summary['video'])
+            continue
+        total_video_seconds += summary['video_seconds']
+        speed = summary['video_seconds'] / summary['elapsed'] if summary['elapsed'] > 0 else 0.0
+        print(f"  {summary['video']}: {summary['analysed']}/{summary['frames']} frames analysed in "
+              f"{summary['elapsed']:.1f}s ({speed:.1f}x real time), alerts {summary['alerts']} -> {summary['output']}")
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total_video_seconds:.0f}s of video in {elapsed:.1f}s "
+          f"({total_video_seconds / elapsed if elapsed > 0 else 0.0:.1f}x real time).")
+    if failed:
+        print(f"{len(failed)} of {len(videos)} videos failed: {', '.join(sorted(failed))}")
+
+
+if __name__ == "__main__":
+    main()
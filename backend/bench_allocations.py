@@ -0,0 +1,109 @@
+"""
+Measures per-frame memory allocation of the capture -> detect -> draw -> encode
+path with fresh buffers (as before) and with reused buffers (FrameBufferPool for
+frames, scratch buffers for the downscaled/grayscale detection images and the
+resized stream image).
+
+Frames are replayed from a fixture, unpaced, in one thread. tracemalloc (which
+also sees NumPy and OpenCV image allocations) reports the bytes allocated
+within each frame and the traced memory after the run; the garbage collector's
+collection counts and the time per frame are reported too.
+
+Usage: python bench_allocations.py [--source synthetic|VIDEO] [--frames 300] [--face-image FACE.jpg]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import cv2
+import dlib
+import numpy as np
+
+from buffers import FrameBufferPool
+from detection import draw_detections
+from face_tracking import FaceLocator, locate_faces
+from frame_sources import FixtureFrameSource, SYNTHETIC_SOURCE, load_video_frames, synthetic_frames
+from pipeline import encode_chunk, negotiate_profile
+
+
+def run(frames, predictor, pooled, args):
+    source = FixtureFrameSource(frames, fps=0)
+    face_locator = FaceLocator(dlib.get_frontal_face_detector(), "tracker", 10, 7.0)
+    buffer_pool = FrameBufferPool(2)
+    profile = negotiate_profile(args.client_width, 80)
+    encode_scratch = {} if pooled else None
+
+    gc.collect()
+    collections_before = sum(stats['collections'] for stats in gc.get_stats())
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    per_frame = []
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        tracemalloc.reset_peak()
+        frame_start = tracemalloc.get_traced_memory()[0]
+
+        buffer = buffer_pool.acquire() if pooled else None
+        success, frame = source.read(buffer)
+        if pooled and frame is not buffer:
+            buffer_pool.adopt(frame)
+        if not pooled:
+            face_locator.scratch = {} # Fresh detection images every frame, as before
+        rects, landmarks = locate_faces(face_locator, predictor, frame, 0.5, 640)
+        draw_detections(frame, rects, landmarks)
+        encode_chunk(frame, profile, encode_scratch)
+        if pooled:
+            buffer_pool.release(frame)
+
+        per_frame.append(tracemalloc.get_traced_memory()[1] - frame_start)
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    collections = sum(stats['collections'] for stats in gc.get_stats()) - collections_before
+    return {
+        'mean_kb_per_frame': np.mean(per_frame) / 1024,
+        'max_kb_per_frame': np.max(per_frame) / 1024,
+        'retained_kb': retained / 1024,
+        'gc_collections': collections,
+        'ms_per_frame': elapsed / args.frames * 1000,
+        'frame_buffers': buffer_pool.allocated if pooled else args.frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=SYNTHETIC_SOURCE, help="'synthetic' or the path of a recorded video")
+    parser.add_argument("--face-image", help="Face photo panned across the synthetic clip")
+    parser.add_argument("--width", type=int, default=1280, help="Synthetic frame width")
+    parser.add_argument("--height", type=int, default=720, help="Synthetic frame height")
+    parser.add_argument("--frames", type=int, default=300, help="Frames processed per mode")
+    parser.add_argument("--client-width", type=int, default=640, help="Width of the encoded stream profile")
+    parser.add_argument("--predictor", default="shape_predictor_68_face_landmarks.dat", help="dlib 68-point model")
+    args = parser.parse_args()
+
+    if args.source == SYNTHETIC_SOURCE:
+        face_image = cv2.imread(args.face_image) if args.face_image else None
+        frames = synthetic_frames(args.width, args.height, 60, face_image)
+    else:
+        frames = load_video_frames(args.source, 60)
+    if not frames:
+        print(f"Error: No frames could be read from {args.source}.")
+        return
+    try:
+        predictor = dlib.shape_predictor(args.predictor)
+    except Exception as e:
+        print(f"Warning: Could not load shape predictor ({e}); landmarks are skipped.")
+        predictor = None
+
+    height, width = frames[0].shape[:2]
+    print(f"{args.frames} frames of {width}x{height}, stream profile width {args.client_width}")
+    for label, pooled in (("fresh buffers", False), ("reused buffers", True)):
+        result = run(frames, predictor, pooled, args)
+        print(f"{label:<15} allocated {result['mean_kb_per_frame']:8.1f} KiB/frame (max {result['max_kb_per_frame']:.1f})  "
+              f"retained {result['retained_kb']:7.1f} KiB  frame buffers {result['frame_buffers']:<4} "
+              f"gc runs {result['gc_collections']:<4} {result['ms_per_frame']:.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmarks the downscaled-detection / full-resolution-landmark path.
+
+Frames from the input video are resized to 480p, 720p and 1080p. For each
+resolution the per-frame latency of face detection plus landmark prediction is
+measured for the original path (full-frame grayscale, HOG on the full frame)
+and for the scaled path (HOG on a frame resized by --scale, but never below
+--min-width pixels, landmarks on a full-resolution crop). Recall is the share
+of the faces found by the original path that the scaled path also finds
+(IoU >= 0.5); faces too small for HOG at the detection scale are lost. The
+mean landmark deviation on faces found by both paths shows how much EAR/MAR
+precision is preserved.
+
+Usage: python bench_detection_scale.py VIDEO [--scale 0.5] [--min-width 640] [--max-frames 60]
+"""
+import argparse
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from bench_detectors import iou
+from face_tracking import detection_scale_for, predict_landmarks, prepare_detection_frame, scale_rects
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def original_path(detector, predictor, frame):
+    """Returns [(rect, landmarks)] for every face, as the original code found them."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return [(rect, np.array([(p.x, p.y) for p in predictor(gray, rect).parts()])) for rect in detector(gray, 0)]
+
+
+def scaled_path(detector, predictor, frame, scale):
+    rects = scale_rects(detector(prepare_detection_frame(frame, scale), 0), scale)
+    return [(rect, predict_landmarks(predictor, frame, rect)) for rect in rects]
+
+
+def match_faces(original, scaled, min_iou=0.5):
+    """Pairs each original face with the best-overlapping scaled face; returns the matched pairs."""
+    remaining = list(scaled)
+    pairs = []
+    for face in original:
+        if not remaining:
+            break
+        best = max(remaining, key=lambda other: iou(face[0], other[0]))
+        if iou(face[0], best[0]) >= min_iou:
+            pairs.append((face, best))
+            remaining.remove(best)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="Path to a recorded video containing a face")
+    parser.add_argument("--scale", type=float, default=0.5, help="Detection scale of the scaled path")
+    parser.add_argument("--min-width", type=int, default=640, help="Minimum detection frame width")
+    parser.add_argument("--max-frames", type=int, default=60, help="Frames to benchmark per resolution")
+    parser.add_argument("--predictor", default="shape_predictor_68_face_landmarks.dat", help="dlib 68-point model")
+    args = parser.parse_args()
+
+    detector = dlib.get_frontal_face_detector()
+    predictor = dlib.shape_predictor(args.predictor)
+
+    capture = cv2.VideoCapture(args.video)
+    frames = []
+    while len(frames) < args.max_frames:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    if not frames:
+        print(f"Error: No frames could be read from {args.video}.")
+        return
+
+    print(f"Frames per resolution: {len(frames)}, detection scale: {args.scale}, min width: {args.min_width}")
+    print(f"{'input':<8}{'scale':>7}{'original ms':>13}{'scaled ms':>11}{'speed-up':>10}{'faces (orig/scaled)':>21}"
+          f"{'recall':>9}{'landmark dev px':>17}")
+    for name, size in RESOLUTIONS.items():
+        resized = [cv2.resize(frame, size) for frame in frames]
+        scale = detection_scale_for(resized[0], args.scale, args.min_width)
+        original_time = scaled_time = 0.0
+        original_found = scaled_found = matched = 0
+        deviations = []
+        for frame in resized:
+            start = time.perf_counter()
+            original = original_path(detector, predictor, frame)
+            original_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            scaled = scaled_path(detector, predictor, frame, scale)
+            scaled_time += time.perf_counter() - start
+
+            original_found += len(original)
+            scaled_found += len(scaled)
+            pairs = match_faces(original, scaled)
+            matched += len(pairs)
+            deviations.extend(np.linalg.norm(a[1] - b[1], axis=1).mean() for a, b in pairs)
+
+        original_ms = original_time / len(resized) * 1000
+        scaled_ms = scaled_time / len(resized) * 1000
+        deviation = f"{np.mean(deviations):.2f}" if deviations else "n/a"
+        recall = f"{matched / original_found:.1%}" if original_found else "n/a"
+        print(f"{name:<8}{scale:>7.2f}{original_ms:>13.2f}{scaled_ms:>11.2f}{original_ms / scaled_ms:>10.2f}"
+              f"{f'{original_found}/{scaled_found}':>21}{recall:>9}{deviation:>17}")
+
+
+if __name__ == "__main__":
+    main()
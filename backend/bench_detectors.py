@@ -0,0 +1,123 @@
+"""
+Compares the face detector backends (see face_detectors.py) on speed and recall.
+
+Every backend runs on the same fixture frames the way the live feed runs it:
+on the frame downscaled by --scale (never below --min-width), in "full" mode
+so every frame is detected (no tracking). Recall is measured against a
+reference detector run at full resolution with one upsampling step (by
+default dlib's HOG, which favours HOG; pass --reference dnn to judge the other
+backends against the DNN): a reference face counts as found when a backend's
+box overlaps it with IoU >= --min-iou. Boxes without a reference face are
+reported as extra detections per frame (false positives, or faces the
+reference missed).
+
+The fixture is a recorded video or, by default, a generated clip; pass
+--face-image to pan a face photo across it. Backends whose model files are
+missing are skipped.
+
+Usage: python bench_detectors.py [--source synthetic|VIDEO] [--face-image FACE.jpg]
+                                 [--backends hog haar dnn] [--frames 100]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from face_detectors import DETECTOR_BACKENDS, create_face_detector
+from face_tracking import detection_scale_for, downscale_frame, prepare_detection_frame, scale_rects
+from frame_sources import SYNTHETIC_SOURCE, load_video_frames, synthetic_frames
+
+
+def iou(a, b):
+    """Intersection over union of two dlib rectangles."""
+    inter = a.intersect(b)
+    if inter.is_empty():
+        return 0.0
+    inter_area = inter.area()
+    return inter_area / float(a.area() + b.area() - inter_area)
+
+
+def count_matches(reference, candidate, min_iou):
+    """Greedily matches reference boxes with candidate boxes; returns the number matched."""
+    remaining = list(candidate)
+    matched = 0
+    for ref in reference:
+        if not remaining:
+            break
+        best = max(remaining, key=lambda rect: iou(ref, rect))
+        if iou(ref, best) >= min_iou:
+            matched += 1
+            remaining.remove(best)
+    return matched
+
+
+def detect(detector, frame, scale, min_width, upsample=0):
+    """Runs a backend on a frame as locate_faces does; returns rectangles in frame coordinates."""
+    detection_scale = detection_scale_for(frame, scale, min_width)
+    color = downscale_frame(frame, detection_scale)
+    image = color if detector.needs_color else prepare_detection_frame(color, 1.0)
+    return scale_rects(detector(image, upsample), detection_scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=SYNTHETIC_SOURCE, help="'synthetic' or the path of a recorded video")
+    parser.add_argument("--face-image", help="Face photo panned across the synthetic clip")
+    parser.add_argument("--width", type=int, default=1280, help="Synthetic frame width")
+    parser.add_argument("--height", type=int, default=720, help="Synthetic frame height")
+    parser.add_argument("--frames", type=int, default=100, help="Fixture frames to evaluate")
+    parser.add_argument("--backends", nargs="+", choices=DETECTOR_BACKENDS, default=list(DETECTOR_BACKENDS),
+                        help="Backends to compare")
+    parser.add_argument("--reference", choices=DETECTOR_BACKENDS, default="hog", help="Backend used as ground truth")
+    parser.add_argument("--scale", type=float, default=1.0, help="Detection scale (as DETECTION_SCALE in app.py)")
+    parser.add_argument("--min-width", type=int, default=640, help="Minimum detection frame width")
+    parser.add_argument("--min-iou", type=float, default=0.3,
+                        help="Overlap for a box to match a reference face (backends frame faces differently)")
+    parser.add_argument("--dnn-confidence", type=float, default=0.6, help="Confidence threshold of the DNN backend")
+    args = parser.parse_args()
+
+    if args.source == SYNTHETIC_SOURCE:
+        face_image = cv2.imread(args.face_image) if args.face_image else None
+        if args.face_image and face_image is None:
+            raise SystemExit(f"Error: Could not read face image {args.face_image}.")
+        frames = synthetic_frames(args.width, args.height, args.frames, face_image)
+    else:
+        frames = load_video_frames(args.source, args.frames)
+    if not frames:
+        raise SystemExit(f"Error: No frames could be read from {args.source}.")
+
+    options = {'dnn': {'confidence': args.dnn_confidence}}
+    try:
+        reference = create_face_detector(args.reference, options)
+    except (IOError, cv2.error) as e:
+        raise SystemExit(f"Error: Could not load the reference detector '{args.reference}': {str(e).strip()}")
+    truth = [list(detect(reference, frame, 1.0, 0, upsample=1)) for frame in frames]
+    total_faces = sum(len(faces) for faces in truth)
+
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {width}x{height}, detection scale {args.scale} (min width {args.min_width}), "
+          f"{total_faces} reference faces from '{args.reference}'")
+    print(f"{'backend':<10}{'ms/frame':>10}{'p95 ms':>10}{'recall':>10}{'extra/frame':>13}")
+    for backend in args.backends:
+        try:
+            detector = create_face_detector(backend, options)
+        except (IOError, cv2.error) as e:
+            print(f"{backend:<10}skipped: {str(e).strip()}")
+            continue
+        detect(detector, frames[0], args.scale, args.min_width) # Warm-up (the DNN allocates its buffers on first run)
+
+        timings, matched, found = [], 0, 0
+        for frame, faces in zip(frames, truth):
+            start = time.perf_counter()
+            rects = detect(detector, frame, args.scale, args.min_width)
+            timings.append(time.perf_counter() - start)
+            matched += count_matches(faces, rects, args.min_iou)
+            found += len(rects)
+        recall = matched / total_faces if total_faces else float('nan')
+        print(f"{backend:<10}{np.mean(timings) * 1000:>10.2f}{np.percentile(timings, 95) * 1000:>10.2f}"
+              f"{recall:>10.1%}{(found - matched) / len(frames):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
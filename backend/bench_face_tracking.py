@@ -0,0 +1,104 @@
+"""
+Measures the accuracy/latency trade-off of tracker-based face localisation.
+
+Every frame of the input video is processed by a "full" FaceLocator (HOG on
+every frame, used as ground truth) and by "tracker" FaceLocators with different
+re-detection intervals. For each setting it reports the mean localisation time
+per frame, how often the face count matches the full detector and the mean IoU
+of the matched face boxes.
+
+Usage: python bench_face_tracking.py VIDEO [--intervals 5 10 20] [--max-frames 300]
+"""
+import argparse
+import time
+
+import cv2
+import dlib
+
+from face_tracking import FaceLocator
+
+
+def iou(a, b):
+    """Intersection over union of two dlib rectangles."""
+    inter = a.intersect(b)
+    if inter.is_empty():
+        return 0.0
+    inter_area = inter.area()
+    return inter_area / float(a.area() + b.area() - inter_area)
+
+
+def mean_matched_iou(reference, candidate):
+    """Greedily matches each reference box with its best candidate box."""
+    if not reference:
+        return 1.0 if not candidate else 0.0
+    remaining = list(candidate)
+    total = 0.0
+    for ref in reference:
+        if not remaining:
+            break
+        best = max(remaining, key=lambda rect: iou(ref, rect))
+        total += iou(ref, best)
+        remaining.remove(best)
+    return total / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="Path to a recorded video (or a camera index)")
+    parser.add_argument("--intervals", type=int, nargs="+", default=[5, 10, 20], help="Re-detection intervals to compare")
+    parser.add_argument("--min-confidence", type=float, default=7.0, help="Tracker confidence threshold")
+    parser.add_argument("--max-frames", type=int, default=300, help="Stop after this many frames")
+    args = parser.parse_args()
+
+    source = int(args.video) if args.video.isdigit() else args.video
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        print(f"Error: Could not open video source {args.video}.")
+        return
+
+    detector = dlib.get_frontal_face_detector()
+    reference = FaceLocator(detector, mode="full")
+    candidates = {
+        interval: FaceLocator(detector, "tracker", interval, args.min_confidence)
+        for interval in args.intervals
+    }
+    timings = {"full": 0.0, **{interval: 0.0 for interval in candidates}}
+    count_matches = {interval: 0 for interval in candidates}
+    iou_totals = {interval: 0.0 for interval in candidates}
+
+    frames = 0
+    while frames < args.max_frames:
+        success, frame = capture.read()
+        if not success:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        start = time.perf_counter()
+        truth = list(reference.locate(gray))
+        timings["full"] += time.perf_counter() - start
+
+        for interval, locator in candidates.items():
+            start = time.perf_counter()
+            rects = list(locator.locate(gray))
+            timings[interval] += time.perf_counter() - start
+            count_matches[interval] += len(rects) == len(truth)
+            iou_totals[interval] += mean_matched_iou(truth, rects)
+        frames += 1
+    capture.release()
+
+    if frames == 0:
+        print("Error: No frames could be read from the video.")
+        return
+
+    print(f"Frames processed: {frames}")
+    print(f"{'mode':<16}{'ms/frame':>10}{'speed-up':>10}{'detections':>12}{'count match':>13}{'mean IoU':>10}")
+    full_ms = timings["full"] / frames * 1000
+    print(f"{'full':<16}{full_ms:>10.2f}{1.0:>10.2f}{reference.detections_run:>12}{'100.0%':>13}{1.0:>10.3f}")
+    for interval, locator in candidates.items():
+        ms = timings[interval] / frames * 1000
+        print(f"{f'tracker (N={interval})':<16}{ms:>10.2f}{full_ms / ms:>10.2f}{locator.detections_run:>12}"
+              f"{count_matches[interval] / frames:>12.1%}{iou_totals[interval] / frames:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
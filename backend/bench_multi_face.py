@@ -0,0 +1,150 @@
+"""
+Benchmarks the per-frame cost of analysing many faces at once.
+
+For each face count, a generated clip shows that many copies of a face photo
+on a grid, each drifting a little around its cell, and every frame runs the
+live detection path: face location, batched landmarks for up to --max-faces
+faces (largest first, as MAX_ANALYSED_FACES in app.py), the per-person alert
+rules and the overlays. Reports the mean and p95 per-frame latency, split into
+locating (detection/tracking + landmarks) and analysis (identity tracking,
+features and rules), the faces found and analysed per frame, and ID switches:
+how often the face in a grid cell got a different person ID than in the
+previous frame (0 when tracking is stable).
+
+Usage: python bench_multi_face.py --face-image FACE.jpg [--faces 1 5 10 20] [--frames 60]
+"""
+import argparse
+import math
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from detection import draw_detections, perform_ai_detection
+from face_detectors import DETECTOR_BACKENDS, create_face_detector
+from face_tracking import DETECTION_MODES, FaceLocator, locate_faces
+from frame_sources import SYNTHETIC_SOURCE
+from monitor import MonitorSession
+
+
+def crop_face(face_image, margin=0.6):
+    """Crops a photo to its (largest) face plus `margin` face widths per side, so tiles are mostly face."""
+    gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
+    rects = dlib.get_frontal_face_detector()(gray, 1)
+    if len(rects) == 0:
+        return face_image
+    rect = max(rects, key=lambda r: r.area())
+    pad_x, pad_y = int(rect.width() * margin), int(rect.height() * margin)
+    y0, x0 = max(0, rect.top() - pad_y), max(0, rect.left() - pad_x)
+    return face_image[y0:rect.bottom() + pad_y, x0:rect.right() + pad_x]
+
+
+def grid_frames(face_image, face_count, width, height, count, seed=0):
+    """
+    Generates `count` frames with `face_count` faces on a grid. Returns the
+    frames and the grid cells as (columns, cell width, cell height).
+    """
+    columns = math.ceil(math.sqrt(face_count * width / height))
+    rows = math.ceil(face_count / columns)
+    cell_w, cell_h = width // columns, height // rows
+    scale = 0.8 * min(cell_w / face_image.shape[1], cell_h / face_image.shape[0])
+    face = cv2.resize(face_image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    face_h, face_w = face.shape[:2]
+
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(40, 200, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    phases = rng.uniform(0, 2 * np.pi, face_count)
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        for cell in range(face_count):
+            # Each face drifts by up to half its spare room, so it never leaves its cell
+            phase = phases[cell] + 2 * np.pi * index / count
+            x = (cell % columns) * cell_w + int((cell_w - face_w) * (0.5 + 0.4 * np.sin(phase)))
+            y = (cell // columns) * cell_h + int((cell_h - face_h) * (0.5 + 0.4 * np.cos(phase)))
+            frame[y:y + face_h, x:x + face_w] = face
+        frames.append(frame)
+    return frames, (columns, cell_w, cell_h)
+
+
+def run(face_count, face_image, predictor, args):
+    frames, (columns, cell_w, cell_h) = grid_frames(face_image, face_count, args.width, args.height, args.frames)
+    face_locator = FaceLocator(create_face_detector(args.detector), args.mode, args.redetect_interval, 7.0)
+    session = MonitorSession(f"bench-{face_count}", SYNTHETIC_SOURCE, face_locator)
+
+    locate_times, analysis_times, found, analysed = [], [], [], []
+    cell_ids, switches = {}, 0
+    for index, frame in enumerate(frames):
+        timestamp = index / args.fps
+        start = time.perf_counter()
+        rects, landmarks = locate_faces(face_locator, predictor, frame, args.scale, args.min_width, args.max_faces)
+        located = time.perf_counter()
+        perform_ai_detection(session, (frame.shape[1], frame.shape[0]), rects, landmarks, current_time=timestamp)
+        draw_detections(frame, rects, landmarks, session.person_ids)
+        locate_times.append(located - start)
+        analysis_times.append(time.perf_counter() - located)
+        found.append(len(rects))
+        analysed.append(0 if landmarks is None else len(landmarks))
+
+        for rect, person_id in zip(rects, session.person_ids):
+            center = rect.center()
+            cell = (center.y // cell_h) * columns + center.x // cell_w
+            if cell in cell_ids and cell_ids[cell] != person_id:
+                switches += 1
+            cell_ids[cell] = person_id
+
+    totals = np.add(locate_times, analysis_times) * 1000
+    return {
+        'faces': face_count,
+        'found': np.mean(found),
+        'analysed': np.mean(analysed),
+        'locate_ms': np.mean(locate_times) * 1000,
+        'analysis_ms': np.mean(analysis_times) * 1000,
+        'mean_ms': np.mean(totals),
+        'p95_ms': np.percentile(totals, 95),
+        'id_switches': switches,
+        'persons': len(session.persons),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--face-image", required=True, help="Face photo tiled across the frames")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 2, 5, 10, 15, 20], help="Face counts to run")
+    parser.add_argument("--width", type=int, default=1920, help="Frame width")
+    parser.add_argument("--height", type=int, default=1080, help="Frame height")
+    parser.add_argument("--frames", type=int, default=60, help="Frames per face count")
+    parser.add_argument("--fps", type=float, default=30, help="Frame rate the timestamps assume")
+    parser.add_argument("--max-faces", type=int, default=16, help="Faces analysed per frame (largest first)")
+    parser.add_argument("--detector", choices=DETECTOR_BACKENDS, default="hog", help="Face detector backend")
+    parser.add_argument("--mode", choices=DETECTION_MODES, default="full", help="Face detection mode")
+    parser.add_argument("--redetect-interval", type=int, default=10, help="Frames between detections")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Detection scale (HOG misses faces under ~80 px, so small tiles need 1.0)")
+    parser.add_argument("--min-width", type=int, default=640, help="Minimum detection frame width")
+    parser.add_argument("--predictor", default="shape_predictor_68_face_landmarks.dat", help="dlib 68-point model")
+    args = parser.parse_args()
+
+    face_image = cv2.imread(args.face_image)
+    if face_image is None:
+        raise SystemExit(f"Error: Could not read face image {args.face_image}.")
+    face_image = crop_face(face_image)
+    try:
+        predictor = dlib.shape_predictor(args.predictor)
+    except Exception as e:
+        raise SystemExit(f"Error: Could not load shape predictor ({e}).")
+
+    print(f"{args.frames} frames of {args.width}x{args.height} per face count, detector '{args.detector}' "
+          f"({args.mode}), scale {args.scale}, at most {args.max_faces} analysed faces")
+    print(f"{'faces':>6}{'found':>8}{'analysed':>10}{'locate ms':>11}{'analysis ms':>13}"
+          f"{'mean ms':>10}{'p95 ms':>10}{'ID switches':>13}")
+    for face_count in args.faces:
+        result = run(face_count, face_image, predictor, args)
+        print(f"{result['faces']:>6}{result['found']:>8.1f}{result['analysed']:>10.1f}{result['locate_ms']:>11.1f}"
+              f"{result['analysis_ms']:>13.1f}{result['mean_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['id_switches']:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Reproducible end-to-end benchmark of the frame pipeline, no webcam needed.
+
+Every stream replays the same fixture through a FixtureFrameSource paced like a
+camera (--fps), and runs the full live path: face location, landmarks, alert
+rules, drawing and JPEG encoding for one /video_feed client. Each stream count
+runs in a fresh process and reports the aggregate and per-stream frames/sec,
+p50/p99 per-frame latency (camera read to encoded chunk), frames dropped
+because detection could not keep up, and the process's peak RSS.
+
+The fixture is either a recorded video (decoded once into memory) or a
+generated clip with the --face-image photo panning across it. Either way it
+must show a face, so landmarks, features and the alert rules are measured
+too: the run stops if no face is found in a sample of the fixture.
+
+Usage: python bench_pipeline.py --face-image FACE.jpg [--streams 1 4 16] [--duration 10] [--json results.json]
+       python bench_pipeline.py --source VIDEO [--streams 1 4 16] [--duration 10] [--json results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import threading
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from detection import draw_detections, perform_ai_detection
+from face_detectors import DETECTOR_BACKENDS, create_face_detector
+from face_tracking import DETECTION_MODES, FaceLocator, locate_faces
+from frame_sources import FixtureFrameSource, SYNTHETIC_SOURCE, load_video_frames, synthetic_frames
+from monitor import MonitorSession
+from pipeline import FramePipeline, negotiate_profile
+
+
+def load_fixture(args):
+    if args.source == SYNTHETIC_SOURCE:
+        face_image = cv2.imread(args.face_image)
+        if face_image is None:
+            raise SystemExit(f"Error: Could not read face image {args.face_image}.")
+        return synthetic_frames(args.width, args.height, args.fixture_frames, face_image)
+    frames = load_video_frames(args.source, args.fixture_frames)
+    if not frames:
+        raise SystemExit(f"Error: No frames could be read from {args.source}.")
+    return frames
+
+
+def load_predictor(args):
+    try:
+        return dlib.shape_predictor(args.predictor)
+    except Exception as e:
+        raise SystemExit(f"Error: Could not load shape predictor ({e}).")
+
+
+def check_fixture(args, sample_step=10):
+    """
+    Runs face location on every `sample_step`th fixture frame and returns the
+    fraction of sampled frames with analysed faces; exits if there are none, as
+    the run would then only measure detection and encoding.
+    """
+    frames = load_fixture(args)[::sample_step]
+    predictor = load_predictor(args)
+    face_locator = FaceLocator(create_face_detector(args.detector), "full", args.redetect_interval, 7.0)
+    analysed = sum(locate_faces(face_locator, predictor, frame, args.scale, args.min_width)[1] is not None
+                   for frame in frames)
+    if analysed == 0:
+        raise SystemExit(f"Error: No face found in {len(frames)} sampled fixture frames; "
+                         f"the benchmark would not exercise landmarks, features or alert rules.")
+    return analysed / len(frames)
+
+
+def build_stream(index, frames, predictor, args, latencies):
+    """A session + pipeline analysing frames the way app.process_frame does."""
+    face_locator = FaceLocator(create_face_detector(args.detector), args.mode, args.redetect_interval, 7.0)
+    session = MonitorSession(f"bench-{index}", SYNTHETIC_SOURCE, face_locator)
+
+    def analyse(frame):
+        rects, landmarks = locate_faces(face_locator, predictor, frame, args.scale, args.min_width)
+        session.current_alert_type = perform_ai_detection(session, (frame.shape[1], frame.shape[0]), rects, landmarks)
+        draw_detections(frame, rects, landmarks, session.person_ids)
+        session.publish_analytics()
+
+    source = FixtureFrameSource(frames, args.fps)
+    session.pipeline = FramePipeline(source, SYNTHETIC_SOURCE, analyse, latency_sink=latencies.append)
+    return session
+
+
+def run_streams(num_streams, args):
+    """Runs num_streams pipelines (in this process) and returns their measurements."""
+    frames = load_fixture(args)
+    predictor = load_predictor(args)
+
+    latencies = []
+    sessions = [build_stream(index, frames, predictor, args, latencies) for index in range(num_streams)]
+    profile = negotiate_profile(args.client_width, args.client_quality)
+    stop = threading.Event()
+
+    def client(session):
+        # One /video_feed client per stream keeps the encoder busy
+        for _ in session.pipeline.frames(profile):
+            if stop.is_set():
+                break
+
+    clients = [threading.Thread(target=client, args=(session,), daemon=True) for session in sessions]
+    for thread in clients:
+        thread.start()
+
+    time.sleep(args.warmup)
+    encoded_before = sum(session.pipeline.frame_rates['encode'].count for session in sessions)
+    dropped_before = sum(session.pipeline.capture_queue.dropped for session in sessions)
+    del latencies[:]
+    start = time.perf_counter()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - start
+    encoded = sum(session.pipeline.frame_rates['encode'].count for session in sessions) - encoded_before
+    dropped = sum(session.pipeline.capture_queue.dropped for session in sessions) - dropped_before
+    measured = np.array(latencies) * 1000.0
+
+    stop.set()
+    for session in sessions:
+        session.close()
+    return {
+        'streams': num_streams,
+        'fps_total': round(encoded / elapsed, 2),
+        'fps_per_stream': round(encoded / elapsed / num_streams, 2),
+        'latency_p50_ms': round(float(np.percentile(measured, 50)), 2) if measured.size else None,
+        'latency_p99_ms': round(float(np.percentile(measured, 99)), 2) if measured.size else None,
+        'dropped_frames': dropped,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1), # KiB on Linux
+    }
+
+
+def _run_in_child(num_streams, args, results):
+    results.put(run_streams(num_streams, args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=SYNTHETIC_SOURCE, help="'synthetic' or the path of a recorded video")
+    parser.add_argument("--face-image", help="Face photo panned across the synthetic clip (required for it)")
+    parser.add_argument("--width", type=int, default=640, help="Synthetic frame width")
+    parser.add_argument("--height", type=int, default=480, help="Synthetic frame height")
+    parser.add_argument("--fixture-frames", type=int, default=90, help="Frames in the replayed fixture")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16], help="Simultaneous stream counts")
+    parser.add_argument("--fps", type=float, default=30, help="Camera frame rate of each stream (0 = unpaced)")
+    parser.add_argument("--duration", type=float, default=10, help="Measured seconds per stream count")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds before measuring")
+    parser.add_argument("--client-width", type=int, default=0, help="Max width requested by each client")
+    parser.add_argument("--client-quality", type=int, default=95, help="JPEG quality requested by each client")
+    parser.add_argument("--detector", choices=DETECTOR_BACKENDS, default="hog", help="Face detector backend")
+    parser.add_argument("--mode", choices=DETECTION_MODES, default="full", help="Face detection mode")
+    parser.add_argument("--redetect-interval", type=int, default=10, help="Frames between detections")
+    parser.add_argument("--scale", type=float, default=1.0, help="Detection scale (as DETECTION_SCALE in app.py)")
+    parser.add_argument("--min-width", type=int, default=640, help="Minimum detection frame width")
+    parser.add_argument("--predictor", default="shape_predictor_68_face_landmarks.dat", help="dlib 68-point model")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.source == SYNTHETIC_SOURCE and not args.face_image:
+        parser.error("the synthetic clip needs --face-image (or pass --source VIDEO with a face in it)")
+
+    print(f"Python {platform.python_version()}, OpenCV {cv2.__version__}, dlib {dlib.__version__}, "
+          f"CPU cores: {os.cpu_count()}")
+    print(f"Source: {args.source}, camera fps: {args.fps}, detector: {args.detector}, mode: {args.mode}, {args.duration}s per run")
+    print(f"Faces analysed in {check_fixture(args):.0%} of sampled fixture frames")
+    # A fresh process per stream count keeps peak RSS and warm caches separate
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for num_streams in args.streams:
+        queue = context.Queue()
+        process = context.Process(target=_run_in_child, args=(num_streams, args, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        results.append(result)
+        print(f"streams={result['streams']:<3} total {result['fps_total']:8.2f} fps  "
+              f"per stream {result['fps_per_stream']:6.2f} fps  "
+              f"p50 {result['latency_p50_ms']} ms  p99 {result['latency_p99_ms']} ms  "
+              f"dropped {result['dropped_frames']:<6} peak RSS {result['peak_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({'args': vars(args), 'results': results}, handle, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
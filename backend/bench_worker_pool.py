@@ -0,0 +1,86 @@
+"""
+Measures how face detection throughput scales with the DetectionPool size.
+
+Frames of the input video are replayed as --streams concurrent sessions, each
+with its own detection thread submitting one frame at a time (as a session's
+pipeline does). For every worker count the aggregate frames/sec and the
+per-worker throughput metrics are reported.
+
+Usage: python bench_worker_pool.py VIDEO [--streams 20] [--workers 1 2 4] [--frames 30]
+"""
+import argparse
+import os
+import threading
+import time
+
+import cv2
+
+from worker_pool import DetectionPool
+
+
+def run(num_workers, frames, streams, args):
+    pool = DetectionPool(num_workers, args.predictor, {
+        'mode': args.mode,
+        'redetect_interval': 10,
+        'min_confidence': 7.0,
+        'scale': 1.0,
+        'min_width': 640,
+    })
+    pool.start()
+    # Warm-up: every worker loads its predictor before timing starts
+    for index in range(num_workers):
+        pool.locate_faces(f"warmup-{index}", frames[0], timeout=60)
+    for index in range(num_workers):
+        pool.release_session(f"warmup-{index}")
+
+    def stream(session_id):
+        for frame in frames:
+            pool.locate_faces(session_id, frame, timeout=60)
+
+    threads = [threading.Thread(target=stream, args=(f"stream-{index}",)) for index in range(streams)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    pool.stop()
+    return streams * len(frames) / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="Path to a recorded video")
+    parser.add_argument("--streams", type=int, default=20, help="Concurrent streams")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to compare")
+    parser.add_argument("--frames", type=int, default=30, help="Frames replayed per stream")
+    parser.add_argument("--mode", default="full", choices=["full", "tracker"], help="Face detection mode")
+    parser.add_argument("--predictor", default="shape_predictor_68_face_landmarks.dat", help="dlib 68-point model")
+    args = parser.parse_args()
+
+    capture = cv2.VideoCapture(args.video)
+    frames = []
+    while len(frames) < args.frames:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    if not frames:
+        print(f"Error: No frames could be read from {args.video}.")
+        return
+
+    print(f"CPU cores: {os.cpu_count()}, streams: {args.streams}, frames per stream: {len(frames)}, mode: {args.mode}")
+    baseline = None
+    for num_workers in args.workers:
+        fps, stats = run(num_workers, frames, args.streams, args)
+        baseline = baseline or fps
+        print(f"workers={num_workers:<3} total {fps:8.2f} frames/s  scaling x{fps / baseline:.2f}")
+        for worker in stats:
+            print(f"    worker {worker['worker']}: {worker['frames']} frames, {worker['ms_per_frame']} ms/frame, "
+                  f"{worker['sessions']} sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+# --- Reusable Frame Buffers ---
+# A stream used to allocate a new full-size frame for every camera read and new
+# images for every resize/grayscale conversion. FrameBufferPool keeps a few
+# preallocated frames that the capture stage reads into (camera.read(image=...))
+# and that go back to the pool once the frame is encoded or dropped, and
+# scratch_buffer() hands out per-owner working images for OpenCV's dst= arguments,
+# so a running stream's memory stays flat.
+
+
+class FrameBufferPool:
+    """
+    Free list of preallocated frame buffers of one shape. The shape is taken
+    from the first frame adopted; a different shape (e.g. the source was
+    reopened at another resolution) replaces the pool. When every buffer is
+    in use, acquire() allocates another one rather than blocking; at most
+    `size` buffers are kept on release.
+    """
+
+    def __init__(self, size=6):
+        self.size = size
+        self.shape = None
+        self._free = []
+        self._lock = threading.Lock()
+        self.allocated = 0 # Frame buffers created so far, adopted ones included (stays at `size` in steady state)
+
+    def adopt(self, frame):
+        """Sizes the pool after a frame the source allocated itself."""
+        with self._lock:
+            if frame.shape == self.shape:
+                return
+            self.shape = frame.shape
+            self._free = [np.empty(self.shape, dtype=np.uint8) for _ in range(self.size - 1)]
+            self.allocated += self.size
+
+    def acquire(self):
+        """Returns a free buffer, or None while the frame shape is unknown."""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            if self.shape is None:
+                return None
+            self.allocated += 1
+        return np.empty(self.shape, dtype=np.uint8)
+
+    def release(self, frame):
+        with self._lock:
+            if frame.shape == self.shape and len(self._free) < self.size:
+                self._free.append(frame)
+
+
+def scratch_buffer(scratch, key, shape, dtype=np.uint8):
+    """
+    Returns the working image `key` of a scratch dict, (re)allocating it only
+    when the requested shape changes.
+    """
+    buffer = scratch.get(key)
+    if buffer is None or buffer.shape != shape:
+        buffer = scratch[key] = np.empty(shape, dtype=dtype)
+    return buffer
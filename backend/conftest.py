@@ -0,0 +1,8 @@
+# pytest setup: the backend modules are imported flat (as app.py does), and
+# test_camera.py is a manual webcam check rather than a test module.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+collect_ignore = ["test_camera.py"]
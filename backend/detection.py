@@ -0,0 +1,242 @@
+import random
+import time
+
+import cv2
+
+from features import extract_features
+
+# --- Alertness Detection Rules ---
+# Turns located faces and landmarks into per-session alerts. Shared by the live
+# feed (app.py) and the offline analysis of recorded videos (batch_analysis.py).
+# Faces are located elsewhere, and overlays are a separate step so headless
+# analysis can skip them.
+
+# --- AI Detection Thresholds (Using real landmark data) ---
+# Durations are in seconds, so alerts fire after the same time whatever the
+# analysed frame rate (they replace counts of consecutive frames at ~30 fps).
+EYE_AR_THRESH = 0.25 # Threshold for eye aspect ratio (drowsiness)
+EYES_CLOSED_SECONDS = 0.33 # How long eyes must stay below threshold (was 10 frames)
+MOUTH_AR_THRESH = 0.7 # Threshold for mouth aspect ratio (yawning)
+YAWN_SECONDS = 0.33 # How long the mouth must stay above threshold (was 10 frames)
+# Head pose thresholds (in arbitrary units/degrees for simplified estimation)
+HEAD_POSE_YAW_THRESH = 15 # Horizontal head rotation deviation threshold
+HEAD_POSE_PITCH_THRESH = 15 # Vertical head rotation deviation threshold
+GAZE_AWAY_SECONDS = 1.0 # How long gaze/head pose must be away (was 30 frames)
+ABSENCE_TIME_THRESHOLD = 5 # Seconds of no face to trigger absent status
+
+# --- Temporal Smoothing (see smoothing.py) ---
+FEATURE_SMOOTHING_WINDOW = 0.3 # The rules use the median EAR/MAR/yaw/pitch of this many seconds
+CONDITION_TOLERANCE = 0.2 # Seconds a condition may drop out without restarting its timer
+FOCUS_TIME_CONSTANT = 0.5 # Seconds; time constant of the focus score's moving average
+
+# --- Multi-Person Tracking (see person_tracking.py) ---
+IDENTITY_MAX_MISSING = 1.0 # Seconds a face may go undetected and keep its person ID (and alert state)
+IDENTITY_MIN_IOU = 0.3 # Box overlap for a face to continue a person's track
+
+# --- AI Detection Logic (Intelligent AI with dlib) ---
+def perform_ai_detection(session, frame_size, rects, landmarks, current_time=None):
+    """
+    Performs AI-based detection for sleeping, focus, unauthorized activity,
+    and copy attempts from the located faces and their dlib landmarks,
+    updating the given MonitorSession. Every face is tracked as a person with
+    a stable ID, and the faces with landmarks (the first len(landmarks) of
+    `rects`, see locate_faces) are all analysed in one batched pass, each with
+    its own alert state. The session-level statuses follow the primary person,
+    the one present the longest. `frame_size` is (width, height) and
+    `current_time` defaults to the wall clock (recorded videos pass their own
+    timestamps). Returns a string indicating the type of alert, or None.
+    """
+    if current_time is None:
+        current_time = time.time()
+    
+    current_frame_alert_type = None # Local variable to hold alert for this frame
+
+    session.face_count = len(rects)
+    session.ear = session.mar = session.yaw = session.pitch = None
+    session.yaw_degrees = session.pitch_degrees = None
+    person_ids = session.track_persons(rects, current_time)
+    session.primary_person_id = None
+    
+    if session.face_count > 0:
+        session.last_person_detected_time = current_time
+        # Reset non-persistent statuses unless re-triggered in this frame
+        session.unauthorized_activity_status = "None Detected"
+        session.copy_attempt_status = "None Detected"
+        
+        # Reset proctoring alert if it was due to absence
+        if session.proctoring_alert_status == "Student Absent!":
+            session.proctoring_alert_status = "No Violations"
+
+        # Check for multiple people for copy attempt
+        if session.face_count > 1:
+            session.copy_attempt_status = f"Multiple Persons Detected ({session.face_count})!"
+            session.proctoring_alert_status = "Potential Cheating!"
+            current_frame_alert_type = "copy_attempt" # Set alert type
+
+        # --- Detailed AI Analysis for Every Face ---
+        # This part runs only if there's at least one face and predictor is loaded.
+        if landmarks is not None:
+            analysed_ids = person_ids[:len(landmarks)]
+            # EAR, MAR, yaw and pitch of all faces in one vectorized pass; each face's
+            # head pose is seeded with the same person's pose from the previous frame
+            features = extract_features(landmarks, frame_size, session.head_pose, keys=analysed_ids)
+            session.primary_person_id = min(analysed_ids, key=lambda person_id: session.persons[person_id].first_seen)
+
+            for index, person_id in enumerate(analysed_ids):
+                person = session.persons[person_id]
+                person.analysed = True
+                person.ear = float(features['ear'][index])
+                person.mar = float(features['mar'][index])
+                person.yaw = float(features['yaw'][index])
+                person.pitch = float(features['pitch'][index])
+                person.yaw_degrees = float(features['yaw_degrees'][index])
+                person.pitch_degrees = float(features['pitch_degrees'][index])
+                if person_id == session.primary_person_id:
+                    # The primary person's rules drive the session's statuses, as they always did
+                    person_alert_type = apply_face_rules(session, person, current_time)
+                    person.sleeping_status = session.sleeping_status
+                    person.unauthorized_activity_status = session.unauthorized_activity_status
+                    person.proctoring_alert_status = session.proctoring_alert_status
+                    session.ear, session.mar, session.yaw, session.pitch = person.ear, person.mar, person.yaw, person.pitch
+                    session.yaw_degrees, session.pitch_degrees = person.yaw_degrees, person.pitch_degrees
+                    session.focus_score = person.focus_score
+                    if current_frame_alert_type is None: # Only set if no other higher priority alert
+                        current_frame_alert_type = person_alert_type
+                else:
+                    person.unauthorized_activity_status = "None Detected"
+                    person_alert_type = apply_face_rules(person, person, current_time)
+                person.record_alert(person_alert_type)
+
+    else: 
+        time_since_last_person = current_time - session.last_person_detected_time
+        if time_since_last_person > ABSENCE_TIME_THRESHOLD:
+            session.sleeping_status = "No person detected - (Absent)"
+            session.proctoring_alert_status = "Student Absent!"
+            session.unauthorized_activity_status = "No Person Detected"
+            if current_frame_alert_type is None:
+                current_frame_alert_type = "absent_violation" 
+        else:
+            session.sleeping_status = "No person detected" 
+            session.unauthorized_activity_status = "None Detected"
+
+        session.focus_score = 0.0
+        session.copy_attempt_status = "None Detected"
+    
+        if session.proctoring_alert_status != "Student Absent!":
+            session.proctoring_alert_status = "No Violations"
+
+        # The AI state of each person is kept for IDENTITY_MAX_MISSING seconds in case
+        # the face was only missed, and dropped with the person's ID after that
+
+
+    return current_frame_alert_type # Return the alert type for the frontend
+
+
+def apply_face_rules(status, person, current_time):
+    """
+    Runs the drowsiness, yawn and gaze rules on one person's latest features,
+    updating the person's smoothed signals, condition timers and focus score.
+    Statuses are written to `status`: the session for its primary person, the
+    PersonState itself for everyone else. Returns the person's alert type, or None.
+    """
+    alert_type = None
+    # The rules work on the median over a short time window, so one noisy frame cannot flip them
+    ear = person.smoothers['ear'].add(current_time, person.ear)
+    mar = person.smoothers['mar'].add(current_time, person.mar)
+    yaw = person.smoothers['yaw'].add(current_time, person.yaw)
+    pitch = person.smoothers['pitch'].add(current_time, person.pitch)
+
+    # --- Drowsiness Detection (EAR) ---
+    if ear < EYE_AR_THRESH:
+        if person.eyes_closed.update(current_time, True) >= EYES_CLOSED_SECONDS:
+            status.sleeping_status = "Likely Sleeping (Eyes Closed)"
+            status.proctoring_alert_status = "Drowsiness Detected!"
+            if alert_type is None: # Only set if no other higher priority alert
+                alert_type = "drowsiness" # Set alert type
+    else:
+        person.eyes_closed.update(current_time, False) # Restarts once eyes stay open
+        # Only set to awake if not already sleeping due to prolonged closure or yawn
+        if not ("Likely Sleeping" in status.sleeping_status or "Yawning" in status.sleeping_status):
+            status.sleeping_status = "Awake"
+
+    # --- Yawn Detection (MAR) ---
+    if mar > MOUTH_AR_THRESH:
+        if person.yawning.update(current_time, True) >= YAWN_SECONDS:
+            status.sleeping_status = "Yawning (AI Detected)"
+            status.proctoring_alert_status = "Yawn Detected - Low Alertness"
+            if alert_type is None: # Only set if no other higher priority alert
+                alert_type = "yawn" # Set alert type
+    else:
+        person.yawning.update(current_time, False) # Restarts once the mouth stays closed
+        # Reset sleeping status if it was only due to yawning and eyes are open
+        if status.sleeping_status == "Yawning (AI Detected)" and ear >= EYE_AR_THRESH:
+             status.sleeping_status = "Awake"
+    
+    # --- Head Pose (for Gaze/Looking Away) ---
+    is_looking_away = False
+    if abs(yaw) > HEAD_POSE_YAW_THRESH or abs(pitch) > HEAD_POSE_PITCH_THRESH:
+        is_looking_away = True
+
+    if is_looking_away:
+        if person.looking_away.update(current_time, True) >= GAZE_AWAY_SECONDS:
+            status.unauthorized_activity_status = f"Looking Away (Yaw: {round(yaw,1)}deg, Pitch: {round(pitch,1)}deg)"
+            status.proctoring_alert_status = "Attention Diverted!"
+            if alert_type is None: 
+                alert_type = "gaze_violation" 
+    else:
+        person.looking_away.update(current_time, False)
+        # Only clear if no other unauthorized activity is set (like multi-person or system violation)
+        if not (status.copy_attempt_status != "None Detected" or "System Access" in status.unauthorized_activity_status):
+            status.unauthorized_activity_status = "None Detected"
+
+    # --- Update Focus Score (based on combined real factors) ---
+    normalized_ear = min(1.0, ear / EYE_AR_THRESH) if EYE_AR_THRESH > 0 else 1.0
+    focus_from_eyes = normalized_ear * 50
+    
+    normalized_mar = min(1.0, mar / MOUTH_AR_THRESH) if MOUTH_AR_THRESH > 0 else 1.0
+    focus_from_mouth = (1.0 - normalized_mar) * 50 # Invert MAR as high MAR means less focus (yawn)
+    
+    # Penalty for looking away (scales up to 50 if beyond threshold)
+    gaze_penalty_factor = min(1.0, person.looking_away.held() / GAZE_AWAY_SECONDS)
+    gaze_penalty = gaze_penalty_factor * 50
+
+    focus_score = (focus_from_eyes + focus_from_mouth) - gaze_penalty
+    focus_score = min(100.0, max(0.0, focus_score)) # Cap between 0 and 100
+    person.focus_smoother.add(current_time, focus_score)
+    person.focus_score = person.focus_smoother.ema
+    return alert_type
+
+
+# --- Overlays ---
+def draw_detections(frame, rects, landmarks, person_ids=None):
+    """
+    Draws rectangles and labels for all detected faces (with their person IDs
+    if given) and the landmarks of the analysed faces.
+    """
+    for i, rect_draw in enumerate(rects):
+        x, y, w, h = rect_draw.left(), rect_draw.top(), rect_draw.width(), rect_draw.height()
+        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+        label = person_ids[i] if person_ids else i + 1
+        cv2.putText(frame, f"Person {label}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+
+        if landmarks is not None and i < len(landmarks):
+            for (lx, ly) in landmarks[i]:
+                cv2.circle(frame, (int(lx), int(ly)), 1, (0, 255, 0), -1)
+
+
+# --- Simulate Tab Switching / External Access (conceptual, still random) ---
+def simulate_system_violation(session, current_frame_alert_type):
+    """
+    Live-feed only placeholder: very rarely flags a conceptual system violation.
+    Returns the alert type for the frame.
+    """
+    if random.random() < 0.0001: # Very low chance per frame
+        session.proctoring_alert_status = random.choice([
+            "Tab Switched! (Concept)",
+            "External App Detected! (Concept)",
+            "System Violation! (Concept)"
+        ])
+        session.unauthorized_activity_status = "System Access Violation (Concept)"
+        if current_frame_alert_type is None: 
+            current_frame_alert_type = "system_violation" 
+    return current_frame_alert_type
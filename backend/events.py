@@ -0,0 +1,221 @@
+import collections
+import sqlite3
+import threading
+import uuid
+
+# --- Alert Event Log ---
+# The analytics only hold the latest frame's alert, so a violation that lasts a
+# second between two polls is lost. AlertTracker turns each session's per-frame
+# alert types into debounced intervals (start, end, focus scores), and EventLog
+# persists them to SQLite from a background thread: the frame loop only appends
+# to an in-memory queue, and the writer stores the queued events in batches,
+# one transaction per batch.
+
+ALERT_TYPES = ("drowsiness", "yawn", "gaze_violation", "copy_attempt", "absent_violation", "system_violation")
+EVENT_COLUMNS = ('id', 'session_id', 'alert_type', 'started_at', 'ended_at', 'duration', 'frames',
+                 'min_focus_score', 'mean_focus_score')
+
+
+class AlertTracker:
+    """
+    Debounces the alert types of one session into start/end intervals.
+    An interval starts on the first frame reporting its alert type and ends
+    once that type has not been reported for `end_grace` seconds, so an
+    alert flickering on and off frame by frame is recorded as one interval.
+    """
+
+    def __init__(self, session_id, end_grace=2.0):
+        self.session_id = session_id
+        self.end_grace = end_grace
+        self._open = {} # alert type -> event dict of the interval in progress
+        self._last_seen = {} # alert type -> timestamp it was last reported
+
+    def update(self, alert_type, timestamp, focus_score):
+        """
+        Feeds one frame's alert type (or None). Returns the events that started
+        or ended with this frame, as dicts ready for EventLog.record().
+        """
+        changed = []
+        if alert_type is not None:
+            event = self._open.get(alert_type)
+            started = event is None
+            if started:
+                event = self._open[alert_type] = {
+                    'id': uuid.uuid4().hex,
+                    'session_id': self.session_id,
+                    'alert_type': alert_type,
+                    'started_at': timestamp,
+                    'ended_at': None,
+                    'duration': 0.0,
+                    'frames': 0,
+                    'min_focus_score': focus_score,
+                    'mean_focus_score': focus_score,
+                }
+            event['frames'] += 1
+            event['min_focus_score'] = min(event['min_focus_score'], focus_score)
+            event['mean_focus_score'] += (focus_score - event['mean_focus_score']) / event['frames']
+            self._last_seen[alert_type] = timestamp
+            if started:
+                changed.append(dict(event))
+
+        for open_type in list(self._open):
+            if timestamp - self._last_seen[open_type] > self.end_grace:
+                changed.append(self._end(open_type))
+        return changed
+
+    def close(self):
+        """Ends every open interval (e.g. when the session is released)."""
+        return [self._end(alert_type) for alert_type in list(self._open)]
+
+    def _end(self, alert_type):
+        event = self._open.pop(alert_type)
+        event['ended_at'] = self._last_seen.pop(alert_type)
+        event['duration'] = event['ended_at'] - event['started_at']
+        return event
+
+
+class EventLog:
+    """
+    Persists alert events to a SQLite database with a background writer.
+    record() never blocks: it appends to a bounded in-memory queue (dropping
+    the oldest pending event if the writer has fallen `max_pending` behind),
+    and the writer flushes up to `batch_size` events per transaction at least
+    every `flush_interval` seconds. A later record of the same event id (its
+    end) replaces the earlier one (its start). Once close() has been called,
+    record() refuses new events until start() is called again.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = collections.deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._writer = None
+        self._closing = False
+        self._start_lock = threading.Lock()
+        self._schema_ready = False
+        # Counters for /metrics
+        self.written = 0
+        self.dropped = 0 # Pushed out of a full queue, or recorded after close()
+        self.batches = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        """Starts the writer thread, which also creates the database. Idempotent."""
+        with self._start_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._closing = False
+            self._writer = threading.Thread(target=self._write_loop, name="event-writer", daemon=True)
+            self._writer.start()
+
+    def close(self, timeout=5.0):
+        """Flushes the pending events and stops the writer."""
+        if self._writer is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._writer.join(timeout)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        # WAL lets /events read while the writer commits
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id TEXT PRIMARY KEY, session_id TEXT NOT NULL, alert_type TEXT NOT NULL,"
+            " started_at REAL NOT NULL, ended_at REAL, duration REAL, frames INTEGER,"
+            " min_focus_score REAL, mean_focus_score REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS events_by_start ON events (started_at)")
+        connection.execute("CREATE INDEX IF NOT EXISTS events_by_session ON events (session_id, started_at)")
+        connection.commit()
+        self._schema_ready = True
+        return connection
+
+    # --- Writing ---
+    def record(self, event):
+        """
+        Queues an event dict (see EVENT_COLUMNS) for writing. Never blocks on I/O.
+        Returns False (and counts the event as dropped) after close(), as the
+        stopped writer would never store it.
+        """
+        if self._writer is None:
+            self.start()
+        with self._cond:
+            if self._closing:
+                self.dropped += 1
+                return False
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closing or len(self._pending) >= self.batch_size,
+                                    self.flush_interval)
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                closing = self._closing and not self._pending
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(
+                            f"INSERT OR REPLACE INTO events ({', '.join(EVENT_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(EVENT_COLUMNS))})",
+                            [tuple(event[column] for column in EVENT_COLUMNS) for event in batch],
+                        )
+                    self.written += len(batch)
+                    self.batches += 1
+                except sqlite3.Error as e:
+                    print(f"Error: Could not write {len(batch)} alert events to {self.path}: {e}")
+            if closing:
+                break
+        connection.close()
+
+    # --- Querying ---
+    def query(self, session_id=None, alert_type=None, since=None, until=None, limit=50, offset=0):
+        """
+        Returns (events, total) for the events matching the filters, newest
+        first. `since`/`until` bound the start time (epoch seconds).
+        """
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if alert_type is not None:
+            clauses.append("alert_type = ?")
+            params.append(alert_type)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        if not self._schema_ready:
+            self._connect().close() # Creates the database if nothing was written yet
+        # A plain connection: the schema and WAL mode are set up once, by the writer or above
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            total = connection.execute(f"SELECT COUNT(*) FROM events {where}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM events {where} "
+                f"ORDER BY started_at DESC, id LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        finally:
+            connection.close()
+        return [dict(zip(EVENT_COLUMNS, row)) for row in rows], total
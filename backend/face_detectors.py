@@ -0,0 +1,122 @@
+import os
+
+import cv2
+import dlib
+
+# --- Pluggable Face Detector Backends ---
+# FaceLocator calls its detector like dlib's: detector(image, upsample) returning
+# dlib.rectangles, so every backend here has that signature and the rest of the
+# detection path (tracking, landmarks, alert rules) does not depend on which one
+# runs. Backends trade recall for speed differently (see bench_detectors.py):
+#   "hog"  - dlib's HOG + linear SVM detector (the original backend)
+#   "haar" - OpenCV's Haar cascade (haarcascade_frontalface_default.xml, bundled)
+#   "dnn"  - OpenCV's YuNet CNN face detector run on the CPU by cv2.dnn
+# Backends with needs_color = True are given the BGR detection image instead of
+# the grayscale one.
+
+DETECTOR_BACKENDS = ("hog", "haar", "dnn")
+HAAR_CASCADE_PATH = "haarcascade_frontalface_default.xml"
+# The DNN model (~230 KB) is not bundled; `python fetch_models.py` downloads it into 'backend'
+DNN_MODEL_PATH = "face_detection_yunet_2023mar.onnx"
+DNN_MODEL_URL = ("https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/"
+                 "face_detection_yunet_2023mar.onnx")
+
+
+def _to_rectangles(boxes, width, height):
+    """Converts (left, top, right, bottom) boxes to dlib.rectangles clipped to the image."""
+    return dlib.rectangles([
+        dlib.rectangle(int(max(0, left)), int(max(0, top)), int(min(width - 1, right)), int(min(height - 1, bottom)))
+        for left, top, right, bottom in boxes
+    ])
+
+
+class HogFaceDetector:
+    """dlib's frontal face detector. Finds faces down to about 80x80 pixels."""
+
+    name = "hog"
+    needs_color = False
+
+    def __init__(self):
+        self._detector = dlib.get_frontal_face_detector()
+
+    def __call__(self, image, upsample=0):
+        return self._detector(image, upsample)
+
+
+class HaarFaceDetector:
+    """
+    OpenCV's Viola-Jones cascade. The cheapest backend, but it misses turned
+    heads and reports more false positives. `upsample` is ignored; faces
+    smaller than `min_size` pixels are not searched for.
+    """
+
+    name = "haar"
+    needs_color = False
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, scale_factor=1.1, min_neighbors=5, min_size=40):
+        if not hasattr(cv2, 'CascadeClassifier'):
+            # OpenCV 5 moved the cascade classifiers to the contrib modules (requirements.txt pins OpenCV 4)
+            raise IOError(f"OpenCV {cv2.__version__} has no CascadeClassifier; install opencv-contrib-python or OpenCV 4")
+        self._cascade = cv2.CascadeClassifier(cascade_path)
+        if self._cascade.empty():
+            raise IOError(f"Could not load Haar cascade from '{cascade_path}'")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def __call__(self, image, upsample=0):
+        boxes = self._cascade.detectMultiScale(image, scaleFactor=self.scale_factor,
+                                               minNeighbors=self.min_neighbors, minSize=self.min_size)
+        return _to_rectangles(((x, y, x + w - 1, y + h - 1) for x, y, w, h in boxes), image.shape[1], image.shape[0])
+
+
+class DnnFaceDetector:
+    """
+    OpenCV's YuNet face detector (a small CNN in ONNX format), run on the CPU
+    by cv2.dnn through cv2.FaceDetectorYN. Finds faces down to about 10 pixels
+    and turned heads. Detections below `confidence` are discarded; `upsample`
+    is ignored.
+    """
+
+    name = "dnn"
+    needs_color = True
+
+    def __init__(self, model_path=DNN_MODEL_PATH, confidence=0.6, nms_threshold=0.3, top_k=50):
+        if not hasattr(cv2, 'FaceDetectorYN'):
+            raise IOError(f"OpenCV {cv2.__version__} has no FaceDetectorYN; OpenCV 4.5.4 or newer is needed")
+        if not os.path.exists(model_path):
+            raise IOError(f"DNN model '{model_path}' not found; run 'python fetch_models.py' to download it")
+        self._detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), confidence, nms_threshold, top_k,
+                                                   cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU)
+        self._input_size = None
+
+    def __call__(self, image, upsample=0):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        if self._input_size != (width, height):
+            self._input_size = (width, height)
+            self._detector.setInputSize(self._input_size)
+        _, faces = self._detector.detect(image) # Rows of (x, y, w, h, 5 landmark points, score)
+        if faces is None:
+            return dlib.rectangles()
+        return _to_rectangles(((x, y, x + w - 1, y + h - 1) for x, y, w, h in faces[:, :4]), width, height)
+
+
+def create_face_detector(backend="hog", options=None, fallback=None):
+    """
+    Builds the face detector `backend` (one of DETECTOR_BACKENDS). `options`
+    holds per-backend keyword arguments, e.g. {'dnn': {'confidence': 0.6}}.
+    Raises ValueError for an unknown backend. If its model cannot be loaded,
+    the `fallback` backend is built instead, or the error is raised without one.
+    """
+    backends = {'hog': HogFaceDetector, 'haar': HaarFaceDetector, 'dnn': DnnFaceDetector}
+    if backend not in backends:
+        raise ValueError(f"Unknown face detector backend '{backend}'. Expected one of {DETECTOR_BACKENDS}.")
+    try:
+        return backends[backend](**(options or {}).get(backend, {}))
+    except (IOError, cv2.error) as e:
+        if fallback is None or fallback == backend:
+            raise
+        print(f"Error loading face detector '{backend}' ({str(e).strip()}). Falling back to '{fallback}'.")
+        return create_face_detector(fallback, options)
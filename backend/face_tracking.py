@@ -0,0 +1,185 @@
+import cv2
+import dlib
+import numpy as np
+
+from buffers import scratch_buffer
+from features import shape_to_array
+from metrics import metrics
+
+# --- Face Localisation with Periodic Re-detection ---
+# Running dlib's HOG detector on every frame is the most expensive call in the
+# detection stage. In "tracker" mode the detector only runs every
+# `redetect_interval` frames; in between, each face found by the last
+# detection is followed by a cheap dlib correlation_tracker. A re-detection is
+# forced early as soon as any tracker loses confidence.
+
+DETECTION_MODES = ("full", "tracker")
+
+
+class FaceLocator:
+    """
+    Returns the face rectangles for each frame, either by running the face
+    detector (any backend of face_detectors.py) every frame ("full") or by
+    tracking between detections ("tracker").
+    """
+
+    def __init__(self, detector, mode="full", redetect_interval=10, min_confidence=7.0):
+        if mode not in DETECTION_MODES:
+            raise ValueError(f"Unknown face detection mode '{mode}'. Expected one of {DETECTION_MODES}.")
+        self.detector = detector
+        self.mode = mode
+        self.redetect_interval = max(1, int(redetect_interval))
+        self.min_confidence = min_confidence # Peak-to-sidelobe ratio below which a track is considered lost
+        self._trackers = []
+        self._frames_since_detection = 0
+        self.scratch = {} # Downscaled and grayscale images reused frame after frame
+        # Counters to judge the accuracy/latency trade-off of the chosen settings
+        self.detections_run = 0
+        self.frames_tracked = 0
+
+    def reset(self):
+        """Drops all tracks so the next frame runs a full detection."""
+        self._trackers = []
+        self._frames_since_detection = 0
+
+    def locate(self, gray_frame, color_frame=None):
+        """
+        Returns a list of dlib.rectangle for the faces in the grayscale frame.
+        Detectors that need colour (needs_color) run on `color_frame`, the same
+        image in BGR, if given. Tracking always uses the grayscale frame.
+        """
+        if self.mode == "full" or self._needs_detection():
+            return self._detect(gray_frame, color_frame)
+
+        rects = []
+        height, width = gray_frame.shape[:2]
+        for tracker in self._trackers:
+            with metrics.time_stage("tracker"):
+                confidence = tracker.update(gray_frame)
+            pos = tracker.get_position()
+            rect = dlib.rectangle(int(pos.left()), int(pos.top()), int(pos.right()), int(pos.bottom()))
+            # A weak correlation peak or a box drifting out of view means the track is unreliable
+            if confidence < self.min_confidence or not _inside(rect, width, height):
+                return self._detect(gray_frame, color_frame)
+            rects.append(rect)
+
+        self._frames_since_detection += 1
+        self.frames_tracked += 1
+        return dlib.rectangles(rects)
+
+    def _needs_detection(self):
+        # Without any face to follow the detector must run, otherwise a person
+        # walking into view would only be noticed at the next scheduled detection
+        return not self._trackers or self._frames_since_detection >= self.redetect_interval
+
+    def _detect(self, gray_frame, color_frame=None):
+        image = color_frame if color_frame is not None and getattr(self.detector, 'needs_color', False) else gray_frame
+        with metrics.time_stage("detector"):
+            rects = self.detector(image, 0) # 0 means no upsampling
+        self.detections_run += 1
+        self._frames_since_detection = 0
+        if self.mode == "tracker":
+            self._trackers = []
+            for rect in rects:
+                tracker = dlib.correlation_tracker()
+                tracker.start_track(gray_frame, rect)
+                self._trackers.append(tracker)
+        return rects
+
+
+def _inside(rect, width, height):
+    return rect.left() >= 0 and rect.top() >= 0 and rect.right() < width and rect.bottom() < height
+
+
+# --- Downscaled Detection / Full-Resolution Landmarks ---
+def detection_scale_for(frame, scale, min_width):
+    """
+    Effective detection scale for a frame: `scale`, but never shrinking the
+    frame below `min_width` pixels, since the HOG detector cannot find faces
+    smaller than its 80x80 window.
+    """
+    return min(1.0, max(scale, min_width / frame.shape[1]))
+
+
+def downscale_frame(frame, scale, scratch=None):
+    """
+    Returns the BGR frame resized by `scale` (the frame itself at 1.0), written
+    into a reused buffer with a `scratch` dict.
+    """
+    if scale == 1.0:
+        return frame
+    scratch = {} if scratch is None else scratch
+    size = (int(round(frame.shape[1] * scale)), int(round(frame.shape[0] * scale)))
+    small = scratch_buffer(scratch, 'small', (size[1], size[0], frame.shape[2]))
+    return cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+
+
+def prepare_detection_frame(frame, scale, scratch=None):
+    """
+    Returns the grayscale image the face detector runs on, resized by `scale`.
+    With a `scratch` dict the resized and grayscale images are written into
+    buffers reused across calls (the result is only valid until the next call).
+    """
+    scratch = {} if scratch is None else scratch
+    frame = downscale_frame(frame, scale, scratch)
+    gray = scratch_buffer(scratch, 'gray', frame.shape[:2])
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+
+
+def scale_rects(rects, scale):
+    """Maps rectangles found on a frame resized by `scale` back to full-resolution coordinates."""
+    if scale == 1.0:
+        return rects
+    return dlib.rectangles([
+        dlib.rectangle(int(rect.left() / scale), int(rect.top() / scale),
+                       int(rect.right() / scale), int(rect.bottom() / scale))
+        for rect in rects
+    ])
+
+
+def predict_landmarks(predictor, frame, rect, margin=0.25):
+    """
+    Runs the landmark predictor on a grayscale crop of the full-resolution
+    frame around `rect` (grown by `margin` on each side), so only the face
+    region is converted to grayscale. Returns a (68, 2) array in frame coordinates.
+    """
+    height, width = frame.shape[:2]
+    margin_x = int(rect.width() * margin)
+    margin_y = int(rect.height() * margin)
+    x0 = max(0, rect.left() - margin_x)
+    y0 = max(0, rect.top() - margin_y)
+    x1 = min(width, rect.right() + margin_x + 1)
+    y1 = min(height, rect.bottom() + margin_y + 1)
+
+    roi_gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+    roi_rect = dlib.rectangle(rect.left() - x0, rect.top() - y0, rect.right() - x0, rect.bottom() - y0)
+    with metrics.time_stage("predictor"):
+        shape = predictor(roi_gray, roi_rect)
+    return shape_to_array(shape) + (x0, y0)
+
+
+def predict_all_landmarks(predictor, frame, rects):
+    """Landmarks of every rectangle as one (N, 68, 2) array in frame coordinates."""
+    return np.stack([predict_landmarks(predictor, frame, rect) for rect in rects])
+
+
+def locate_faces(face_locator, predictor, frame, scale, min_width, max_faces=None):
+    """
+    Locates the faces in a BGR frame on a downscaled copy and predicts their
+    landmarks at full resolution. Faces are ordered largest first, and only
+    the `max_faces` largest get landmarks (all of them by default), which
+    bounds the per-frame cost in crowded scenes.
+    Returns (rects, landmarks) in frame coordinates: landmarks is an
+    (min(N, max_faces), 68, 2) array for the first faces of `rects`, or None
+    when there is no face or no predictor.
+    """
+    detection_scale = detection_scale_for(frame, scale, min_width)
+    detection_color = downscale_frame(frame, detection_scale, face_locator.scratch)
+    detection_gray = prepare_detection_frame(detection_color, 1.0, face_locator.scratch)
+    rects = scale_rects(face_locator.locate(detection_gray, detection_color), detection_scale)
+    rects = dlib.rectangles(sorted(rects, key=lambda rect: rect.area(), reverse=True))
+    analysed = rects[:max_faces]
+    landmarks = None
+    if predictor is not None and len(analysed) > 0:
+        landmarks = predict_all_landmarks(predictor, frame, analysed)
+    return rects, landmarks
@@ -0,0 +1,163 @@
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+# --- Vectorized Facial Feature Extraction ---
+# Computes eye aspect ratio (EAR), mouth aspect ratio (MAR), yaw and pitch for
+# a whole batch of faces at once from an (N, 68, 2) array of dlib landmarks.
+# EAR, MAR and the rotation-to-angle conversion are plain NumPy array ops; only
+# the pose itself still needs one cv2.solvePnP call per face, which is seeded
+# with that face's pose from the previous frame.
+
+# Landmark indices of dlib's 68-point model
+LEFT_EYE = np.arange(42, 48)
+RIGHT_EYE = np.arange(36, 42)
+MOUTH = np.arange(48, 68)
+POSE_LANDMARKS = np.array([30, 8, 36, 45, 48, 54]) # Nose tip, chin, eye corners, mouth corners
+
+# Dummy 3D model points (arbitrary values for a generic face), matching POSE_LANDMARKS
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),
+    (0.0, -330.0, -65.0),
+    (-225.0, 170.0, -135.0),
+    (225.0, 170.0, -135.0),
+    (-150.0, -150.0, -125.0),
+    (150.0, -150.0, -125.0)
+])
+DIST_COEFFS = np.zeros((4, 1)) # Assuming no lens distortion
+
+
+def shape_to_array(shape):
+    """Converts a dlib full_object_detection into a (68, 2) integer array."""
+    coords = np.fromiter((c for p in shape.parts() for c in (p.x, p.y)), dtype=np.int64, count=2 * shape.num_parts)
+    return coords.reshape(-1, 2)
+
+
+def _distances(points, a, b):
+    # Euclidean distances between landmark columns a and b, for every face
+    return np.linalg.norm(points[:, a] - points[:, b], axis=-1)
+
+
+def eye_aspect_ratios(landmarks):
+    """Average EAR of both eyes for each face of an (N, 68, 2) landmark array."""
+    eyes = landmarks[:, np.stack([LEFT_EYE, RIGHT_EYE])].astype(np.float64) # (N, 2, 6, 2)
+    eyes = eyes.reshape(-1, 6, 2)
+    # Two vertical distances over the horizontal distance of each eye
+    ear = (_distances(eyes, 1, 5) + _distances(eyes, 2, 4)) / (2.0 * _distances(eyes, 0, 3))
+    return ear.reshape(-1, 2).mean(axis=1)
+
+
+def mouth_aspect_ratios(landmarks):
+    """MAR for each face of an (N, 68, 2) landmark array."""
+    mouth = landmarks[:, MOUTH].astype(np.float64)
+    # Points (51, 59) and (53, 57) vertically, (48, 54) horizontally
+    return (_distances(mouth, 2, 10) + _distances(mouth, 4, 8)) / (2.0 * _distances(mouth, 0, 6))
+
+
+def rotation_matrices(rvecs):
+    """Rodrigues formula for an (N, 3) array of rotation vectors, returns (N, 3, 3)."""
+    theta = np.linalg.norm(rvecs, axis=1)
+    safe_theta = np.where(theta > 1e-12, theta, 1.0)
+    k = rvecs / safe_theta[:, None]
+    kx, ky, kz = k[:, 0], k[:, 1], k[:, 2]
+    zeros = np.zeros_like(kx)
+    K = np.stack([
+        np.stack([zeros, -kz, ky], axis=1),
+        np.stack([kz, zeros, -kx], axis=1),
+        np.stack([-ky, kx, zeros], axis=1),
+    ], axis=1)
+    sin = np.sin(theta)[:, None, None]
+    cos = np.cos(theta)[:, None, None]
+    rmats = np.eye(3) + sin * K + (1.0 - cos) * (K @ K)
+    rmats[theta <= 1e-12] = np.eye(3)
+    return rmats
+
+
+def euler_angles(rmats):
+    """
+    Euler angles (degrees) of (N, 3, 3) rotation matrices, as returned by
+    cv2.RQDecomp3x3: (rotation about x, about y, about z).
+    """
+    x = np.degrees(np.arctan2(rmats[:, 2, 1], rmats[:, 2, 2]))
+    y = np.degrees(np.arctan2(-rmats[:, 2, 0], np.hypot(rmats[:, 2, 1], rmats[:, 2, 2])))
+    z = np.degrees(np.arctan2(rmats[:, 1, 0], rmats[:, 0, 0]))
+    return np.stack([x, y, z], axis=1)
+
+
+class HeadPoseEstimator:
+    """
+    Estimates head pose for batches of faces. Camera intrinsics are cached per
+    frame resolution, and each face's solvePnP is seeded with the pose found
+    for the same face key in the previous call.
+    """
+
+    def __init__(self):
+        self._camera_matrices = {} # (width, height) -> camera matrix
+        self._previous_poses = {} # face key -> (rvec, tvec)
+
+    def camera_matrix(self, width, height):
+        """Approximated intrinsics of a generic webcam at this resolution."""
+        matrix = self._camera_matrices.get((width, height))
+        if matrix is None:
+            focal_length = width
+            matrix = np.array([
+                [focal_length, 0, width / 2],
+                [0, focal_length, height / 2],
+                [0, 0, 1]
+            ], dtype="double")
+            self._camera_matrices[(width, height)] = matrix
+        return matrix
+
+    def reset(self):
+        self._previous_poses = {}
+
+    def estimate(self, landmarks, frame_size, keys=None):
+        """
+        Returns (N, 3) rotation vectors for an (N, 68, 2) landmark array.
+        `frame_size` is (width, height); `keys` identify the faces across
+        frames (defaults to their index in the batch).
+        """
+        camera_matrix = self.camera_matrix(*frame_size)
+        keys = range(len(landmarks)) if keys is None else keys
+        image_points = np.ascontiguousarray(landmarks[:, POSE_LANDMARKS], dtype=np.float64)
+        rvecs = np.zeros((len(landmarks), 3))
+        poses = {}
+        with metrics.time_stage("solvepnp"):
+            for index, key in enumerate(keys):
+                previous = self._previous_poses.get(key)
+                if previous is not None:
+                    rvec, tvec = previous[0].copy(), previous[1].copy()
+                    success, rvec, tvec = cv2.solvePnP(MODEL_POINTS, image_points[index], camera_matrix, DIST_COEFFS,
+                                                       rvec, tvec, useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+                else:
+                    success, rvec, tvec = cv2.solvePnP(MODEL_POINTS, image_points[index], camera_matrix, DIST_COEFFS,
+                                                       flags=cv2.SOLVEPNP_ITERATIVE)
+                rvecs[index] = rvec.ravel()
+                if success:
+                    poses[key] = (rvec, tvec)
+        # Only faces seen in this batch are kept as seeds for the next one
+        self._previous_poses = poses
+        return rvecs
+
+
+def extract_features(landmarks, frame_size, pose_estimator, keys=None):
+    """
+    Computes the facial features of every face of an (N, 68, 2) landmark array.
+    Returns a dict of (N,) arrays: 'ear', 'mar', 'yaw' and 'pitch' (in the legacy
+    unit the alert thresholds are tuned for), and the head angles in degrees as
+    'yaw_degrees' and 'pitch_degrees'.
+    """
+    landmarks = np.asarray(landmarks)
+    rvecs = pose_estimator.estimate(landmarks, frame_size, keys)
+    angles = euler_angles(rotation_matrices(rvecs))
+    return {
+        'ear': eye_aspect_ratios(landmarks),
+        'mar': mouth_aspect_ratios(landmarks),
+        # Same convention as the original per-frame cv2.RQDecomp3x3 code, which
+        # passed its angles through np.degrees once more
+        'yaw': np.degrees(angles[:, 1]),
+        'pitch': np.degrees(angles[:, 0]),
+        'yaw_degrees': angles[:, 1],
+        'pitch_degrees': angles[:, 0],
+    }
@@ -0,0 +1,46 @@
+"""
+Downloads the model files that are not bundled with the repository into the
+'backend' directory:
+  - the YuNet face detector of the "dnn" backend (DNN_MODEL_PATH, ~230 KB)
+
+Files that already exist are left alone. Run once after installing the
+requirements (and before selecting FOCUS_FACE_DETECTOR=dnn):
+
+Usage: python fetch_models.py
+"""
+import os
+import sys
+import urllib.request
+
+from face_detectors import DNN_MODEL_PATH, DNN_MODEL_URL
+
+MODELS = {
+    DNN_MODEL_PATH: DNN_MODEL_URL,
+}
+
+
+def fetch(path, url):
+    if os.path.exists(path):
+        print(f"{path} already present.")
+        return True
+    print(f"Downloading {path} from {url} ...")
+    try:
+        urllib.request.urlretrieve(url, path + ".part")
+    except OSError as e:
+        print(f"Error: Could not download {path}: {e}")
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        return False
+    os.replace(path + ".part", path)
+    print(f"Saved {path} ({os.path.getsize(path) // 1024} KB).")
+    return True
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__))) # Models are loaded relative to 'backend'
+    ok = all([fetch(path, url) for path, url in MODELS.items()])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import cv2
+import numpy as np
+
+from metrics import RateMeter, metrics
+
+# --- Pluggable Frame Sources ---
+# The pipeline only needs an object with read(image=None), isOpened() and release(), like
+# cv2.VideoCapture. open_frame_source() turns a configured source into one:
+# a device index, a video file or a stream URL (rtsp://, http://) opens a cv2.VideoCapture, while
+# "synthetic" (optionally "synthetic:WIDTHxHEIGHT") replays generated frames, so
+# the app and the benchmarks can run on a headless box without a webcam.
+
+SYNTHETIC_SOURCE = "synthetic"
+SYNTHETIC_SIZE = (640, 480)
+SYNTHETIC_FPS = 30
+SYNTHETIC_FRAMES = 90
+STREAM_TIMEOUT_MS = 5000 # Open/read timeout for network streams, so a dead camera cannot hang a reader
+
+
+class FixtureFrameSource:
+    """
+    Replays a list of frames in a loop, like a camera: every read() returns a
+    copy (the pipeline draws on frames in place), written into `image` if one
+    of the right shape is passed, and with `fps` reads are paced to that frame
+    rate. `fps=0` returns frames as fast as they are read.
+    """
+
+    def __init__(self, frames, fps=SYNTHETIC_FPS):
+        if not frames:
+            raise ValueError("A fixture frame source needs at least one frame.")
+        self.frames = frames
+        self.fps = fps
+        self._index = 0
+        self._next_time = None
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self, image=None):
+        if not self._opened:
+            return False, None
+        if self.fps:
+            now = time.monotonic()
+            if self._next_time is None:
+                self._next_time = now
+            elif now < self._next_time:
+                time.sleep(self._next_time - now)
+            else:
+                self._next_time = now # Fell behind; don't try to catch up with a burst
+            self._next_time += 1.0 / self.fps
+        frame = self.frames[self._index]
+        self._index = (self._index + 1) % len(self.frames)
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()
+
+    def release(self):
+        self._opened = False
+
+
+def synthetic_frames(width=SYNTHETIC_SIZE[0], height=SYNTHETIC_SIZE[1], count=SYNTHETIC_FRAMES,
+                     face_image=None, seed=0):
+    """
+    Generates a reproducible clip: a textured background with a moving patch
+    and, if `face_image` (a BGR image) is given, that face panning across the
+    frame so the face detector and predictor have work to do.
+    """
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(40, 200, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    face = None
+    if face_image is not None:
+        scale = 0.6 * height / face_image.shape[0]
+        face = cv2.resize(face_image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        face = face[:height, :width]
+
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        phase = 2 * np.pi * index / count
+        if face is not None:
+            x = int((width - face.shape[1]) * (0.5 + 0.3 * np.sin(phase)))
+            y = (height - face.shape[0]) // 2
+            frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+        else:
+            center = (int(width * (0.5 + 0.3 * np.sin(phase))), height // 2)
+            cv2.ellipse(frame, center, (width // 10, height // 6), 0, 0, 360, (180, 200, 230), -1)
+        frames.append(frame)
+    return frames
+
+
+def load_video_frames(path, max_frames=None):
+    """Decodes (up to max_frames of) a recorded video into a list of frames."""
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while max_frames is None or len(frames) < max_frames:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def open_frame_source(source):
+    """
+    Opens a configured source: a camera index (int or digit string), a video
+    file or stream URL, "synthetic[:WIDTHxHEIGHT]", or any object that already
+    has read()/isOpened()/release(), which is returned unchanged.
+    """
+    if hasattr(source, 'read'):
+        return source
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, str) and source.split(":", 1)[0] == SYNTHETIC_SOURCE:
+        width, height = SYNTHETIC_SIZE
+        if ":" in source:
+            width, height = (int(value) for value in source.split(":", 1)[1].lower().split("x"))
+        return FixtureFrameSource(synthetic_frames(width, height))
+    if isinstance(source, str) and "://" in source:
+        return cv2.VideoCapture(source, cv2.CAP_ANY, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, STREAM_TIMEOUT_MS,
+                                                      cv2.CAP_PROP_READ_TIMEOUT_MSEC, STREAM_TIMEOUT_MS])
+    return cv2.VideoCapture(source)
+
+
+def describe_source(source):
+    """Printable name of a source, without the credentials an rtsp:// URL may carry."""
+    if isinstance(source, str) and "://" in source:
+        parts = urllib.parse.urlsplit(source)
+        if parts.username or parts.password:
+            host = parts.hostname + (f":{parts.port}" if parts.port else "")
+            return urllib.parse.urlunsplit((parts.scheme, f"***@{host}", parts.path, parts.query, parts.fragment))
+    return str(source)
+
+
+def load_source_config(path):
+    """
+    Reads a JSON object mapping source IDs to sources (device indices, file
+    paths or stream URLs), e.g. {"hall-a-1": "rtsp://10.0.0.21/stream1", "desk": 0}.
+    An entry can also be an object naming the face detector backend of that
+    source, e.g. {"hall-a-2": {"source": "rtsp://10.0.0.22/stream1", "detector": "dnn"}}.
+    Returns (sources, detectors), both keyed by source ID.
+    """
+    with open(path) as handle:
+        entries = json.load(handle)
+    if not isinstance(entries, dict):
+        raise ValueError(f"{path} must hold a JSON object of source ID -> source.")
+    sources, detectors = {}, {}
+    for source_id, entry in entries.items():
+        source_id = str(source_id)
+        if isinstance(entry, dict):
+            if "source" not in entry:
+                raise ValueError(f"{path}: entry '{source_id}' needs a \"source\".")
+            if "detector" in entry:
+                detectors[source_id] = entry["detector"]
+            entry = entry["source"]
+        sources[source_id] = entry
+    return sources, detectors
+
+
+# --- Reconnecting Source Readers ---
+# A camera that drops out (unplugged webcam, rebooting IP camera, network
+# hiccup, end of a looping video file) used to be reopened in a tight loop. A
+# SourceReader owns one source for the thread reading it: when a read fails, or
+# the source's own frame timestamps stop advancing, it closes the source and
+# reopens it with exponential backoff, and it records when the last frame
+# arrived so a source that stops delivering is reported as stale.
+# SourceManager keeps the readers of every configured source for status
+# reporting (/sources and /metrics).
+
+SOURCE_STATES = ("connecting", "connected", "reconnecting", "closed")
+
+
+class SourceReader:
+    """
+    Reads frames from one source, reconnecting with exponential backoff.
+    read() blocks until it has a frame, retrying the source every
+    `reconnect_initial` seconds at first and doubling the delay (with jitter)
+    up to `reconnect_max`; it only fails once release() was called. Failed
+    opens, failed reads and stalls all count as failures; the delay only
+    starts over once a connection has delivered advancing frames for
+    `stale_after` seconds. A source
+    whose frames stop arriving, or whose position (CAP_PROP_POS_MSEC) stops
+    advancing, for `stale_after` seconds is stale. `camera`, if given, is an
+    already opened frame source for `source`.
+    """
+
+    def __init__(self, source, camera=None, reconnect_initial=0.5, reconnect_max=30.0, stale_after=5.0):
+        self.source = source
+        self.name = describe_source(source)
+        self.reconnect_initial = reconnect_initial
+        self.reconnect_max = reconnect_max
+        self.stale_after = stale_after
+        self._camera = camera
+        self._lock = threading.Lock() # Serialises read() and release() on the underlying source
+        self._closed = threading.Event()
+        self._failures = 0 # Failed opens/reads/stalls since the source last stayed healthy, for the backoff
+        self._connected_at = time.monotonic() # When the current connection was opened
+        self._progressed = False # Whether it has delivered advancing frames
+        self.state = "connected" if camera is not None and camera.isOpened() else "connecting"
+        # Frame timing
+        self.frame_rate = RateMeter()
+        self.connected_since = time.time() if self.state == "connected" else None
+        self.last_frame_time = None # time.monotonic() of the last frame read
+        self.source_timestamp = None # Source position (seconds) of the last frame, if the source reports one
+        self._source_progress_time = None # When that position last advanced
+        # Counters for /sources and /metrics
+        self.reconnects = 0 # Attempts to reopen the source after it was lost or could not be opened
+        self.last_error = None
+
+    def open(self):
+        """Opens the source. Returns True on success; read() retries with backoff otherwise."""
+        with self._lock:
+            if self._closed.is_set():
+                return False
+            if self._camera is not None:
+                self._camera.release()
+            self._camera = open_frame_source(self.source)
+            if not self._camera.isOpened():
+                self._camera = None
+                self.last_error = "could not open source"
+                return False
+        self.state = "connected"
+        self.connected_since = time.time()
+        self._connected_at = time.monotonic()
+        self._progressed = False
+        self._source_progress_time = None
+        self.source_timestamp = None
+        return True
+
+    def isOpened(self):
+        return not self._closed.is_set()
+
+    def read(self, image=None):
+        """Returns (True, frame), or (False, None) once the reader is released."""
+        while not self._closed.is_set():
+            if self._camera is None and not self._reconnect():
+                continue
+            with self._lock:
+                if self._closed.is_set():
+                    break
+                with metrics.time_stage("camera_read"):
+                    success, frame = self._camera.read(image)
+                # Streams and files report their position (devices may always report 0)
+                position = self._camera.get(cv2.CAP_PROP_POS_MSEC) if hasattr(self._camera, 'get') else 0.0
+            if not success or frame is None:
+                self._disconnect("read failed")
+                continue
+
+            now = time.monotonic()
+            if self._source_stalled(position / 1000.0, now):
+                self._disconnect(f"source position stuck for {self.stale_after}s")
+                continue
+            if self._failures and self._progressed and now - self._connected_at >= self.stale_after:
+                self._failures = 0 # Healthy again: the next loss starts over at reconnect_initial
+            self.last_frame_time = now
+            self.frame_rate.tick()
+            return True, frame
+        return False, None
+
+    def _source_stalled(self, position, now):
+        # A stream that keeps returning frames at the same position (a frozen RTSP
+        # session) is stale. Sources without a position are judged by frame arrival alone.
+        if position <= 0:
+            self._progressed = True
+            return False
+        if position != self.source_timestamp:
+            self._progressed = self._progressed or self.source_timestamp is not None
+            self.source_timestamp = position
+            self._source_progress_time = now
+            return False
+        return now - self._source_progress_time > self.stale_after
+
+    def _disconnect(self, reason):
+        with self._lock:
+            if self._camera is not None:
+                self._camera.release()
+                self._camera = None
+        if self._closed.is_set():
+            return
+        self._failures += 1 # A source that opens but keeps failing backs off like one that cannot be opened
+        self.last_error = reason
+        self.state = "reconnecting"
+        print(f"Error: Lost video source {self.name} ({reason}). Reconnecting in up to {self._backoff_delay():.1f}s.")
+
+    def _backoff_delay(self):
+        return min(self.reconnect_max, self.reconnect_initial * 2 ** max(0, self._failures - 1))
+
+    def _reconnect(self):
+        """Waits out the backoff delay (if any), then tries to (re)open the source once."""
+        first_attempt = self.state == "connecting"
+        if not first_attempt:
+            delay = self._backoff_delay()
+            # Jitter keeps many cameras behind one failed switch from retrying in lockstep
+            if self._closed.wait(delay * random.uniform(0.5, 1.0)):
+                return False
+            self.reconnects += 1
+        else:
+            print(f"Attempting to open camera source: {self.name}")
+        if self.open():
+            print(f"Successfully {'opened' if first_attempt else 'reconnected'} video source {self.name}.")
+            return True
+        if not self._closed.is_set():
+            self.state = "reconnecting"
+            self._failures += 1
+            print(f"Error: Could not open video source {self.name}. Is it in use by another app or not connected? "
+                  f"Retrying in up to {self._backoff_delay():.1f}s.")
+        return False
+
+    def is_stale(self, now=None):
+        """True while no frame has arrived for `stale_after` seconds or the source is being reconnected."""
+        if self.state != "connected":
+            return self.state == "reconnecting"
+        now = time.monotonic() if now is None else now
+        last = self.last_frame_time
+        return last is not None and now - last > self.stale_after
+
+    def status(self):
+        now = time.monotonic()
+        age = now - self.last_frame_time if self.last_frame_time is not None else None
+        return {
+            'source': self.name,
+            'state': self.state,
+            'stale': self.is_stale(now),
+            'fps': round(self.frame_rate.rate(), 2),
+            'frames': self.frame_rate.count,
+            'last_frame_age': round(age, 3) if age is not None else None,
+            'source_timestamp': self.source_timestamp,
+            'connected_since': self.connected_since,
+            'reconnects': self.reconnects,
+            'last_error': self.last_error,
+        }
+
+    def release(self):
+        self._closed.set() # Wakes a reader waiting out a backoff delay
+        with self._lock:
+            if self._camera is not None:
+                self._camera.release()
+                self._camera = None
+        self.state = "closed"
+
+
+class SourceManager:
+    """
+    The configured sources, keyed by source ID, and the SourceReaders open on
+    them. `reader_options` are passed to every SourceReader.
+    """
+
+    def __init__(self, sources, **reader_options):
+        self.sources = dict(sources)
+        self.reader_options = reader_options
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, source_id):
+        return source_id in self.sources
+
+    def open(self, source_id):
+        """
+        Returns a new SourceReader for a configured source, closing any previous
+        one. The reader connects on its first read(), in the reading thread.
+        """
+        reader = SourceReader(self.sources[source_id], **self.reader_options)
+        with self._lock:
+            previous = self._readers.pop(source_id, None)
+            self._readers[source_id] = reader
+        if previous is not None:
+            previous.release()
+        return reader
+
+    def close(self, source_id):
+        with self._lock:
+            reader = self._readers.pop(source_id, None)
+        if reader is not None:
+            reader.release()
+
+    def readers(self):
+        with self._lock:
+            return dict(self._readers)
+
+    def status(self):
+        """Status of every configured source; sources nobody has opened are "idle"."""
+        readers = self.readers()
+        return {
+            source_id: readers[source_id].status() if source_id in readers
+            else {'source': describe_source(source), 'state': "idle", 'stale': False}
+            for source_id, source in self.sources.items()
+        }
+
+    def stale(self):
+        """IDs of the open sources currently stale."""
+        return [source_id for source_id, reader in self.readers().items() if reader.is_stale()]
@@ -0,0 +1,36 @@
+# Gunicorn settings and hooks for app.py (used by start.sh).
+# The app is preloaded in the master, which parses the landmark model once in
+# when_ready(); workers are forked afterwards and share it copy-on-write, so a
+# worker (re)start only has to fork and start its own detection pool.
+import os
+import time
+
+preload_app = True
+workers = 1 # A single worker process holds every monitoring session (see SessionRegistry in monitor.py)
+# Threads serve the video feeds and analytics requests. Every open /video_feed and
+# /analytics_stream client holds one thread for as long as it stays connected, so size this for
+# the expected feeds + dashboards plus headroom for short requests; a client finding every thread
+# busy waits. app.ANALYTICS_MAX_STREAMS (384 by default) keeps dashboards from taking them all.
+# Idle threads cost little memory, as the frame pipelines run on their own threads.
+threads = int(os.environ.get("FOCUS_HTTP_THREADS", 512))
+worker_connections = max(1000, threads) # Open connections accepted per worker
+
+
+def when_ready(server):
+    import app
+    app.warm_up()
+
+
+def post_fork(server, worker):
+    import app
+    start = time.perf_counter()
+    app.start_detection_pool() # Worker processes are forked before any pipeline thread exists
+    app.start_ingest()
+    server.log.info("Worker %s ready in %.0f ms after fork", worker.pid, (time.perf_counter() - start) * 1000)
+
+
+def worker_exit(server, worker):
+    import app
+    for session in app.sessions:
+        app.sessions.remove(session.session_id) # Ends open alert intervals
+    app.event_log.close() # Flushes the queued alert events
@@ -0,0 +1,162 @@
+import bisect
+import contextlib
+import threading
+import time
+
+# --- Performance Instrumentation ---
+# Per-stage timing histograms (camera read, face detector, landmark predictor,
+# solvePnP, drawing, JPEG encoding) plus whatever gauges/counters the app
+# registers as collectors, rendered in the Prometheus text exposition format.
+# Timing is off until `metrics.enable()`: a disabled `time_stage()` only
+# returns a shared no-op context manager, so instrumented code costs next to
+# nothing when nobody scrapes /metrics.
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0) # Seconds
+METRIC_PREFIX = "focus_"
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative histogram of observed durations, as exported by Prometheus."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1) # Last slot is the +Inf overflow
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Returns (cumulative bucket counts incl. +Inf, sum, count)."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class RateMeter:
+    """
+    Counts events (e.g. frames) and reports their rate per second. `tick()` is
+    a plain increment; the rate is worked out when read, over at least `window` seconds.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.count = 0
+        self._last_count = 0
+        self._last_time = time.monotonic()
+        self._rate = 0.0
+
+    def tick(self):
+        self.count += 1
+
+    def rate(self):
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        if elapsed >= self.window:
+            self._rate = (self.count - self._last_count) / elapsed
+            self._last_count = self.count
+            self._last_time = now
+        return self._rate
+
+
+class _StageTimer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Stage timing histograms and collectors of one process.
+    A collector is a callable returning a list of
+    (name, type, help, [(labels dict, value), ...]) tuples, evaluated on every render().
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {} # stage -> Histogram
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def _histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        return histogram
+
+    def time_stage(self, stage):
+        """Context manager timing one run of a pipeline stage (no-op while disabled)."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self._histogram(stage))
+
+    def observe(self, stage, seconds):
+        """Records a duration measured elsewhere (e.g. in a worker process)."""
+        if self.enabled:
+            self._histogram(stage).observe(seconds)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        name = METRIC_PREFIX + "stage_duration_seconds"
+        lines.append(f"# HELP {name} Time spent in each frame pipeline stage.")
+        lines.append(f"# TYPE {name} histogram")
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        for stage, histogram in histograms:
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {value}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {cumulative[-1]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for collector in self._collectors:
+            for metric_name, metric_type, help_text, samples in collector():
+                metric_name = METRIC_PREFIX + metric_name
+                lines.append(f"# HELP {metric_name} {help_text}")
+                lines.append(f"# TYPE {metric_name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{metric_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+metrics = MetricsRegistry() # Process-wide registry used by the pipeline stages
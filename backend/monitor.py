@@ -0,0 +1,273 @@
+import threading
+import time
+
+from detection import (CONDITION_TOLERANCE, FEATURE_SMOOTHING_WINDOW, FOCUS_TIME_CONSTANT, IDENTITY_MAX_MISSING,
+                       IDENTITY_MIN_IOU)
+from features import HeadPoseEstimator
+from person_tracking import IdentityTracker
+from smoothing import ConditionTimer, TimeWindowSmoother
+
+# --- Per-Session Monitoring State ---
+# Every monitored person/camera gets its own MonitorSession holding the
+# detection state and analytics that used to live in module globals, so a
+# single process can serve many candidates side by side.
+
+
+class PersonState:
+    """
+    Detection state of one person (tracked face) of a session: the smoothed
+    signals and condition timers of the alert rules, the latest features and
+    statuses, and how often each alert was raised for this person.
+    """
+
+    def __init__(self, person_id, first_seen):
+        self.person_id = person_id
+        self.first_seen = first_seen
+        self.last_seen = first_seen
+        self.analysed = False # Whether the face had landmarks in the last frame
+        # Features of the face in the last analysed frame
+        self.ear = None
+        self.mar = None
+        self.yaw = None # Legacy unit of the alert thresholds (np.degrees of the angle in degrees)
+        self.pitch = None
+        self.yaw_degrees = None # Head angles in degrees
+        self.pitch_degrees = None
+        self.focus_score = 0.0
+        # Same status fields as MonitorSession, so the alert rules can write to either
+        self.sleeping_status = "Awake"
+        self.unauthorized_activity_status = "None Detected"
+        self.copy_attempt_status = "None Detected"
+        self.proctoring_alert_status = "No Violations"
+        self.alert_type = None
+        self.alert_counts = {} # Alert type -> times it was raised (consecutive frames count once)
+
+        # Recent EAR/MAR/yaw/pitch samples, smoothed over time for the alert rules
+        self.smoothers = {
+            name: TimeWindowSmoother(FEATURE_SMOOTHING_WINDOW) for name in ('ear', 'mar', 'yaw', 'pitch')
+        }
+        self.focus_smoother = TimeWindowSmoother(time_constant=FOCUS_TIME_CONSTANT)
+        self.eyes_closed = ConditionTimer(CONDITION_TOLERANCE) # Seconds eye aspect ratio has been below threshold
+        self.yawning = ConditionTimer(CONDITION_TOLERANCE) # Seconds mouth aspect ratio has been above threshold
+        self.looking_away = ConditionTimer(CONDITION_TOLERANCE) # Seconds head pose has been deviating
+
+    def reset_temporal_state(self):
+        """Forgets the smoothed signals and condition timers (e.g. after the face was missing)."""
+        for smoother in self.smoothers.values():
+            smoother.reset()
+        self.focus_smoother.reset()
+        self.eyes_closed.reset()
+        self.yawning.reset()
+        self.looking_away.reset()
+
+    def record_alert(self, alert_type):
+        if alert_type is not None and alert_type != self.alert_type:
+            self.alert_counts[alert_type] = self.alert_counts.get(alert_type, 0) + 1
+        self.alert_type = alert_type
+
+    def analytics(self):
+        return {
+            'id': self.person_id,
+            'analysed': self.analysed,
+            'focus_score': round(self.focus_score, 2),
+            'sleeping_status': self.sleeping_status,
+            'unauthorized_activity': self.unauthorized_activity_status,
+            'alert_type': self.alert_type,
+            'alert_counts': dict(self.alert_counts),
+            'seconds_tracked': round(self.last_seen - self.first_seen, 1),
+        }
+
+
+class MonitorSession:
+    """
+    Detection state and latest analytics for one monitored camera.
+    Only the session's own detection stage writes to it.
+    """
+
+    def __init__(self, session_id, source, face_locator):
+        self.session_id = session_id
+        self.source = source
+        self.face_locator = face_locator # Per-session, as it keeps the face tracks of this stream
+        self.head_pose = HeadPoseEstimator() # Seeds each frame's pose with the previous one
+        self.pipeline = None # FramePipeline feeding this session, attached by the owner
+        self.alert_tracker = None # AlertTracker recording this session's alert intervals, attached by the owner
+
+        # --- Analytics ---
+        self.face_count = 0
+        self.sleeping_status = "No person detected"
+        self.focus_score = 0.0
+        self.unauthorized_activity_status = "None Detected"
+        self.copy_attempt_status = "None Detected"
+        self.proctoring_alert_status = "No Violations"
+        self.current_alert_type = None # Holds the type of alert for frontend
+        # Features of the primary person's face in the last frame (None without a face)
+        self.ear = None
+        self.mar = None
+        self.yaw = None # Legacy unit of the alert thresholds (np.degrees of the angle in degrees)
+        self.pitch = None
+        self.yaw_degrees = None # Head angles in degrees
+        self.pitch_degrees = None
+
+        # --- AI Detection State ---
+        # Every face is tracked as a person with a stable ID and its own rule state; the
+        # session-level statuses above follow the primary person (the one present longest)
+        self.identities = IdentityTracker(IDENTITY_MAX_MISSING, IDENTITY_MIN_IOU)
+        self.persons = {} # person ID -> PersonState
+        self.person_ids = [] # Person ID of each face of the last frame
+        self.primary_person_id = None
+        self.last_tracked_time = float('-inf') # Timestamp of the last frame passed to track_persons
+        self.last_person_detected_time = time.time() # Timestamp of the last person detected
+        self.last_analysis_time = 0.0 # When the live feed last analysed a frame
+        self.last_detections = ([], None, []) # (rects, landmarks, person_ids) of that frame, for overlays
+
+        self.last_access_time = time.time() # Last time a client asked for this session
+
+        # Latest published analytics, for clients streaming changes instead of polling
+        self._analytics_cond = threading.Condition()
+        self._analytics_snapshot = self.analytics()
+        self._analytics_version = 0
+        self._analytics_notified_at = 0.0 # When streaming clients were last woken up
+        self._analytics_held = False # Whether the snapshot changed since then
+
+    def track_persons(self, rects, timestamp):
+        """
+        Assigns the person ID of each face rectangle, creating the state of new
+        persons and dropping that of persons gone for IDENTITY_MAX_MISSING seconds.
+        Returns the IDs in the order of `rects`.
+        """
+        person_ids = self.identities.update(rects, timestamp)
+        for person_id in person_ids:
+            person = self.persons.get(person_id)
+            if person is None:
+                person = self.persons[person_id] = PersonState(person_id, timestamp)
+            elif person.last_seen < self.last_tracked_time and timestamp - person.last_seen > CONDITION_TOLERANCE:
+                # Missed by the previous analysed frame(s) for too long for the timers to bridge
+                # the gap. A mere long gap between analysed frames (low analysis rate) keeps them.
+                person.reset_temporal_state()
+            person.last_seen = timestamp
+            person.analysed = False
+        # Published once every listed person exists, as analytics() may run on another thread
+        self.person_ids = person_ids
+        self.last_tracked_time = timestamp
+        for person_id in self.identities.expired:
+            self.persons.pop(person_id, None)
+        return person_ids
+
+    def touch(self):
+        self.last_access_time = time.time()
+
+    def analytics(self):
+        """Returns the analytics payload served by /analytics."""
+        return {
+            'face_count': self.face_count,
+            'sleeping_status': self.sleeping_status,
+            'focus_score': round(self.focus_score, 2),
+            'unauthorized_activity': self.unauthorized_activity_status,
+            'copy_attempt': self.copy_attempt_status,
+            'proctoring_alert': self.proctoring_alert_status,
+            'alert_type': self.current_alert_type,
+            'primary_person': self.primary_person_id,
+            'persons': [person.analytics() for person in map(self.persons.get, self.person_ids) if person is not None],
+        }
+
+    def publish_analytics(self, urgent_fields=(), min_interval=0.0):
+        """
+        Called by the detection stage after each frame. Stores the latest
+        analytics and wakes up streaming clients if one of `urgent_fields`
+        changed, or else at most once per `min_interval` seconds: fields such
+        as the focus score change on nearly every frame.
+        """
+        snapshot = self.analytics()
+        now = time.time()
+        with self._analytics_cond:
+            urgent = False
+            if snapshot != self._analytics_snapshot:
+                urgent = any(snapshot.get(key) != self._analytics_snapshot.get(key) for key in urgent_fields)
+                self._analytics_snapshot = snapshot
+                self._analytics_held = True
+            # A change held back by the interval is flushed once it passes, even if nothing changed since
+            if self._analytics_held and (urgent or now - self._analytics_notified_at >= min_interval):
+                self._analytics_notified_at = now
+                self._analytics_held = False
+                self._analytics_version += 1
+                self._analytics_cond.notify_all()
+
+    def wait_for_analytics(self, last_version, timeout):
+        """
+        Blocks until clients are woken up for analytics newer than last_version
+        or the timeout expires. Returns (version, snapshot) of the latest analytics.
+        """
+        with self._analytics_cond:
+            self._analytics_cond.wait_for(lambda: self._analytics_version != last_version, timeout)
+            return self._analytics_version, self._analytics_snapshot
+
+    def close(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+
+class SessionRegistry:
+    """
+    Registry of MonitorSession objects keyed by session/camera ID.
+    Sessions are created on first use with `create_session(session_id)` (which
+    returns None if the session cannot be served), capped at `max_sessions`,
+    and stopped once nobody has accessed them for `idle_timeout` seconds.
+    Pinned sessions are never evicted. `on_close(session)` is called for every
+    session removed from the registry.
+    """
+
+    def __init__(self, create_session, max_sessions=32, idle_timeout=300, pinned=(), on_close=None):
+        self._create_session = create_session
+        self._on_close = on_close
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.pinned = set(pinned)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Returns the session for session_id, creating it if needed, or None."""
+        self.evict_idle()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    print(f"Warning: Session limit ({self.max_sessions}) reached. Refusing session '{session_id}'.")
+                    return None
+                session = self._create_session(session_id)
+                if session is None:
+                    return None
+                self._sessions[session_id] = session
+            session.touch()
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+            if self._on_close is not None:
+                self._on_close(session)
+
+    def evict_idle(self):
+        """Stops and drops sessions nobody has accessed for idle_timeout seconds."""
+        now = time.time()
+        with self._lock:
+            idle = [
+                session_id for session_id, session in self._sessions.items()
+                if session_id not in self.pinned and now - session.last_access_time > self.idle_timeout
+            ]
+        for session_id in idle:
+            print(f"Session '{session_id}' idle for over {self.idle_timeout}s. Releasing it.")
+            self.remove(session_id)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._sessions.values()))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,121 @@
+import itertools
+
+import numpy as np
+
+# --- Stable Person IDs Across Frames ---
+# The face detector returns faces in no particular order, so "the first face"
+# could be a different person from one frame to the next. IdentityTracker
+# matches each frame's face boxes to the people seen in previous frames,
+# first by box overlap (IoU) and then, for fast movers, by centroid distance,
+# and keeps a person's ID while their face is missing for up to `max_missing`
+# seconds. All matching is done on NumPy arrays of boxes, so it stays cheap
+# with dozens of faces.
+
+
+def rects_to_boxes(rects):
+    """(N, 4) float array of (left, top, right, bottom) for a list of dlib rectangles."""
+    return np.array([(rect.left(), rect.top(), rect.right(), rect.bottom()) for rect in rects],
+                    dtype=np.float64).reshape(-1, 4)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise intersection over union of two (N, 4) and (M, 4) box arrays, as (N, M)."""
+    left = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    top = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    right = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    bottom = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def _greedy_pairs(scores, valid, descending):
+    """Pairs rows with columns greedily by score; each row and column is used at most once."""
+    rows, cols = np.nonzero(valid)
+    order = np.argsort(scores[rows, cols])
+    if descending:
+        order = order[::-1]
+    used_rows, used_cols, pairs = set(), set(), []
+    for index in order:
+        row, col = rows[index], cols[index]
+        if row not in used_rows and col not in used_cols:
+            used_rows.add(row)
+            used_cols.add(col)
+            pairs.append((row, col))
+    return pairs
+
+
+class IdentityTracker:
+    """
+    Assigns stable integer IDs to the faces of consecutive frames.
+    A face continues a track when its box overlaps the track's last box by at
+    least `min_iou`, or else when its centre is within `max_distance` track
+    widths of the track's centre. Tracks not matched for `max_missing`
+    seconds are dropped and listed in `expired` after that update.
+    """
+
+    def __init__(self, max_missing=1.0, min_iou=0.3, max_distance=1.0):
+        self.max_missing = max_missing
+        self.min_iou = min_iou
+        self.max_distance = max_distance
+        self._ids = itertools.count(1)
+        self._track_ids = []
+        self._boxes = np.zeros((0, 4))
+        self._last_seen = np.zeros(0)
+        self.expired = []
+
+    def reset(self):
+        self._track_ids = []
+        self._boxes = np.zeros((0, 4))
+        self._last_seen = np.zeros(0)
+
+    def update(self, rects, timestamp):
+        """Returns the person ID of each rectangle, in the order of `rects`."""
+        boxes = rects_to_boxes(rects)
+        ids = [None] * len(boxes)
+        matched_tracks = set()
+        if len(boxes) and len(self._track_ids):
+            overlaps = iou_matrix(boxes, self._boxes)
+            for face, track in _greedy_pairs(overlaps, overlaps >= self.min_iou, descending=True):
+                ids[face] = track
+                matched_tracks.add(track)
+
+            faces_left = [face for face in range(len(boxes)) if ids[face] is None]
+            tracks_left = [track for track in range(len(self._track_ids)) if track not in matched_tracks]
+            if faces_left and tracks_left:
+                centres = (boxes[faces_left, :2] + boxes[faces_left, 2:]) / 2
+                track_boxes = self._boxes[tracks_left]
+                track_centres = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+                widths = np.maximum(track_boxes[:, 2] - track_boxes[:, 0], 1.0)
+                # Distances in units of the track's face width, so the gate scales with face size
+                distances = np.linalg.norm(centres[:, None] - track_centres[None], axis=-1) / widths[None]
+                for row, col in _greedy_pairs(distances, distances <= self.max_distance, descending=False):
+                    ids[faces_left[row]] = tracks_left[col]
+                    matched_tracks.add(tracks_left[col])
+
+        # Matched tracks move to their new boxes; unmatched faces start new tracks
+        track_ids = list(self._track_ids)
+        track_boxes = self._boxes.copy()
+        last_seen = self._last_seen.copy()
+        for face, track in enumerate(ids):
+            if track is None:
+                track_ids.append(next(self._ids))
+                track_boxes = np.vstack([track_boxes, boxes[face]])
+                last_seen = np.append(last_seen, timestamp)
+                ids[face] = len(track_ids) - 1
+            else:
+                track_boxes[track] = boxes[face]
+                last_seen[track] = timestamp
+
+        keep = timestamp - last_seen <= self.max_missing
+        self.expired = [track_id for track_id, kept in zip(track_ids, keep) if not kept]
+        person_ids = [track_ids[index] for index in ids]
+        self._track_ids = [track_id for track_id, kept in zip(track_ids, keep) if kept]
+        self._boxes = track_boxes[keep]
+        self._last_seen = last_seen[keep]
+        return person_ids
+
+    def __len__(self):
+        return len(self._track_ids)
@@ -0,0 +1,327 @@
+import collections
+import itertools
+import threading
+import time
+
+import cv2
+
+from buffers import FrameBufferPool, scratch_buffer
+from frame_sources import SourceReader
+from metrics import RateMeter, metrics
+
+# --- Threaded Frame Pipeline ---
+# One capture thread owns the frame source (camera), one detection thread runs the AI
+# analysis and one encode thread produces the JPEG chunks that the /video_feed
+# clients stream from. The stages are connected by LatestFrameQueue objects, so
+# a slow stage drops stale frames instead of stalling the stage before it.
+# Frames travel through the queues with the time they were read from the camera.
+
+MULTIPART_FOOTER = b'\r\n'
+
+# --- Stream Profiles ---
+# Clients ask for a max width, JPEG quality and frame rate. Width and quality are
+# snapped to a few steps so that many clients share the same encoded profile;
+# each profile is encoded at most once per frame, and only while it has clients.
+STREAM_WIDTHS = (160, 320, 480, 640, 960, 1280) # Allowed downscaled widths; 0 keeps full resolution
+STREAM_QUALITY_STEP = 10
+STREAM_QUALITY_RANGE = (20, 95)
+DEFAULT_JPEG_QUALITY = 95 # OpenCV's default
+
+StreamProfile = collections.namedtuple('StreamProfile', ['max_width', 'quality'])
+FULL_PROFILE = StreamProfile(0, DEFAULT_JPEG_QUALITY)
+
+
+def negotiate_profile(max_width=0, quality=DEFAULT_JPEG_QUALITY):
+    """Snaps the requested width and JPEG quality onto the shared profile steps."""
+    width = 0
+    if max_width and max_width > 0:
+        # Largest allowed width not above the request (the smallest one if the request is tinier)
+        smaller = [step for step in STREAM_WIDTHS if step <= max_width]
+        width = smaller[-1] if smaller else STREAM_WIDTHS[0]
+        if max_width > STREAM_WIDTHS[-1]:
+            width = 0
+    low, high = STREAM_QUALITY_RANGE
+    quality = int(round(min(high, max(low, quality)) / STREAM_QUALITY_STEP) * STREAM_QUALITY_STEP)
+    return StreamProfile(width, min(high, quality))
+
+
+def encode_chunk(frame, profile, scratch=None):
+    """
+    Resizes (if the profile asks for a smaller width) and JPEG-encodes a frame
+    into a complete multipart chunk. Returns None if encoding failed.
+    A `scratch` dict lets repeated calls reuse the resized image.
+    """
+    if profile.max_width and frame.shape[1] > profile.max_width:
+        height = int(frame.shape[0] * profile.max_width / frame.shape[1])
+        resized = None
+        if scratch is not None:
+            resized = scratch_buffer(scratch, 'resized', (height, profile.max_width, frame.shape[2]))
+        frame = cv2.resize(frame, (profile.max_width, height), dst=resized, interpolation=cv2.INTER_AREA)
+    with metrics.time_stage("imencode"):
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, profile.quality])
+    if not ret:
+        return None
+    header = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % buffer.size
+    # join() reads the encoded buffer through its memoryview, so the JPEG bytes are copied
+    # only once, into the single bytes chunk every client of the profile is sent (WSGI
+    # servers such as gunicorn only accept bytes, not memoryviews, from the app)
+    return b''.join((header, memoryview(buffer), MULTIPART_FOOTER))
+
+
+class LatestFrameQueue:
+    """
+    Bounded queue between two pipeline stages.
+    When full, putting a new item discards the oldest one, so the consumer
+    always works on the most recent frame and the producer never blocks.
+    `on_drop` is called with every discarded item.
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._on_drop = on_drop
+        self.dropped = 0 # Number of items discarded because the consumer was too slow
+
+    def put(self, item):
+        discarded = None
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                discarded = self._items[0]
+            self._items.append(item)
+            self._cond.notify()
+        if discarded is not None and self._on_drop is not None:
+            self._on_drop(discarded)
+
+    def get(self, timeout=None):
+        """Returns the oldest queued item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._items) > 0, timeout):
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class FrameBroadcaster:
+    """
+    Holds the latest encoded multipart chunk and wakes up every subscriber
+    when a new one is published. Subscribers never copy or re-encode frames.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunk = None
+        self._seq = 0
+
+    def publish(self, chunk):
+        with self._cond:
+            self._chunk = chunk
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait_for_chunk(self, last_seq, timeout=1.0):
+        """
+        Blocks until a chunk newer than last_seq is available.
+        Returns (seq, chunk), or (last_seq, None) on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != last_seq, timeout):
+                return last_seq, None
+            return self._seq, self._chunk
+
+
+class _ProfileStream:
+    """Broadcaster and subscribers (with their requested fps) of one stream profile."""
+
+    def __init__(self):
+        self.broadcaster = FrameBroadcaster()
+        self.subscribers = {} # subscriber token -> requested fps (0 = every frame)
+        self.last_encode_time = 0.0
+        self.scratch = {} # Resized-frame buffer reused by every encode of this profile
+
+    def encode_interval(self):
+        # Encode as often as the most demanding subscriber wants frames
+        if not self.subscribers or 0 in self.subscribers.values():
+            return 0.0
+        return 1.0 / max(self.subscribers.values())
+
+
+class FramePipeline:
+    """
+    Shared producer for the MJPEG stream.
+    `analyse` is called with every frame the detection stage picks up and may
+    draw overlays on it in place once it has analysed it; the annotated frame
+    is what gets encoded, once per active stream profile. `latency_sink`, if
+    given, is called with the seconds from camera read to encoded chunk of
+    every encoded frame.
+    Frames are read into buffers of a FrameBufferPool, which return to the
+    pool once encoded or dropped, so nothing may keep a frame after `analyse`.
+    """
+
+    def __init__(self, camera, source, analyse, queue_size=1, latency_sink=None):
+        # The capture stage reads through a SourceReader, which reconnects a lost source with backoff
+        self.camera = camera if isinstance(camera, SourceReader) else SourceReader(source, camera)
+        self.source = source
+        self.analyse = analyse
+        self.latency_sink = latency_sink
+        # Enough buffers for a frame being read, analysed and encoded plus the queued ones
+        self.buffer_pool = FrameBufferPool(2 * queue_size + 4)
+        self.capture_queue = LatestFrameQueue(queue_size, on_drop=self._recycle)
+        self.encode_queue = LatestFrameQueue(queue_size, on_drop=self._recycle)
+        self._profiles = {} # StreamProfile -> _ProfileStream
+        self._profiles_lock = threading.Lock()
+        self._subscriber_tokens = itertools.count()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        # Achieved frame rate of each stage, and chunks clients skipped because they were too slow
+        self.frame_rates = {'capture': RateMeter(), 'detect': RateMeter(), 'encode': RateMeter()}
+        self.skipped_chunks = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        """Starts the pipeline threads. Safe to call on every new subscriber."""
+        with self._lock:
+            if self.is_running():
+                return
+            self._stop_event.clear()
+            self._threads = [
+                threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+                threading.Thread(target=self._detect_loop, name="detect", daemon=True),
+                threading.Thread(target=self._encode_loop, name="encode", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self.camera.release() # Also wakes a capture thread waiting to reconnect
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def is_running(self):
+        return bool(self._threads) and all(thread.is_alive() for thread in self._threads)
+
+    # --- Stages ---
+    def _capture_loop(self):
+        first_frame_read = False
+
+        while not self._stop_event.is_set():
+            buffer = self.buffer_pool.acquire()
+            # Blocks while the source reconnects; only fails once the pipeline is stopped
+            success, frame = self.camera.read(buffer)
+            if not success:
+                if buffer is not None:
+                    self.buffer_pool.release(buffer)
+                break
+
+            if not first_frame_read:
+                if frame is not None:
+                    print(f"Successfully read first frame. Frame dimensions: {frame.shape[1]}x{frame.shape[0]} (width x height)")
+                    first_frame_read = True
+                else:
+                    print("Warning: First frame was None despite success=True. Retrying...")
+                    continue
+
+            if frame is not buffer:
+                # The source allocated the frame itself (first frame or new resolution)
+                self.buffer_pool.adopt(frame)
+            self.frame_rates['capture'].tick()
+            self.capture_queue.put((time.monotonic(), frame))
+
+    def _detect_loop(self):
+        while not self._stop_event.is_set():
+            item = self.capture_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            with metrics.time_stage("analysis"):
+                self.analyse(item[1])
+            self.frame_rates['detect'].tick()
+            self.encode_queue.put(item)
+
+    def _encode_loop(self):
+        while not self._stop_event.is_set():
+            item = self.encode_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            captured_at, frame = item
+            self.frame_rates['encode'].tick()
+            now = time.monotonic()
+            with self._profiles_lock:
+                due = [
+                    (profile, stream) for profile, stream in self._profiles.items()
+                    if stream.subscribers and now - stream.last_encode_time >= stream.encode_interval()
+                ]
+            for profile, stream in due:
+                # Encode each profile once; every subscriber of it yields the same bytes
+                chunk = encode_chunk(frame, profile, stream.scratch)
+                if chunk is None:
+                    print("Error: Failed to encode frame.")
+                    continue
+                stream.last_encode_time = now
+                stream.broadcaster.publish(chunk)
+            if due:
+                latency = time.monotonic() - captured_at
+                metrics.observe("frame_latency", latency)
+                if self.latency_sink is not None:
+                    self.latency_sink(latency)
+            self.buffer_pool.release(frame)
+
+    def _recycle(self, item):
+        # A frame dropped from a queue goes straight back to the buffer pool
+        self.buffer_pool.release(item[1])
+
+    # --- Subscribers ---
+    def _subscribe(self, profile, fps):
+        with self._profiles_lock:
+            stream = self._profiles.get(profile)
+            if stream is None:
+                stream = self._profiles[profile] = _ProfileStream()
+            token = next(self._subscriber_tokens)
+            stream.subscribers[token] = fps
+            return stream, token
+
+    def _unsubscribe(self, profile, token):
+        with self._profiles_lock:
+            stream = self._profiles.get(profile)
+            if stream is not None:
+                stream.subscribers.pop(token, None)
+                if not stream.subscribers:
+                    del self._profiles[profile]
+
+    def active_profiles(self):
+        """Returns {StreamProfile: subscriber count} for the profiles being encoded."""
+        with self._profiles_lock:
+            return {profile: len(stream.subscribers) for profile, stream in self._profiles.items()}
+
+    def frames(self, profile=FULL_PROFILE, fps=0):
+        """
+        Generator for one /video_feed client. Yields the latest chunk of the
+        client's stream profile, at most `fps` times per second (0 = every
+        encoded frame). A client whose socket is slow does not queue frames:
+        once it is ready again it gets the newest chunk, and the ones published
+        in between are dropped for it.
+        """
+        self.start()
+        stream, token = self._subscribe(profile, fps)
+        min_interval = 1.0 / fps if fps else 0.0
+        last_seq = 0
+        last_sent = 0.0
+        try:
+            while not self._stop_event.is_set():
+                seq, chunk = stream.broadcaster.wait_for_chunk(last_seq)
+                if chunk is None:
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    self.skipped_chunks += seq - last_seq - 1
+                last_seq = seq
+                now = time.monotonic()
+                if now - last_sent < min_interval:
+                    continue
+                last_sent = now
+                yield chunk
+        finally:
+            self._unsubscribe(profile, token)
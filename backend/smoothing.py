@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+
+# --- Time-Based Signal Smoothing ---
+# Alert rules used to count consecutive frames, so their timing depended on the
+# frame rate and a single noisy frame reset a counter. These helpers work on
+# timestamps instead: TimeWindowSmoother keeps the recent samples of a signal
+# in a fixed-size ring buffer and returns their median over a time window (or
+# a time-constant EMA), and ConditionTimer measures for how many seconds a
+# condition has held. Both behave the same at 5 or 30 analysed frames per second.
+
+
+class TimeWindowSmoother:
+    """
+    Median over the last `window` seconds and exponential moving average with
+    time constant `time_constant` seconds of one scalar signal. Samples live
+    in preallocated ring-buffer arrays of `capacity` entries.
+    """
+
+    def __init__(self, window=0.3, time_constant=0.5, capacity=64):
+        self.window = window
+        self.time_constant = time_constant
+        self._times = np.full(capacity, -np.inf)
+        self._values = np.zeros(capacity)
+        self._next = 0
+        self._last_time = None
+        self.ema = None
+
+    def reset(self):
+        self._times.fill(-np.inf)
+        self._next = 0
+        self._last_time = None
+        self.ema = None
+
+    def add(self, timestamp, value):
+        """Adds a sample and returns the windowed median."""
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._times)
+
+        if self.ema is None:
+            self.ema = value
+        else:
+            # The weight of a sample grows with the time since the previous one,
+            # so the EMA converges at the same speed at any frame rate
+            alpha = 1.0 - math.exp(-max(0.0, timestamp - self._last_time) / self.time_constant)
+            self.ema += alpha * (value - self.ema)
+        self._last_time = timestamp
+        return self.median()
+
+    def median(self):
+        """Median of the samples within `window` seconds of the latest one."""
+        if self._last_time is None:
+            return None
+        recent = self._times >= self._last_time - self.window
+        return float(np.median(self._values[recent]))
+
+
+class ConditionTimer:
+    """
+    Seconds for which a condition has held. A condition that drops out for
+    no longer than `tolerance` seconds keeps its start time.
+    """
+
+    def __init__(self, tolerance=0.0):
+        self.tolerance = tolerance
+        self.since = None
+        self._last_active = None
+
+    def reset(self):
+        self.since = None
+        self._last_active = None
+
+    def update(self, timestamp, active):
+        """Feeds the condition's state at `timestamp`; returns the seconds it has held."""
+        if active:
+            if self.since is None:
+                self.since = timestamp
+            self._last_active = timestamp
+            return timestamp - self.since
+        if self.since is not None and timestamp - self._last_active > self.tolerance:
+            self.reset()
+        return self.held()
+
+    def held(self):
+        return self._last_active - self.since if self.since is not None else 0.0
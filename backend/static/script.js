@@ -10,7 +10,10 @@ document.addEventListener('DOMContentLoaded', (event) => {
     const alertSound = document.getElementById('alertSound'); // Audio element for beep
 
     // --- Analytics and Alert Configuration ---
-    const ANALYTICS_REFRESH_INTERVAL = 1000; // Refresh analytics every 1 second (1000 ms)
+    const ANALYTICS_REFRESH_INTERVAL = 1000; // Polling fallback: refresh analytics every 1 second (1000 ms)
+    const ANALYTICS_STREAM_URL = '/analytics_stream'; // Server-Sent Events endpoint pushing changed fields
+    let analyticsState = {}; // Latest full analytics, streamed changes are merged into it
+    let pollingTimer = null; // Interval ID while falling back to polling
     
     // For debouncing alerts (preventing rapid, annoying repetitions)
     const lastAlertTimestamp = new Map(); // Stores last played timestamp for each alert type
@@ -83,101 +86,145 @@ document.addEventListener('DOMContentLoaded', (event) => {
         }
     }
 
-    // --- Main Function to Fetch and Update Analytics ---
-    async function fetchAnalytics() {
-        try {
-            const response = await fetch('/analytics'); // Using relative path for Flask endpoint
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            const data = await response.json();
-
-            // --- Update UI Elements ---
-            faceCountElement.textContent = data.face_count;
-            sleepingStatusElement.textContent = data.sleeping_status;
-            focusScoreElement.textContent = data.focus_score.toFixed(2); // Format to 2 decimal places
-            unauthorizedActivityElement.textContent = data.unauthorized_activity;
-            copyAttemptElement.textContent = data.copy_attempt;
-            proctoringAlertElement.textContent = data.proctoring_alert;
-
-            // --- Update Status Text Colors and Alert Styling ---
-            // Sleeping Status
-            if (data.sleeping_status.includes("Sleeping")) {
-                sleepingStatusElement.className = 'text-red-600 text-lg font-bold';
-            } else if (data.sleeping_status.includes("No person")) {
-                 sleepingStatusElement.className = 'text-gray-500 text-lg font-bold';
-            } else if (data.sleeping_status.includes("Yawning")) {
-                 sleepingStatusElement.className = 'text-orange-600 text-lg font-bold'; // Indicate yawning differently
-            }
-            else {
-                sleepingStatusElement.className = 'text-green-600 text-lg font-bold';
-            }
+    // --- Main Function to Update the UI from Analytics ---
+    function updateAnalytics(data) {
+        // --- Update UI Elements ---
+        faceCountElement.textContent = data.face_count;
+        sleepingStatusElement.textContent = data.sleeping_status;
+        focusScoreElement.textContent = data.focus_score.toFixed(2); // Format to 2 decimal places
+        unauthorizedActivityElement.textContent = data.unauthorized_activity;
+        copyAttemptElement.textContent = data.copy_attempt;
+        proctoringAlertElement.textContent = data.proctoring_alert;
+
+        // --- Update Status Text Colors and Alert Styling ---
+        // Sleeping Status
+        if (data.sleeping_status.includes("Sleeping")) {
+            sleepingStatusElement.className = 'text-red-600 text-lg font-bold';
+        } else if (data.sleeping_status.includes("No person")) {
+             sleepingStatusElement.className = 'text-gray-500 text-lg font-bold';
+        } else if (data.sleeping_status.includes("Yawning")) {
+             sleepingStatusElement.className = 'text-orange-600 text-lg font-bold'; // Indicate yawning differently
+        }
+        else {
+            sleepingStatusElement.className = 'text-green-600 text-lg font-bold';
+        }
 
-            // Unauthorized Activity
-            if (data.unauthorized_activity === "None Detected" || data.unauthorized_activity === "No Person Detected") {
-                unauthorizedActivityElement.className = 'text-gray-500 text-lg font-bold';
-            } else {
-                unauthorizedActivityElement.className = 'text-red-600 text-lg font-bold';
-            }
+        // Unauthorized Activity
+        if (data.unauthorized_activity === "None Detected" || data.unauthorized_activity === "No Person Detected") {
+            unauthorizedActivityElement.className = 'text-gray-500 text-lg font-bold';
+        } else {
+            unauthorizedActivityElement.className = 'text-red-600 text-lg font-bold';
+        }
 
-            // Copy Attempt
-            if (data.copy_attempt === "None Detected") { 
-                copyAttemptElement.className = 'text-gray-500 text-lg font-bold';
-            } else {
-                copyAttemptElement.className = 'text-red-600 text-lg font-bold';
-            }
+        // Copy Attempt
+        if (data.copy_attempt === "None Detected") { 
+            copyAttemptElement.className = 'text-gray-500 text-lg font-bold';
+        } else {
+            copyAttemptElement.className = 'text-red-600 text-lg font-bold';
+        }
 
-            // Proctoring Alert - UI Class based on severity
-            proctoringAlertElement.classList.remove('alert-critical', 'alert-warning');
-            const isCriticalAlert = data.proctoring_alert && (data.proctoring_alert.includes("Alert") || data.proctoring_alert.includes("Cheating") || data.proctoring_alert.includes("Violation") || data.proctoring_alert.includes("Absent"));
-            const isWarningAlert = data.proctoring_alert && (data.proctoring_alert.includes("Diverted") || data.proctoring_alert.includes("Drowsiness") || data.proctoring_alert.includes("Yawn"));
-            
-            if (isCriticalAlert) {
-                proctoringAlertElement.classList.add('alert-critical');
-            } else if (isWarningAlert) {
-                proctoringAlertElement.classList.add('alert-warning');
-            }
+        // Proctoring Alert - UI Class based on severity
+        proctoringAlertElement.classList.remove('alert-critical', 'alert-warning');
+        const isCriticalAlert = data.proctoring_alert && (data.proctoring_alert.includes("Alert") || data.proctoring_alert.includes("Cheating") || data.proctoring_alert.includes("Violation") || data.proctoring_alert.includes("Absent"));
+        const isWarningAlert = data.proctoring_alert && (data.proctoring_alert.includes("Diverted") || data.proctoring_alert.includes("Drowsiness") || data.proctoring_alert.includes("Yawn"));
+        
+        if (isCriticalAlert) {
+            proctoringAlertElement.classList.add('alert-critical');
+        } else if (isWarningAlert) {
+            proctoringAlertElement.classList.add('alert-warning');
+        }
+
+        // --- Handle Audible and Spoken Alerts ---
+        const currentAlertType = data.alert_type; // This comes from the backend
+        const currentTime = Date.now();
+
+        // Log the incoming alert type for debugging
+        console.log("Received alert_type from backend:", currentAlertType);
 
-            // --- Handle Audible and Spoken Alerts ---
-            const currentAlertType = data.alert_type; // This comes from the backend
-            const currentTime = Date.now();
-
-            // Log the incoming alert type for debugging
-            console.log("Received alert_type from backend:", currentAlertType);
-
-            if (currentAlertType && alertMessages[currentAlertType]) {
-                const lastTime = lastAlertTimestamp.get(currentAlertType) || 0;
-
-                // Trigger alert if it's a new type, or if it's the same type but enough time has passed
-                if ((currentAlertType !== lastAlertTimestamp.get('lastTriggeredAlert') && currentAlertType !== lastAlertTimestamp.get('activeAlert')) || (currentTime - lastTime) > alertDebounceTime) {
-                    console.log(`Triggering alert: ${currentAlertType}`);
-                    playAlertSound();
-                    speakAlert(alertMessages[currentAlertType]);
-                    lastAlertTimestamp.set(currentAlertType, currentTime);
-                    lastAlertTimestamp.set('lastTriggeredAlert', currentAlertType); // Track the last triggered alert type
-                    // No need to set 'activeAlert' here, it's tracked implicitly by currentSpeakingUtterance
-                } else {
-                    console.log(`Debouncing alert: ${currentAlertType}. Time since last: ${currentTime - lastTime}ms`);
-                }
+        if (currentAlertType && alertMessages[currentAlertType]) {
+            const lastTime = lastAlertTimestamp.get(currentAlertType) || 0;
+
+            // Trigger alert if it's a new type, or if it's the same type but enough time has passed
+            if ((currentAlertType !== lastAlertTimestamp.get('lastTriggeredAlert') && currentAlertType !== lastAlertTimestamp.get('activeAlert')) || (currentTime - lastTime) > alertDebounceTime) {
+                console.log(`Triggering alert: ${currentAlertType}`);
+                playAlertSound();
+                speakAlert(alertMessages[currentAlertType]);
+                lastAlertTimestamp.set(currentAlertType, currentTime);
+                lastAlertTimestamp.set('lastTriggeredAlert', currentAlertType); // Track the last triggered alert type
+                // No need to set 'activeAlert' here, it's tracked implicitly by currentSpeakingUtterance
             } else {
-                // No active alert from backend, or alert type is not recognized. Stop existing alerts.
-                stopAllAlerts();
-                lastAlertTimestamp.set('lastTriggeredAlert', null); // Clear last triggered alert type
+                console.log(`Debouncing alert: ${currentAlertType}. Time since last: ${currentTime - lastTime}ms`);
             }
+        } else {
+            // No active alert from backend, or alert type is not recognized. Stop existing alerts.
+            stopAllAlerts();
+            lastAlertTimestamp.set('lastTriggeredAlert', null); // Clear last triggered alert type
+        }
+    }
+
+    function showAnalyticsError() {
+        // Optionally update UI to show error state for all fields
+        sleepingStatusElement.textContent = 'Error fetching data';
+        sleepingStatusElement.className = 'text-red-500 text-lg font-bold';
+        unauthorizedActivityElement.textContent = 'Error';
+        unauthorizedActivityElement.className = 'text-red-500 text-lg font-bold';
+        copyAttemptElement.textContent = 'Error';
+        copyAttemptElement.className = 'text-red-500 text-lg font-bold';
+        proctoringAlertElement.textContent = 'Error';
+        proctoringAlertElement.className = 'text-red-500 text-lg font-bold';
+        stopAllAlerts(); // Stop alerts on error
+    }
 
+    // --- Polling Fallback ---
+    async function fetchAnalytics() {
+        try {
+            const response = await fetch('/analytics'); // Using relative path for Flask endpoint
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            analyticsState = await response.json();
+            updateAnalytics(analyticsState);
         } catch (error) {
             console.error('Error fetching analytics:', error);
-            // Optionally update UI to show error state for all fields
-            sleepingStatusElement.textContent = 'Error fetching data';
-            sleepingStatusElement.className = 'text-red-500 text-lg font-bold';
-            unauthorizedActivityElement.textContent = 'Error';
-            unauthorizedActivityElement.className = 'text-red-500 text-lg font-bold';
-            copyAttemptElement.textContent = 'Error';
-            copyAttemptElement.className = 'text-red-500 text-lg font-bold';
-            proctoringAlertElement.textContent = 'Error';
-            proctoringAlertElement.className = 'text-red-500 text-lg font-bold';
-            stopAllAlerts(); // Stop alerts on error
+            showAnalyticsError();
+        }
+    }
+
+    function startPolling() {
+        if (pollingTimer === null) {
+            console.warn("Analytics stream unavailable. Falling back to polling.");
+            fetchAnalytics();
+            pollingTimer = setInterval(fetchAnalytics, ANALYTICS_REFRESH_INTERVAL);
+        }
+    }
+
+    function stopPolling() {
+        if (pollingTimer !== null) {
+            clearInterval(pollingTimer);
+            pollingTimer = null;
+        }
+    }
+
+    // --- Streamed Analytics (Server-Sent Events) ---
+    function connectAnalyticsStream() {
+        if (!('EventSource' in window)) {
+            startPolling();
+            return;
         }
+        const source = new EventSource(ANALYTICS_STREAM_URL);
+        source.onopen = () => {
+            console.log("Analytics stream connected.");
+            stopPolling();
+        };
+        source.onmessage = (event) => {
+            // The first event carries every field, later events only the changed ones
+            analyticsState = { ...analyticsState, ...JSON.parse(event.data) };
+            updateAnalytics(analyticsState);
+        };
+        source.onerror = () => {
+            // EventSource reconnects by itself; poll until it is back
+            startPolling();
+        };
     }
 
     // --- Initialization ---
@@ -189,9 +236,8 @@ document.addEventListener('DOMContentLoaded', (event) => {
         console.log("SpeechSynthesis voices loaded.");
     };
 
-    // Initial fetch and then periodically fetch analytics data
-    fetchAnalytics();
-    setInterval(fetchAnalytics, ANALYTICS_REFRESH_INTERVAL);
+    // Receive analytics changes as they happen; polling is only used as a fallback
+    connectAnalyticsStream();
 
     // --- Optional: Handle video feed loading errors ---
     videoFeedElement.onerror = () => {
@@ -0,0 +1,86 @@
+import dlib
+import numpy as np
+import pytest
+
+import detection
+from detection import (EYES_CLOSED_SECONDS, FEATURE_SMOOTHING_WINDOW, GAZE_AWAY_SECONDS, YAWN_SECONDS,
+                       perform_ai_detection)
+from monitor import MonitorSession
+
+RATES = [3, 5, 10, 30] # Analysed frames per second
+FRAME_SIZE = (640, 480)
+FACE = dlib.rectangle(200, 100, 400, 300)
+AWAKE = {'ear': 0.3, 'mar': 0.3, 'yaw': 0.0, 'pitch': 0.0, 'yaw_degrees': 0.0, 'pitch_degrees': 0.0}
+
+
+@pytest.fixture
+def features(monkeypatch):
+    """Replaces landmark-based feature extraction with the features set in the returned dict."""
+    current = dict(AWAKE)
+
+    def fake_extract_features(landmarks, frame_size, pose_estimator, keys=None):
+        return {name: np.full(len(landmarks), value) for name, value in current.items()}
+
+    monkeypatch.setattr(detection, "extract_features", fake_extract_features)
+    return current
+
+
+def run(session, rate, duration, start=0.0, faces=1):
+    """Analyses `duration` seconds of frames at `rate`; returns (timestamp, alert type) per frame."""
+    rects = dlib.rectangles([dlib.rectangle(FACE.left() + 250 * i, FACE.top(), FACE.right() + 250 * i, FACE.bottom())
+                             for i in range(faces)])
+    landmarks = np.zeros((faces, 68, 2)) if faces else None
+    results = []
+    for index in range(int(round(duration * rate))):
+        timestamp = start + index / rate
+        results.append((timestamp, perform_ai_detection(session, FRAME_SIZE, rects, landmarks, timestamp)))
+    return results
+
+
+def first_alert(results, alert_type):
+    return next((timestamp for timestamp, alert in results if alert == alert_type), None)
+
+
+@pytest.mark.parametrize("rate", RATES)
+@pytest.mark.parametrize("condition, alert_type, seconds", [
+    ({'ear': 0.1}, "drowsiness", EYES_CLOSED_SECONDS),
+    ({'mar': 0.9}, "yawn", YAWN_SECONDS),
+    ({'yaw': 30.0}, "gaze_violation", GAZE_AWAY_SECONDS),
+])
+def test_alert_fires_after_its_duration_at_any_rate(features, rate, condition, alert_type, seconds):
+    session = MonitorSession("test", "synthetic", None)
+    run(session, rate, 1.0) # Awake first
+    features.update(condition)
+    fired = first_alert(run(session, rate, 3.0, start=1.0), alert_type)
+    assert fired is not None
+    # The rules work on time, so the alert comes at the same moment at any rate: after the
+    # median of the smoothing window crosses the threshold (half a window), give or take a frame
+    assert seconds <= fired - 1.0 <= seconds + FEATURE_SMOOTHING_WINDOW / 2 + 2.0 / rate
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_alert_timers_survive_for_every_person(features, rate):
+    session = MonitorSession("test", "synthetic", None)
+    features.update({'ear': 0.1})
+    run(session, rate, 2.0, faces=3)
+    assert len(session.persons) == 3
+    assert all(person.alert_counts.get("drowsiness") == 1 for person in session.persons.values())
+
+
+def test_missing_face_restarts_timers(features):
+    session = MonitorSession("test", "synthetic", None)
+    features.update({'ear': 0.1})
+    run(session, 30, 0.3)
+    run(session, 30, 0.5, start=0.3, faces=0) # Gone for longer than the condition tolerance
+    results = run(session, 30, 1.0, start=0.8)
+    assert first_alert(results, "drowsiness") - 0.8 >= EYES_CLOSED_SECONDS
+    assert list(session.persons) == [1] # Back within IDENTITY_MAX_MISSING: same person
+
+
+def test_person_expires_after_identity_max_missing(features):
+    session = MonitorSession("test", "synthetic", None)
+    run(session, 30, 0.5)
+    run(session, 30, 2.0, start=0.5, faces=0)
+    assert session.persons == {}
+    run(session, 30, 0.5, start=2.5)
+    assert list(session.persons) == [2]
@@ -0,0 +1,57 @@
+import pytest
+
+import monitor
+from monitor import MonitorSession
+
+URGENT = ('alert_type',)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(monitor.time, "time", lambda: now[0])
+    return now
+
+
+def publish(session, clock, at, **fields):
+    clock[0] = at
+    for name, value in fields.items():
+        setattr(session, name, value)
+    session.publish_analytics(URGENT, min_interval=0.25)
+    return session.wait_for_analytics(None, 0)[0] # Current version: bumped on every wake-up
+
+
+def test_frequent_changes_wake_streams_once_per_interval(clock):
+    session = MonitorSession("test", "synthetic", None)
+    versions = {publish(session, clock, 1000.0 + frame / 30, focus_score=frame + 1.0) for frame in range(30)}
+    assert len(versions) == 4 # 1 s of frames at 30 fps, at most one wake-up per 0.25 s
+
+
+def test_latest_snapshot_is_served_between_wake_ups(clock):
+    session = MonitorSession("test", "synthetic", None)
+    version = publish(session, clock, 1000.0, focus_score=10.0)
+    assert publish(session, clock, 1000.1, focus_score=20.0) == version
+    assert session.wait_for_analytics(version, 0)[1]['focus_score'] == 20.0
+
+
+def test_alert_change_wakes_streams_immediately(clock):
+    session = MonitorSession("test", "synthetic", None)
+    version = publish(session, clock, 1000.0, focus_score=10.0)
+    assert publish(session, clock, 1000.01, current_alert_type="drowsiness") == version + 1
+
+
+def test_unchanged_analytics_do_not_wake_streams(clock):
+    session = MonitorSession("test", "synthetic", None)
+    version = publish(session, clock, 1000.0, focus_score=10.0)
+    assert publish(session, clock, 1001.0) == version
+
+
+def test_held_back_change_is_flushed_once_the_interval_passes(clock):
+    session = MonitorSession("test", "synthetic", None)
+    version = publish(session, clock, 1000.0, face_count=1, sleeping_status="Awake")
+    # The person leaves right after a wake-up; later frames produce the same analytics
+    assert publish(session, clock, 1000.05, face_count=0, sleeping_status="No person detected") == version
+    versions = [publish(session, clock, 1000.05 + frame / 30) for frame in range(1, 30)]
+    assert versions[-1] == version + 1
+    assert session.wait_for_analytics(version, 0)[1]['face_count'] == 0
+    assert versions.index(version + 1) <= 7 # Woken within ANALYTICS_PUSH_INTERVAL (0.25 s) of the last wake-up
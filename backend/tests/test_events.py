@@ -0,0 +1,96 @@
+import pytest
+
+import app as focus_app
+from events import AlertTracker, EventLog
+
+
+def feed(tracker, frames):
+    """Feeds (timestamp, alert type, focus score) frames; returns every started/ended event."""
+    changed = []
+    for timestamp, alert_type, focus_score in frames:
+        changed.extend(tracker.update(alert_type, timestamp, focus_score))
+    return changed
+
+
+@pytest.fixture
+def event_log(tmp_path):
+    log = EventLog(str(tmp_path / "events.db"), flush_interval=0.01)
+    yield log
+    log.close()
+
+
+def test_flickering_alert_is_one_interval():
+    tracker = AlertTracker("s1", end_grace=2.0)
+    # On and off every other frame for a second, then gone
+    frames = [(index / 10, "drowsiness" if index % 2 == 0 else None, 50.0 - index) for index in range(10)]
+    changed = feed(tracker, frames)
+    assert [event['ended_at'] for event in changed] == [None]
+
+    changed = feed(tracker, [(0.8 + 2.0 + 0.1, None, 80.0)])
+    assert len(changed) == 1
+    event = changed[0]
+    assert (event['started_at'], event['ended_at'], event['frames']) == (0.0, 0.8, 5)
+    assert event['duration'] == pytest.approx(0.8)
+    assert event['min_focus_score'] == 42.0
+    assert event['mean_focus_score'] == pytest.approx(46.0)
+
+
+def test_alert_after_the_grace_period_is_a_new_interval():
+    tracker = AlertTracker("s1", end_grace=2.0)
+    started = feed(tracker, [(0.0, "yawn", 50.0), (2.5, None, 50.0), (3.0, "yawn", 50.0)])
+    assert [event['ended_at'] for event in started] == [None, 0.0, None]
+    assert started[0]['id'] == started[1]['id'] != started[2]['id']
+    assert [event['id'] for event in tracker.close()] == [started[2]['id']]
+
+
+def test_end_of_an_interval_replaces_its_start(event_log):
+    tracker = AlertTracker("s1")
+    for event in feed(tracker, [(100.0, "gaze_violation", 60.0), (101.0, "gaze_violation", 40.0)]) + tracker.close():
+        event_log.record(event)
+    event_log.close()
+
+    events, total = event_log.query()
+    assert total == 1
+    assert (events[0]['started_at'], events[0]['ended_at'], events[0]['frames']) == (100.0, 101.0, 2)
+    assert event_log.written == 2
+
+
+def test_record_after_close_is_refused(event_log):
+    event_log.record(AlertTracker("s1").update("yawn", 1.0, 50.0)[0])
+    event_log.close()
+    assert event_log.record(AlertTracker("s1").update("yawn", 2.0, 50.0)[0]) is False
+    assert event_log.dropped == 1
+    assert event_log.query()[1] == 1
+
+    event_log.start() # Restarting the writer accepts events again
+    assert event_log.record(AlertTracker("s1").update("yawn", 3.0, 50.0)[0]) is True
+    event_log.close()
+    assert event_log.query()[1] == 2
+
+
+def test_query_before_any_write_is_empty(event_log):
+    assert event_log.query() == ([], 0)
+
+
+def test_events_endpoint_pages_with_next_offset(event_log, monkeypatch):
+    tracker = AlertTracker("s1", end_grace=0.5)
+    # Five one-frame alerts, each ended by an alert-free frame a second later
+    frames = [(float(second), "copy_attempt" if second % 2 == 0 else None, 50.0) for second in range(10)]
+    for event in feed(tracker, frames) + tracker.close():
+        event_log.record(event)
+    event_log.close()
+    monkeypatch.setattr(focus_app, "event_log", event_log)
+    client = focus_app.app.test_client()
+
+    pages, offset = [], 0
+    while offset is not None:
+        page = client.get(f"/events/s1?limit=2&offset={offset}").get_json()
+        pages.append([event['started_at'] for event in page['events']])
+        assert page['total'] == 5
+        offset = page['next_offset']
+    assert pages == [[8.0, 6.0], [4.0, 2.0], [0.0]]
+
+    assert client.get("/events?type=copy_attempt&since=4").get_json()['total'] == 3
+    assert client.get("/events/other").get_json() == {'events': [], 'total': 0, 'limit': 50, 'offset': 0,
+                                                      'next_offset': None}
+    assert client.get("/events?type=unknown").status_code == 400
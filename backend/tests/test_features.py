@@ -0,0 +1,66 @@
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from features import LEFT_EYE, MOUTH, RIGHT_EYE, euler_angles, extract_features, eye_aspect_ratios, \
+    mouth_aspect_ratios, rotation_matrices
+
+
+@pytest.fixture
+def rvecs():
+    # Random axes with angles up to pi, plus the zero rotation
+    rng = np.random.default_rng(7)
+    axes = rng.normal(size=(2000, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    rvecs = axes * rng.uniform(0, np.pi, (2000, 1))
+    rvecs[0] = 0.0
+    return rvecs
+
+
+# The per-face formulas the vectorized ones replaced
+def scalar_eye_aspect_ratio(eye):
+    return (math.dist(eye[1], eye[5]) + math.dist(eye[2], eye[4])) / (2.0 * math.dist(eye[0], eye[3]))
+
+
+def scalar_mouth_aspect_ratio(mouth):
+    return (math.dist(mouth[2], mouth[10]) + math.dist(mouth[4], mouth[8])) / (2.0 * math.dist(mouth[0], mouth[6]))
+
+
+def test_rotation_matrices_match_cv2_rodrigues(rvecs):
+    expected = np.array([cv2.Rodrigues(rvec)[0] for rvec in rvecs])
+    assert np.abs(rotation_matrices(rvecs) - expected).max() < 1e-12
+
+
+def test_euler_angles_match_cv2_rqdecomp3x3(rvecs):
+    rmats = rotation_matrices(rvecs)
+    expected = np.array([cv2.RQDecomp3x3(rmat)[0] for rmat in rmats])
+    assert np.abs(euler_angles(rmats) - expected).max() < 1e-9 # Degrees
+
+
+def test_head_angles_keep_the_legacy_unit_for_the_rules(rvecs):
+    class FixedPose:
+        def estimate(self, landmarks, frame_size, keys=None):
+            return rvecs[:len(landmarks)]
+
+    landmarks = np.random.default_rng(5).integers(0, 640, (50, 68, 2))
+    features = extract_features(landmarks, (640, 480), FixedPose())
+    for index in range(50):
+        angles = cv2.RQDecomp3x3(cv2.Rodrigues(rvecs[index])[0])[0]
+        assert features['yaw_degrees'][index] == pytest.approx(angles[1], abs=1e-9)
+        assert features['pitch_degrees'][index] == pytest.approx(angles[0], abs=1e-9)
+        # The original code converted the angles (already degrees) with np.degrees once more
+        assert features['yaw'][index] == pytest.approx(np.degrees(angles[1]), abs=1e-7)
+        assert features['pitch'][index] == pytest.approx(np.degrees(angles[0]), abs=1e-7)
+
+
+def test_aspect_ratios_match_the_scalar_formulas():
+    rng = np.random.default_rng(3)
+    landmarks = rng.integers(0, 640, (500, 68, 2))
+    ears = eye_aspect_ratios(landmarks)
+    mars = mouth_aspect_ratios(landmarks)
+    for face, ear, mar in zip(landmarks, ears, mars):
+        expected_ear = (scalar_eye_aspect_ratio(face[LEFT_EYE]) + scalar_eye_aspect_ratio(face[RIGHT_EYE])) / 2.0
+        assert ear == pytest.approx(expected_ear, rel=1e-12)
+        assert mar == pytest.approx(scalar_mouth_aspect_ratio(face[MOUTH]), rel=1e-12)
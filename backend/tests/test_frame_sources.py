@@ -0,0 +1,123 @@
+import threading
+
+import numpy as np
+import pytest
+
+import frame_sources
+from frame_sources import SourceReader, load_source_config
+
+FRAME = np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+class ScriptedSource:
+    """A frame source that opens fine; `reads` says how many reads succeed, `position` is its position (ms)."""
+
+    def __init__(self, reads=0, position=0.0, opens=True):
+        self.reads = reads
+        self.position = position
+        self.opens = opens
+
+    def isOpened(self):
+        return self.opens
+
+    def read(self, image=None):
+        if self.reads == 0:
+            return False, None
+        self.reads -= 1
+        return True, FRAME.copy()
+
+    def get(self, prop):
+        return self.position
+
+    def release(self):
+        pass
+
+
+class RecordingEvent(threading.Event):
+    """Closed event that records the backoff delays instead of sleeping, and closes after `limit` waits."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.delays = []
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        if len(self.delays) >= self.limit:
+            self.set()
+        return self.is_set()
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(frame_sources.random, "uniform", lambda low, high: high)
+
+
+def reader_for(monkeypatch, make_source, waits, **options):
+    opened = []
+
+    def open_source(source):
+        opened.append(make_source())
+        return opened[-1]
+
+    monkeypatch.setattr(frame_sources, "open_frame_source", open_source)
+    reader = SourceReader("scripted", reconnect_initial=0.5, reconnect_max=4.0, **options)
+    reader._closed = RecordingEvent(waits)
+    return reader, opened
+
+
+def test_source_that_opens_but_never_reads_backs_off(monkeypatch):
+    reader, opened = reader_for(monkeypatch, ScriptedSource, waits=6)
+    assert reader.read() == (False, None)
+    assert reader._closed.delays == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+    assert len(opened) == 6 # The first open plus one per retry
+
+
+def test_unopenable_source_backs_off(monkeypatch):
+    reader, opened = reader_for(monkeypatch, lambda: ScriptedSource(opens=False), waits=4)
+    assert reader.read() == (False, None)
+    assert reader._closed.delays == [0.5, 1.0, 2.0, 4.0]
+
+
+def test_stalled_source_backs_off(monkeypatch):
+    # Every connection delivers frames, but its position never advances
+    reader, opened = reader_for(monkeypatch, lambda: ScriptedSource(reads=1000, position=1000.0), waits=4,
+                                stale_after=0.0)
+    while not reader._closed.is_set():
+        reader.read()
+    assert reader._closed.delays == [0.5, 1.0, 2.0, 4.0]
+
+
+def test_backoff_starts_over_once_the_source_is_healthy(monkeypatch):
+    # Three connections that fail every read, then one that delivers two frames and drops
+    sources = iter([ScriptedSource(), ScriptedSource(), ScriptedSource(), ScriptedSource(reads=2)])
+    reader, opened = reader_for(monkeypatch, lambda: next(sources, ScriptedSource()), waits=5, stale_after=0.0)
+    assert reader.read()[0] and reader.read()[0]
+    assert reader._closed.delays == [0.5, 1.0, 2.0]
+    assert reader._failures == 0
+    reader.read() # The healthy connection drops: its first retry waits reconnect_initial again
+    assert reader._closed.delays[3:] == [0.5, 1.0]
+
+
+def test_frozen_frames_do_not_reset_the_backoff(monkeypatch):
+    reader, opened = reader_for(monkeypatch, lambda: ScriptedSource(reads=1000, position=1000.0), waits=3,
+                                stale_after=0.0)
+    reader.read()
+    reader._failures = 3
+    reader.read() # Frozen frames arrive, but the position never advances
+    assert reader._failures >= 3
+
+
+def test_source_config_entries_can_pick_a_detector(tmp_path):
+    path = tmp_path / "sources.json"
+    path.write_text('{"desk": 0, "hall-1": {"source": "rtsp://10.0.0.21/s1", "detector": "dnn"}, "hall-2": {"source": 2}}')
+    sources, detectors = load_source_config(str(path))
+    assert sources == {"desk": 0, "hall-1": "rtsp://10.0.0.21/s1", "hall-2": 2}
+    assert detectors == {"hall-1": "dnn"}
+
+
+def test_source_config_entry_without_a_source_is_rejected(tmp_path):
+    path = tmp_path / "sources.json"
+    path.write_text('{"hall-1": {"detector": "dnn"}}')
+    with pytest.raises(ValueError, match="hall-1"):
+        load_source_config(str(path))
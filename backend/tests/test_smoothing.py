@@ -0,0 +1,70 @@
+import pytest
+
+from smoothing import ConditionTimer, TimeWindowSmoother
+
+RATES = [3, 5, 10, 30] # Analysed frames per second
+
+
+def frame_times(rate, duration):
+    return [index / rate for index in range(int(duration * rate) + 1)]
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_condition_timer_measures_seconds_at_any_rate(rate):
+    timer = ConditionTimer(tolerance=0.2)
+    for timestamp in frame_times(rate, 2.0):
+        held = timer.update(timestamp, True)
+    assert held == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_condition_timer_first_reaches_threshold_within_one_frame(rate):
+    timer = ConditionTimer(tolerance=0.2)
+    reached = next(t for t in frame_times(rate, 2.0) if timer.update(t, True) >= 0.33)
+    assert 0.33 <= reached <= 0.33 + 1.0 / rate
+
+
+def test_condition_timer_bridges_short_dropouts():
+    timer = ConditionTimer(tolerance=0.2)
+    timer.update(0.0, True)
+    timer.update(0.5, True)
+    assert timer.update(0.6, False) == pytest.approx(0.5) # Within tolerance: keeps its start
+    assert timer.update(0.7, True) == pytest.approx(0.7)
+
+
+def test_condition_timer_restarts_after_long_dropout():
+    timer = ConditionTimer(tolerance=0.2)
+    timer.update(0.0, True)
+    timer.update(0.5, True)
+    assert timer.update(0.8, False) == 0.0
+    assert timer.update(0.9, True) == 0.0
+
+
+def test_smoother_median_ignores_single_outlier():
+    smoother = TimeWindowSmoother(window=0.3)
+    for index, value in enumerate([0.3, 0.3, 0.05, 0.3, 0.3]):
+        median = smoother.add(index / 30, value)
+    assert median == pytest.approx(0.3)
+
+
+def test_smoother_median_only_uses_window():
+    smoother = TimeWindowSmoother(window=0.3)
+    smoother.add(0.0, 10.0)
+    assert smoother.add(1.0, 2.0) == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_smoother_ema_converges_at_same_speed_at_any_rate(rate):
+    smoother = TimeWindowSmoother(time_constant=0.5)
+    smoother.add(0.0, 0.0)
+    for timestamp in frame_times(rate, 1.0)[1:]:
+        smoother.add(timestamp, 100.0)
+    # After two time constants the EMA covers 1 - e^-2 of the step, whatever the rate
+    assert smoother.ema == pytest.approx(100.0 * (1 - 0.1353), abs=0.5)
+
+
+def test_smoother_reset_forgets_samples():
+    smoother = TimeWindowSmoother()
+    smoother.add(0.0, 1.0)
+    smoother.reset()
+    assert smoother.median() is None and smoother.ema is None
@@ -0,0 +1,327 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from metrics import metrics
+
+# --- Process-Pool Worker Farm for Face Detection ---
+# HOG detection and landmark prediction are CPU-bound and hold the GIL, so with
+# many streams they serialize on one core. DetectionPool runs them in worker
+# processes instead. Each worker loads the shape predictor once and keeps the
+# FaceLocator (with its face tracks) of every session assigned to it; a session
+# always goes to the same worker, so its frames are processed in order and its
+# tracks stay valid. Frames are handed over in shared memory (FrameSlots), so
+# only a slot name crosses the pipe; results travel back on a shared queue and
+# are routed to the Future of the frame that asked for them. A worker that dies
+# is respawned, and the frames it was working on fail right away.
+
+WORKER_CHECK_INTERVAL = 1.0 # Seconds between liveness checks of the worker processes
+
+
+class FrameSlots:
+    """
+    Shared-memory blocks the parent copies frames into for the workers. A slot
+    is held from submit() until the worker's result for that frame arrives,
+    then reused for a later frame of the same or a smaller size.
+    """
+
+    def __init__(self):
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, nbytes):
+        with self._lock:
+            for index, slot in enumerate(self._free):
+                if slot.size >= nbytes:
+                    return self._free.pop(index)
+        return shared_memory.SharedMemory(create=True, size=nbytes)
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def close(self):
+        """Frees the idle slots (call once no worker can read them)."""
+        with self._lock:
+            slots, self._free = self._free, []
+        for slot in slots:
+            slot.close()
+            slot.unlink()
+
+
+def _attach_frame(attached, slot_name, shape, dtype):
+    """A worker's view of a frame in a shared-memory slot (attachments are kept per slot)."""
+    slot = attached.get(slot_name)
+    if slot is None:
+        slot = attached[slot_name] = shared_memory.SharedMemory(name=slot_name)
+    return np.ndarray(shape, dtype=dtype, buffer=slot.buf)
+
+
+def _worker_main(worker_index, tasks, results, predictor_path, locator_config, predictor=None):
+    """
+    Entry point of a worker process. A predictor already loaded by the parent
+    is inherited through fork (copy-on-write) instead of being parsed again;
+    respawned workers load their own.
+    """
+    import dlib
+    from face_detectors import create_face_detector
+    from face_tracking import FaceLocator, locate_faces
+
+    if predictor is None:
+        try:
+            predictor = dlib.shape_predictor(predictor_path)
+        except Exception as e:
+            print(f"Worker {worker_index}: Error loading dlib shape predictor: {e}")
+            predictor = None
+
+    locators = {} # session_id -> FaceLocator
+    attached = {} # slot name -> SharedMemory
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        kind, request_id, session_id, frame_ref = task
+        if kind == "release":
+            locators.pop(session_id, None)
+            continue
+
+        locator = locators.get(session_id)
+        if locator is None:
+            backend = locator_config.get("detectors", {}).get(session_id, locator_config.get("detector", "hog"))
+            detector = create_face_detector(backend, locator_config.get("detector_options"), fallback="hog")
+            locator = FaceLocator(detector, locator_config["mode"],
+                                  locator_config["redetect_interval"], locator_config["min_confidence"])
+            locators[session_id] = locator
+
+        start = time.perf_counter()
+        try:
+            # Read in place: the slot stays reserved for this frame until its result is back
+            frame = _attach_frame(attached, *frame_ref)
+            result = locate_faces(locator, predictor, frame, locator_config["scale"], locator_config["min_width"],
+                                  locator_config.get("max_faces"))
+            error = None
+        except Exception as e:
+            result, error = None, repr(e)
+        results.put((request_id, worker_index, result, error, time.perf_counter() - start))
+    for slot in attached.values():
+        slot.close()
+
+
+class DetectionPool:
+    """
+    Dispatches face detection for many streams to a pool of worker processes.
+    `locator_config` holds the FaceLocator and detection-scale settings
+    (mode, redetect_interval, min_confidence, scale, min_width) and optionally
+    the face detector backend (detector, per-session detectors, detector_options;
+    see face_detectors.py). Pass the
+    parent's `predictor` to share it with the workers instead of loading it in each.
+    Workers that die are respawned; their sessions stay assigned to the new
+    process (whose face tracks start over).
+    """
+
+    def __init__(self, num_workers, predictor_path, locator_config, predictor=None):
+        self.num_workers = num_workers
+        self.predictor_path = predictor_path
+        self.predictor = predictor
+        self.locator_config = dict(locator_config)
+        self._processes = []
+        self._task_queues = []
+        self._results = None
+        self._router = None
+        self._pending = {} # request_id -> Future
+        self._in_flight = {} # request_id -> (worker index, FrameSlot) until the result arrives
+        self._slots = FrameSlots()
+        self._stopping = False
+        self._last_check = 0.0
+        self._assignments = {} # session_id -> worker index
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._started_at = None
+        # Per-worker throughput metrics
+        self._frames = [0] * num_workers
+        self._busy_time = [0.0] * num_workers
+        self._errors = [0] * num_workers
+        self._restarts = [0] * num_workers
+
+    def _start_worker(self, index, method, predictor):
+        # Queues come from the spawn context, so respawned (spawned) workers can share them
+        tasks = multiprocessing.get_context("spawn").Queue()
+        process = multiprocessing.get_context(method).Process(
+            target=_worker_main,
+            args=(index, tasks, self._results, self.predictor_path, self.locator_config, predictor),
+            name=f"detection-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process, tasks
+
+    def start(self):
+        """
+        Starts the worker processes. Workers are forked, so call this before
+        any pipeline thread is running.
+        """
+        self._results = multiprocessing.get_context("spawn").Queue()
+        for index in range(self.num_workers):
+            process, tasks = self._start_worker(index, "fork", self.predictor)
+            self._task_queues.append(tasks)
+            self._processes.append(process)
+        self._router = threading.Thread(target=self._route_results, name="detection-results", daemon=True)
+        self._router.start()
+        self._started_at = time.time()
+        print(f"Detection pool started with {self.num_workers} worker processes.")
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+        for tasks in self._task_queues:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=2.0)
+        self._results.put(None)
+        self._router.join(timeout=2.0)
+        with self._lock:
+            in_flight, self._in_flight = self._in_flight, {}
+        for _, slot in in_flight.values():
+            self._slots.release(slot)
+        self._slots.close()
+
+    def check_workers(self):
+        """
+        Respawns dead worker processes. Frames they had not answered fail with
+        a RuntimeError instead of waiting for their timeout. Called by the
+        result router every WORKER_CHECK_INTERVAL seconds and on submit().
+        """
+        failed, freed = [], []
+        with self._lock:
+            self._last_check = time.monotonic()
+            if self._stopping:
+                return
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                print(f"Error: Detection worker {index} died (exit code {process.exitcode}). Restarting it.")
+                for request_id, (worker_index, slot) in list(self._in_flight.items()):
+                    if worker_index == index:
+                        del self._in_flight[request_id]
+                        freed.append(slot)
+                        future = self._pending.pop(request_id, None)
+                        if future is not None:
+                            failed.append(future)
+                # Spawned, not forked: this process runs threads by now. The old task queue is
+                # dropped, as the worker may have died holding its lock.
+                self._processes[index], self._task_queues[index] = self._start_worker(index, "spawn", None)
+                self._restarts[index] += 1
+        for slot in freed:
+            self._slots.release(slot)
+        for future in failed:
+            future.set_exception(RuntimeError("Detection worker died while processing the frame"))
+
+    def _worker_for(self, session_id):
+        # Sessions are pinned to the worker currently serving the fewest sessions
+        with self._lock:
+            index = self._assignments.get(session_id)
+            if index is None:
+                loads = [0] * self.num_workers
+                for assigned in self._assignments.values():
+                    loads[assigned] += 1
+                index = loads.index(min(loads))
+                self._assignments[session_id] = index
+            return index
+
+    def submit(self, session_id, frame):
+        """Queues a frame of a session; the Future resolves to (rects, landmarks)."""
+        future = Future()
+        request_id = future.request_id = next(self._request_ids)
+        index = self._worker_for(session_id)
+        if not self._processes[index].is_alive():
+            self.check_workers()
+        slot = self._slots.acquire(frame.nbytes)
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+        with self._lock:
+            self._pending[request_id] = future
+            self._in_flight[request_id] = (index, slot)
+            # Only the slot reference is pickled through the worker's pipe
+            self._task_queues[index].put(("frame", request_id, session_id, (slot.name, frame.shape, frame.dtype.str)))
+        return future
+
+    def locate_faces(self, session_id, frame, timeout=5.0):
+        """Blocking variant of submit(), for a session's detection thread."""
+        future = self.submit(session_id, frame)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            with self._lock:
+                self._pending.pop(future.request_id, None)
+            raise
+
+    def release_session(self, session_id):
+        """Drops the face tracks a worker keeps for a closed session."""
+        with self._lock:
+            index = self._assignments.pop(session_id, None)
+        if index is not None:
+            self._task_queues[index].put(("release", None, session_id, None))
+
+    def _route_results(self):
+        while True:
+            try:
+                item = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                self.check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            if item is None:
+                break
+            if time.monotonic() - self._last_check > WORKER_CHECK_INTERVAL:
+                self.check_workers()
+            request_id, worker_index, result, error, elapsed = item
+            # Stage timings measured inside the workers stay there; record the worker's total per frame
+            metrics.observe("pool_worker", elapsed)
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+                in_flight = self._in_flight.pop(request_id, None)
+                self._frames[worker_index] += 1
+                self._busy_time[worker_index] += elapsed
+                if error is not None:
+                    self._errors[worker_index] += 1
+            if in_flight is not None:
+                self._slots.release(in_flight[1])
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(f"Detection worker {worker_index} failed: {error}"))
+            else:
+                future.set_result(result)
+
+    def pending_count(self):
+        """Number of frames submitted to the workers and not answered yet."""
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        """Per-worker throughput metrics."""
+        uptime = time.time() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            sessions_per_worker = [0] * self.num_workers
+            for assigned in self._assignments.values():
+                sessions_per_worker[assigned] += 1
+            return [
+                {
+                    'worker': index,
+                    'alive': self._processes[index].is_alive() if index < len(self._processes) else False,
+                    'sessions': sessions_per_worker[index],
+                    'frames': self._frames[index],
+                    'errors': self._errors[index],
+                    'restarts': self._restarts[index],
+                    'fps': round(self._frames[index] / uptime, 2) if uptime > 0 else 0.0,
+                    'ms_per_frame': round(self._busy_time[index] / self._frames[index] * 1000, 2) if self._frames[index] else 0.0,
+                    'utilisation': round(self._busy_time[index] / uptime, 3) if uptime > 0 else 0.0,
+                }
+                for index in range(self.num_workers)
+            ]
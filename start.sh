@@ -3,4 +3,10 @@
 # Run Gunicorn to serve the Flask application
 # The Flask app instance is named 'app' in 'app.py'
 # 0.0.0.0:$PORT binds to all available network interfaces on the assigned port by Render
-gunicorn --bind 0.0.0.0:$PORT app:app
+# Worker count, threads, app preloading and the model warm-up hooks are set in gunicorn.conf.py.
+# The "dnn" face detector's model is not bundled; fetch it (once) when that backend is selected,
+# for every session or for some in the FOCUS_SOURCES_FILE
+if [ "$FOCUS_FACE_DETECTOR" = "dnn" ] || { [ -n "$FOCUS_SOURCES_FILE" ] && grep -q '"dnn"' "$FOCUS_SOURCES_FILE"; }; then
+    python fetch_models.py
+fi
+gunicorn --config gunicorn.conf.py --bind 0.0.0.0:$PORT app:app